@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Non-blocking access log for CustomHTTPRequestHandler, written as JSON
+# lines.
+#
+# The request path only appends a tuple to a bounded queue; a background
+# thread formats the entries and writes them in batches, every
+# flush_interval seconds or as soon as batch_size entries are waiting. When
+# the queue is full the entry is dropped and counted instead of blocking
+# the request, and the writer logs how many were lost. Log files are
+# rotated by size (access.log -> access.log.1 ...), and successful
+# requests can be sampled; error responses are always kept. Several
+# processes (prefork.py workers) may share one log file: each batch is one
+# append, and a file rotated by one process is reopened by the others.
+import collections
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Field names of the tuples passed to AccessLog.log()
+FIELDS = ('time', 'remote', 'method', 'path', 'status', 'bytes', 'duration_ms', 'route',
+          'referer', 'user_agent')
+
+
+def format_entry(entry):
+    record = dict(zip(FIELDS, entry))
+    record['time'] = format_time(record['time'])
+    record['duration_ms'] = round(record['duration_ms'], 3)
+    return json.dumps({k: v for k, v in record.items() if v is not None},
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def format_time(timestamp):
+    when = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    return when.strftime('%Y-%m-%dT%H:%M:%S.') + f'{when.microsecond // 1000:03d}Z'
+
+
+class AccessLog:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS,
+                 sample_rate=1.0, queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        # path '-' writes to stderr (no rotation)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Approximate counters: updated without a lock from request threads
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.write_errors = 0
+        self._reported_dropped = 0
+        self._pending = collections.deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer = None
+        self._file = None
+        self._size = 0
+
+    def start(self):
+        if self._writer is None:
+            self._open()
+            self._writer = threading.Thread(target=self._run, name='access-log-writer',
+                                            daemon=True)
+            self._writer.start()
+        return self
+
+    def close(self):
+        # Writes what is still queued and closes the file
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if self._file is not None and self._file is not sys.stderr:
+            self._file.close()
+        self._file = None
+
+    def log(self, entry):
+        # entry is a tuple of FIELDS values. Never blocks.
+        if self.sample_rate < 1.0 and entry[4] < 400 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        pending = self._pending
+        if len(pending) >= self.queue_size:
+            self.dropped += 1
+            return
+        pending.append(entry)
+        if len(pending) >= self.batch_size:
+            self._wake.set()
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+            'write_errors': self.write_errors,
+            'queued': len(self._pending),
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        pending = self._pending
+        while pending:
+            lines = []
+            while pending and len(lines) < self.batch_size:
+                lines.append(format_entry(pending.popleft()))
+            self._write(lines)
+        dropped = self.dropped
+        if dropped != self._reported_dropped:
+            lost = dropped - self._reported_dropped
+            self._reported_dropped = dropped
+            self._write([json.dumps({'time': format_time(time.time()), 'event': 'dropped',
+                                     'count': lost}, separators=(',', ':'))])
+
+    def _write(self, lines):
+        data = '\n'.join(lines) + '\n'
+        # Sizes are in bytes: accented paths and user agents take more than
+        # one byte per character
+        size = len(data.encode('utf-8'))
+        try:
+            if self._file is None:
+                self._open()
+            if self._file is not sys.stderr and self.max_bytes > 0:
+                self._follow_rotation()
+                if self._size and self._size + size > self.max_bytes:
+                    self._rotate()
+            self._file.write(data)
+            self._file.flush()
+        except OSError:
+            self.write_errors += 1
+            return
+        self._size += size
+        self.written += len(lines)
+
+    def _open(self):
+        if self.path == '-':
+            self._file = sys.stderr
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+    def _rotated_elsewhere(self):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _follow_rotation(self):
+        # Reopens the file when another process has rotated it, and sizes it
+        # with what the other processes appended
+        if self._rotated_elsewhere():
+            self._file.close()
+            self._open()
+        else:
+            self._size = os.fstat(self._file.fileno()).st_size
+
+    def _rotate(self):
+        # access.log.{n-1} -> access.log.{n}, ..., access.log -> access.log.1
+        # Under an exclusive lock of the file, so that processes sharing it
+        # rotate it once
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            if not self._rotated_elsewhere():
+                if self.backups > 0:
+                    for i in range(self.backups - 1, 0, -1):
+                        source = f'{self.path}.{i}'
+                        if os.path.exists(source):
+                            os.replace(source, f'{self.path}.{i + 1}')
+                    os.replace(self.path, f'{self.path}.1')
+                else:
+                    os.remove(self.path)
+        finally:
+            # Closing the file releases the lock
+            self._file.close()
+            self._file = None
+        self._open()
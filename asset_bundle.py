@@ -0,0 +1,678 @@
+#!/usr/bin/env python3
+# Per-page CSS/JS bundling. Each page's local stylesheets and scripts are
+# grouped into runs of consecutive references (an inline <style>/<script> or
+# an external URL ends a run, so cascade and execution order are kept) and
+# every run is replaced by one minified bundle in assets/bundles/. Pages with
+# the same references share bundles, which are named after the hash of their
+# inputs and reused while the inputs are unchanged.
+#
+# On top of that:
+#   - stylesheets in <head> get the page's critical CSS inlined (rules whose
+#     selectors match the header and first section, within a per-page
+#     budget) and the bundle itself is loaded without blocking rendering;
+#   - the trailing chain of external scripts (no inline script after them)
+#     gets defer.
+#
+# Pages are processed in parallel; pages unchanged since their last run are
+# skipped via the build manifest. Minifying JavaScript needs the optional
+# rjsmin module (already minified *.min.js files are used as they are).
+# Runs on the deploy copy, before asset_fingerprint.py:
+#
+#   python3 asset_bundle.py --root dist
+#   python3 asset_bundle.py --root dist --no-critical
+import argparse
+import fnmatch
+import html.parser
+import os
+import posixpath
+import re
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+from build_manifest import MANIFEST_NAME, BuildManifest, combine_keys, digest_file, digest_text
+from site_pages import discover_pages, local_path, read_text, write_text
+
+OUTPUT_DIR = 'assets/bundles'
+CACHE_DIR = '.bundle-cache'
+SCOPE = 'asset_bundle'
+BUNDLER_VERSION = '3'
+
+# Budget of the critical CSS inlined into one page, over all its
+# stylesheet runs: runs past it keep a blocking stylesheet instead of the
+# page carrying a copy of most of the bundles
+MAX_CRITICAL_BYTES = 48 * 1024
+
+ELEMENT_PATTERN = re.compile(
+    r'<!--.*?-->'
+    r'|<(?P<script>script)\b(?P<script_attrs>[^>]*)>(?P<script_body>.*?)</script\s*>'
+    r'|<(?P<style>style)\b[^>]*>.*?</style\s*>'
+    r'|<(?P<link>link)\b(?P<link_attrs>[^>]*)>'
+    r'|</(?P<head_end>head)\s*>',
+    re.IGNORECASE | re.DOTALL)
+ATTR_PATTERN = re.compile(r'''([\w:-]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?''')
+SECTION_PATTERN = re.compile(r'<section\b', re.IGNORECASE)
+BODY_PATTERN = re.compile(r'<body\b[^>]*>', re.IGNORECASE)
+URL_ATTR_PATTERN = re.compile(r'''\s(?:href|src)\s*=\s*(["'])(.*?)\1''', re.IGNORECASE | re.DOTALL)
+
+JS_TYPES = {'', 'text/javascript', 'application/javascript', 'module'}
+
+
+def parse_attrs(text):
+    attrs = {}
+    for match in ATTR_PATTERN.finditer(text):
+        value = next((v for v in match.group(2, 3, 4) if v is not None), '')
+        attrs.setdefault(match.group(1).lower(), value)
+    return attrs
+
+
+# --- CSS -------------------------------------------------------------------
+
+# Strings and unquoted url(...) values are copied verbatim
+CSS_TOKEN_PATTERN = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\([^)"']*\))|(/\*.*?\*/)''',
+                               re.DOTALL | re.IGNORECASE)
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(["']?)(.*?)\1\s*\)''', re.IGNORECASE | re.DOTALL)
+CSS_SPACE_PATTERN = re.compile(r'\s+')
+CSS_PUNCT_PATTERN = re.compile(r'\s*([{};,>])\s*')
+CSS_BLOCK_PATTERN = re.compile(r'([{};])')
+
+
+def minify_css(css):
+    # Conservative: drops comments (except /*! licences */), collapses
+    # whitespace and removes it around { } ; , >, and after ':' in
+    # declarations only (in a selector ' :hover' is a descendant).
+    out = []
+    # One entry per open '{': True for a block of declarations
+    blocks = []
+    # The current prelude or declaration, up to the next { } or ;
+    statement = ['']
+    pos = 0
+    for match in CSS_TOKEN_PATTERN.finditer(css):
+        out.append(_minify_css_code(css[pos:match.start()], blocks, statement))
+        if match.group(1):
+            out.append(match.group(1))
+            statement[0] += match.group(1)
+        elif match.group(2).startswith('/*!'):
+            out.append(match.group(2) + '\n')
+        pos = match.end()
+    out.append(_minify_css_code(css[pos:], blocks, statement))
+    return ''.join(out).strip()
+
+
+def _minify_css_code(code, blocks, statement):
+    code = CSS_SPACE_PATTERN.sub(' ', code)
+    code = CSS_PUNCT_PATTERN.sub(r'\1', code)
+    parts = CSS_BLOCK_PATTERN.split(code)
+    for i, part in enumerate(parts):
+        if part == '{':
+            prelude = statement[0].strip().lower()
+            blocks.append(not (prelude.startswith(NESTED_AT_RULES)
+                               or KEYFRAMES_PATTERN.match(prelude)))
+            statement[0] = ''
+        elif part in ('}', ';'):
+            if part == '}' and blocks:
+                blocks.pop()
+            statement[0] = ''
+        else:
+            if blocks and blocks[-1]:
+                parts[i] = part = part.replace(': ', ':')
+            statement[0] += part
+    return ''.join(parts).replace(';}', '}')
+
+
+def rebase_css_urls(css, from_dir, to_dir):
+    # Rewrites relative url(...) references of CSS moved from from_dir to
+    # to_dir (both relative to the site root)
+    def rebase(match):
+        quote, url = match.group(1), match.group(2).strip()
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme or parsed.netloc or url.startswith(('/', '#', 'data:')) or not parsed.path:
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(from_dir, parsed.path))
+        new_path = posixpath.relpath(target, to_dir or '.')
+        return f'url({quote}{urllib.parse.urlunparse(parsed._replace(path=new_path))}{quote})'
+    if from_dir == to_dir:
+        return css
+    return CSS_URL_PATTERN.sub(rebase, css)
+
+
+def split_css_blocks(css):
+    # Splits minified CSS into (prelude, body) pairs; body is None for
+    # statements such as @import, and nested at-rule bodies are returned as
+    # raw text for the caller to split again
+    blocks = []
+    pos = 0
+    depth = 0
+    start = 0
+    prelude_end = None
+    quote = None
+    while pos < len(css):
+        char = css[pos]
+        if quote:
+            if char == '\\':
+                pos += 1
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                prelude_end = pos
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((css[start:prelude_end].strip(), css[prelude_end + 1:pos]))
+                start = pos + 1
+        elif char == ';' and depth == 0:
+            blocks.append((css[start:pos].strip(), None))
+            start = pos + 1
+        pos += 1
+    return blocks
+
+
+SELECTOR_PSEUDO_PATTERN = re.compile(r'::?[\w-]+(?:\((?:[^()]|\([^()]*\))*\))?')
+SELECTOR_ATTR_PATTERN = re.compile(r'\[[^\]]*\]')
+SELECTOR_COMBINATOR_PATTERN = re.compile(r'\s*[\s>+~]\s*')
+SIMPLE_SELECTOR_PATTERN = re.compile(r'([.#]?)((?:\\.|[\w-])+|\*)')
+NESTED_AT_RULES = ('@media', '@supports', '@layer', '@container', '@document')
+KEPT_AT_RULES = ('@font-face', '@property')
+KEYFRAMES_PATTERN = re.compile(r'@(-\w+-)?keyframes\b')
+LEADING_COMMENT_PATTERN = re.compile(r'(?:\s*/\*.*?\*/)*\s*', re.DOTALL)
+VAR_PATTERN = re.compile(r'var\(\s*(--[\w-]+)')
+
+
+class SelectorTokens:
+    # Tag names, classes and ids used by some markup (the part of a page
+    # above the fold, or the whole site); classes matching one of the
+    # safelist globs count as used
+    def __init__(self, tags, classes, ids, safelist=()):
+        self.tags = tags
+        self.classes = classes
+        self.ids = ids
+        self.safelist = tuple(safelist)
+
+    def key(self):
+        return combine_keys(*sorted(self.tags), '', *sorted(self.classes), '', *sorted(self.ids),
+                            '', *self.safelist)
+
+    def has_class(self, name):
+        return name in self.classes or any(fnmatch.fnmatchcase(name, p) for p in self.safelist)
+
+    def matches(self, selector):
+        selector = SELECTOR_ATTR_PATTERN.sub('', SELECTOR_PSEUDO_PATTERN.sub('', selector))
+        for compound in SELECTOR_COMBINATOR_PATTERN.split(selector.strip()):
+            for kind, name in SIMPLE_SELECTOR_PATTERN.findall(compound):
+                name = name.replace('\\', '')
+                if kind == '.':
+                    if not self.has_class(name):
+                        return False
+                elif kind == '#':
+                    if name not in self.ids:
+                        return False
+                elif name != '*' and name.lower() not in self.tags:
+                    return False
+        return True
+
+
+class TokenCollector(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tags = {'html', 'body'}
+        self.classes = set()
+        self.ids = set()
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.add(tag)
+        for name, value in attrs:
+            if name == 'class' and value:
+                self.classes.update(value.split())
+            elif name == 'id' and value:
+                self.ids.add(value)
+
+
+def fold_tokens(content):
+    # Above the fold: the body up to the start of its second <section>
+    # (header, hero), or the whole body for pages without sections
+    body = BODY_PATTERN.search(content)
+    start = body.end() if body else 0
+    sections = SECTION_PATTERN.finditer(content, start)
+    next(sections, None)
+    second = next(sections, None)
+    collector = TokenCollector()
+    collector.feed(content[start:second.start() if second else len(content)])
+    collector.close()
+    return SelectorTokens(collector.tags, collector.classes, collector.ids)
+
+
+def filter_css(css, tokens, keep_keyframes=False, keep_at_rules=True, keep_licences=True):
+    # The rules of css whose selectors can match tokens, plus @font-face
+    # and @property (unless keep_at_rules is off), @keyframes when asked and
+    # the /*! licence */ comments unless keep_licences is off
+    out = []
+    for prelude, body in split_css_blocks(css):
+        if body is None:
+            continue
+        # Licence comments kept by minify_css end up in front of a prelude
+        comment = LEADING_COMMENT_PATTERN.match(prelude).group(0)
+        if comment:
+            if keep_licences:
+                out.append(comment.strip() + '\n')
+            prelude = prelude[len(comment):]
+        lowered = prelude.lower()
+        if lowered.startswith(NESTED_AT_RULES):
+            inner = filter_css(body, tokens, keep_keyframes, keep_at_rules, keep_licences)
+            if inner:
+                out.append(f'{prelude}{{{inner}}}')
+        elif (keep_at_rules and lowered.startswith(KEPT_AT_RULES)) or (
+                keep_keyframes and KEYFRAMES_PATTERN.match(lowered)):
+            out.append(f'{prelude}{{{body}}}')
+        elif prelude.startswith('@'):
+            continue
+        else:
+            selectors = [s for s in prelude.split(',') if tokens.matches(s)]
+            if selectors:
+                out.append(f'{",".join(selectors)}{{{body}}}')
+    return ''.join(out)
+
+
+def split_declarations(body):
+    # The declarations of a rule body: ';' inside strings and parentheses
+    # (data: URLs) does not split
+    declarations = []
+    start = 0
+    depth = 0
+    quote = None
+    for pos, char in enumerate(body):
+        if quote:
+            if char == quote and body[pos - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ';' and depth == 0:
+            declarations.append(body[start:pos])
+            start = pos + 1
+    declarations.append(body[start:])
+    return [d for d in declarations if d.strip()]
+
+
+def prune_custom_properties(sheets, reads=()):
+    # Drops the custom properties (--name:value) declared by the top-level
+    # rules of sheets that nothing reads: no var() of another declaration,
+    # of a nested at-rule or of reads (the var() uses of the page itself)
+    parsed = [split_css_blocks(css) for css in sheets]
+    defined = {}
+    used = set(reads)
+    for blocks in parsed:
+        for prelude, body in blocks:
+            if body is None or prelude.startswith('@'):
+                used.update(VAR_PATTERN.findall(body or prelude))
+                continue
+            for declaration in split_declarations(body):
+                name, _, value = declaration.partition(':')
+                if name.strip().startswith('--'):
+                    defined.setdefault(name.strip(), []).append(value)
+                else:
+                    used.update(VAR_PATTERN.findall(value))
+    queue = list(used)
+    while queue:
+        for value in defined.get(queue.pop(), ()):
+            for name in VAR_PATTERN.findall(value):
+                if name not in used:
+                    used.add(name)
+                    queue.append(name)
+    pruned = []
+    for blocks in parsed:
+        out = []
+        for prelude, body in blocks:
+            if body is None:
+                out.append(f'{prelude};')
+                continue
+            if not prelude.startswith('@'):
+                body = ';'.join(d for d in split_declarations(body)
+                                if not d.strip().startswith('--')
+                                or d.partition(':')[0].strip() in used)
+                if not body:
+                    continue
+            out.append(f'{prelude}{{{body}}}')
+        pruned.append(''.join(out))
+    return pruned
+
+
+# --- Bundles ---------------------------------------------------------------
+
+def minify_js(source, rel):
+    if rjsmin is None or rel.endswith('.min.js'):
+        return source
+    return rjsmin.jsmin(source)
+
+
+def bundle_name(kind, inputs):
+    key = combine_keys(BUNDLER_VERSION, kind, str(rjsmin is not None),
+                       *(f'{rel}:{digest}' for rel, digest in inputs))
+    ext = 'css' if kind == 'styles' else 'js'
+    return f'{OUTPUT_DIR}/{kind}-{key[:10]}.{ext}', key
+
+
+def build_bundle(root, kind, sources):
+    # Writes the bundle of sources unless an identical one exists. Returns
+    # (bundle path, key, input bytes, output bytes).
+    inputs = [(rel, digest_file(os.path.join(root, rel))) for rel in sources]
+    rel_out, key = bundle_name(kind, inputs)
+    input_bytes = sum(os.path.getsize(os.path.join(root, rel)) for rel in sources)
+    out_path = os.path.join(root, rel_out)
+    if not os.path.exists(out_path):
+        parts = []
+        for rel in sources:
+            text = read_text(os.path.join(root, rel))
+            if kind == 'styles':
+                text = rebase_css_urls(minify_css(text), posixpath.dirname(rel), OUTPUT_DIR)
+                parts.append(text)
+            else:
+                parts.append(minify_js(text, rel).strip())
+        if kind == 'styles':
+            content = '\n'.join(parts)
+        else:
+            # The leading ';' keeps a 'use strict' directive of the first
+            # file from turning the whole bundle strict
+            content = ';' + '\n;\n'.join(parts) + '\n'
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp = f'{out_path}.{os.getpid()}.tmp'
+        write_text(tmp, content)
+        os.replace(tmp, out_path)
+    return rel_out, key, input_bytes, os.path.getsize(out_path)
+
+
+def cached_critical(root, bundle_rel, bundle_key, tokens):
+    cache_path = os.path.join(root, CACHE_DIR, f'critical-{combine_keys(bundle_key, tokens.key())[:16]}.css')
+    try:
+        return read_text(cache_path)
+    except OSError:
+        pass
+    # @font-face stays in the bundle (loaded without blocking and
+    # preloaded); licences are left to the bundle as well
+    css = filter_css(read_text(os.path.join(root, bundle_rel)), tokens,
+                     keep_at_rules=False, keep_licences=False)
+    css = rebase_css_urls(css, OUTPUT_DIR, '')
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp = f'{cache_path}.{os.getpid()}.tmp'
+    write_text(tmp, css)
+    os.replace(tmp, cache_path)
+    return css
+
+
+# --- Pages -----------------------------------------------------------------
+
+class Element:
+    __slots__ = ('kind', 'start', 'end', 'attrs', 'src', 'in_head')
+
+    def __init__(self, kind, start, end, attrs=None, src=None, in_head=False):
+        # kind: 'css' (bundleable stylesheet), 'js' (bundleable script),
+        # 'script' (any other executable script), 'break' (ends a css run)
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.attrs = attrs or {}
+        self.src = src
+        self.in_head = in_head
+
+
+def scan_elements(root, content):
+    elements = []
+    in_head = True
+    for match in ELEMENT_PATTERN.finditer(content):
+        if match.group('head_end'):
+            in_head = False
+        elif match.group('script'):
+            attrs = parse_attrs(match.group('script_attrs'))
+            if attrs.get('type', '').lower() not in JS_TYPES:
+                continue
+            src = local_path(attrs.get('src', '')) if 'src' in attrs else None
+            bundleable = (src is not None and not src.startswith(OUTPUT_DIR + '/')
+                          and attrs.get('type', '').lower() != 'module'
+                          and not {'async', 'defer', 'nomodule', 'integrity'} & attrs.keys()
+                          and os.path.isfile(os.path.join(root, src)))
+            elements.append(Element('js' if bundleable else 'script', match.start(), match.end(),
+                                    attrs, src, in_head))
+        elif match.group('style'):
+            elements.append(Element('break', match.start(), match.end(), in_head=in_head))
+        elif match.group('link'):
+            attrs = parse_attrs(match.group('link_attrs'))
+            if 'stylesheet' not in attrs.get('rel', '').lower().split():
+                continue
+            src = local_path(attrs.get('href', ''))
+            bundleable = (src is not None and not src.startswith(OUTPUT_DIR + '/')
+                          and attrs.get('rel', '').lower().split() == ['stylesheet']
+                          and attrs.get('media', 'all').lower() in ('all', 'screen', '')
+                          and os.path.isfile(os.path.join(root, src)))
+            elements.append(Element('css' if bundleable else 'break', match.start(), match.end(),
+                                    attrs, src, in_head))
+    return elements
+
+
+def page_bundles(content):
+    # The bundles a page references, from this run or an earlier one
+    bundles = set()
+    for match in URL_ATTR_PATTERN.finditer(content):
+        rel = local_path(match.group(2))
+        if rel is not None and rel.startswith(OUTPUT_DIR + '/'):
+            bundles.add(rel)
+    return sorted(bundles)
+
+
+def find_runs(elements, kind, breaking):
+    runs = []
+    current = []
+    for element in elements:
+        if element.kind == kind:
+            if current and current[-1].in_head != element.in_head:
+                runs.append(current)
+                current = []
+            current.append(element)
+        elif element.kind in breaking and current:
+            runs.append(current)
+            current = []
+    if current:
+        runs.append(current)
+    return runs
+
+
+def deferrable(elements):
+    # Scripts that can take defer: the trailing chain of external scripts,
+    # so no inline or blocking script runs after a deferred one
+    chain = set()
+    for element in reversed([e for e in elements if e.kind in ('js', 'script')]):
+        if 'src' not in element.attrs:
+            break
+        if 'async' in element.attrs or element.attrs.get('type', '').lower() == 'module':
+            continue
+        chain.add(element.start)
+    return chain
+
+
+def _remove(content, start, end):
+    # Removal span of an element, including its line when nothing else is on it
+    line_start = content.rfind('\n', 0, start) + 1
+    line_end = content.find('\n', end)
+    line_end = len(content) if line_end < 0 else line_end
+    if not content[line_start:start].strip() and not content[end:line_end].strip():
+        return line_start, min(line_end + 1, len(content))
+    return start, end
+
+
+def plan_critical(root, content, css_runs):
+    # The CSS to inline for each (run, bundle, critical CSS) of css_runs, ''
+    # for runs that keep a blocking stylesheet. Runs are inlined in order
+    # until the page's budget is spent. Custom properties are kept when the
+    # inlined CSS, the page or a blocking stylesheet reads them; dropping a
+    # run from the budget can bring some back, so this repeats until the
+    # set of inlined runs is stable.
+    inlined = [bool(critical) for _, _, critical in css_runs]
+    while True:
+        reads = VAR_PATTERN.findall(content)
+        for (_, rel, _), keep in zip(css_runs, inlined):
+            if not keep:
+                reads += VAR_PATTERN.findall(read_text(os.path.join(root, rel)))
+        inlines = prune_custom_properties(
+            [critical if keep else '' for (_, _, critical), keep in zip(css_runs, inlined)], reads)
+        fits = list(inlined)
+        total = 0
+        for i, css in enumerate(inlines):
+            if fits[i]:
+                total += len(css.encode('utf-8'))
+                if total > MAX_CRITICAL_BYTES:
+                    fits[i:] = [False] * (len(fits) - i)
+                    break
+        if fits == inlined:
+            return [css if keep else '' for css, keep in zip(inlines, inlined)]
+        inlined = fits
+
+
+def bundle_page(root, page, critical=True):
+    path = os.path.join(root, page)
+    try:
+        content = read_text(path)
+        elements = scan_elements(root, content)
+        edits = []
+        stats = {'requests_before': 0, 'requests_after': 0, 'bytes_before': 0, 'bytes_after': 0,
+                 'critical_bytes': 0}
+        deferred = deferrable(elements)
+
+        css_runs = []
+        tokens = fold_tokens(content) if critical else None
+        for run in find_runs(elements, 'css', ('break',)):
+            rel, key, before, after = build_bundle(root, 'styles', [e.src for e in run])
+            inline = cached_critical(root, rel, key, tokens) if critical and run[0].in_head else ''
+            css_runs.append((run, rel, inline))
+            stats['requests_before'] += len(run)
+            stats['requests_after'] += 1
+            stats['bytes_before'] += before
+            stats['bytes_after'] += after
+
+        inlines = plan_critical(root, content, css_runs) if critical else [''] * len(css_runs)
+        for (run, rel, _), inline in zip(css_runs, inlines):
+            href = urllib.parse.quote(rel)
+            tag = f'<link rel="stylesheet" href="{href}">'
+            if inline:
+                stats['critical_bytes'] += len(inline.encode('utf-8'))
+                tag = (f'<style data-critical>{inline}</style>\n'
+                       f'<link rel="preload" href="{href}" as="style" '
+                       f'onload="this.onload=null;this.rel=\'stylesheet\'">'
+                       f'<noscript>{tag}</noscript>')
+            edits.append((run[0].start, run[0].end, tag))
+            edits.extend((*_remove(content, e.start, e.end), '') for e in run[1:])
+
+        for run in find_runs(elements, 'js', ('script',)):
+            rel, _, before, after = build_bundle(root, 'scripts', [e.src for e in run])
+            defer = ' defer' if run[-1].start in deferred else ''
+            edits.append((run[0].start, run[0].end,
+                          f'<script src="{urllib.parse.quote(rel)}"{defer}></script>'))
+            edits.extend((*_remove(content, e.start, e.end), '') for e in run[1:])
+            stats['requests_before'] += len(run)
+            stats['requests_after'] += 1
+            stats['bytes_before'] += before
+            stats['bytes_after'] += after
+
+        # External scripts in the deferred chain
+        for element in elements:
+            if (element.kind == 'script' and element.start in deferred
+                    and 'defer' not in element.attrs):
+                tag = content[element.start:element.end]
+                edits.append((element.start, element.end, tag.replace('<script', '<script defer', 1)))
+
+        for start, end, replacement in sorted(edits, reverse=True):
+            content = content[:start] + replacement + content[end:]
+        if edits:
+            write_text(path, content)
+    except (OSError, UnicodeDecodeError) as e:
+        return {'page': page, 'error': str(e)}
+    return {'page': page, 'changed': bool(edits), 'bundles': page_bundles(content), 'digest': digest_text(content),
+            **stats}
+
+
+def _bundle_page_star(args):
+    return bundle_page(*args)
+
+
+def prune_bundles(root, keep):
+    removed = []
+    out_dir = os.path.join(root, OUTPUT_DIR)
+    try:
+        names = os.listdir(out_dir)
+    except OSError:
+        return removed
+    for name in sorted(names):
+        rel = f'{OUTPUT_DIR}/{name}'
+        if rel not in keep and not name.endswith('.gz') and not name.endswith('.br'):
+            os.remove(os.path.join(out_dir, name))
+            removed.append(rel)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bundle and minify page CSS/JS, inline critical CSS')
+    parser.add_argument('--root', required=True, help='deploy copy of the site, e.g. dist')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--no-critical', action='store_true',
+                        help='keep blocking stylesheets, do not inline critical CSS')
+    parser.add_argument('--force', action='store_true', help='process every page')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    manifest = BuildManifest.load(os.path.join(args.root, MANIFEST_NAME))
+    key = combine_keys(BUNDLER_VERSION, str(not args.no_critical), str(rjsmin is not None))
+    pages = discover_pages(args.root)
+    dirty = [p for p in pages
+             if args.force or manifest.check(SCOPE, p, os.path.join(args.root, p), key) is not None]
+
+    print(f'Bundling {len(dirty)} of {len(pages)} pages'
+          + ('' if rjsmin else ' (rjsmin not installed: scripts are concatenated, not minified)'))
+    print('=' * 50)
+    jobs = [(args.root, page, not args.no_critical) for page in dirty]
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_bundle_page_star, jobs))
+    else:
+        results = [_bundle_page_star(job) for job in jobs]
+
+    errors = 0
+    for result in results:
+        page = result['page']
+        if 'error' in result:
+            errors += 1
+            print(f'✗ {page}: {result["error"]}')
+            continue
+        # Every bundle the page links is kept, including those of an
+        # earlier run that an edit left in place
+        manifest.record(SCOPE, page, os.path.join(args.root, page), key,
+                        digest=result['digest'], bundles=result['bundles'])
+        if result['changed']:
+            print(f'✓ {page}: {result["requests_before"]} → {result["requests_after"]} requests, '
+                  f'{result["bytes_before"] // 1024} → {result["bytes_after"] // 1024} KB'
+                  + (f', {result["critical_bytes"] // 1024} KB critical CSS inlined'
+                     if result['critical_bytes'] else ''))
+        else:
+            print(f'· {page} (nothing to bundle)')
+
+    manifest.prune(SCOPE, set(pages))
+    keep = {rel for record in manifest.section(SCOPE).values() for rel in record.get('bundles', [])}
+    for rel in prune_bundles(args.root, keep):
+        print(f'  removed {rel}')
+    manifest.save()
+    print(f'Done in {time.perf_counter() - started:.2f}s')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
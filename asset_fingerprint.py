@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# Content-hash asset fingerprinting. Every local script, stylesheet, icon and
+# SVG sprite referenced by a page or shared partial is copied next to itself
+# under a name carrying its content hash (assets/js/main.js ->
+# assets/js/main.3f9a1c2b7d.js), asset-manifest.json maps original to hashed
+# paths, and the <script src>/<link href>/<use href> references are
+# rewritten. Hashed names never change content, so CustomHTTPRequestHandler
+# serves them with a one-year immutable Cache-Control and repeat visits skip
+# them entirely.
+#
+# Runs on the deploy copy, before precompress.py:
+#
+#   python3 asset_fingerprint.py --root dist
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import urllib.parse
+
+from build_manifest import MANIFEST_NAME, BuildManifest, combine_keys, digest_file
+from page_rewrite import Transform, rewrite_pages
+from site_pages import PARTIALS, discover_pages, local_path, read_text
+
+ASSET_MANIFEST = 'asset-manifest.json'
+HASH_LENGTH = 10
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SCOPE = 'asset_fingerprint'
+
+HASHED_NAME_PATTERN = re.compile(r'^(.+)\.[0-9a-f]{%d}(\.[^./]+)$' % HASH_LENGTH)
+REFERENCE_TAG_PATTERN = re.compile(r'<(script|link|use)\b[^>]*>', re.IGNORECASE)
+HREF_ATTR_PATTERN = re.compile(r'''(\shref\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+URL_ATTR_PATTERNS = {
+    'script': re.compile(r'''(\ssrc\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL),
+    'link': HREF_ATTR_PATTERN,
+    # Symbols of an external sprite (svg_sprite.py); the #fragment is kept
+    'use': HREF_ATTR_PATTERN,
+}
+REL_ATTR_PATTERN = re.compile(r'''\srel\s*=\s*(["'])(.*?)\1''', re.IGNORECASE | re.DOTALL)
+AS_ATTR_PATTERN = re.compile(r'''\sas\s*=\s*(["']?)(\w+)\1''', re.IGNORECASE)
+
+# <link> relations whose targets are not fingerprinted: other documents,
+# origins, and the web app manifest (which must keep a stable URL)
+SKIP_LINK_RELS = {'alternate', 'canonical', 'dns-prefetch', 'manifest', 'next', 'preconnect',
+                  'prev', 'search'}
+# Preloads of files that stylesheets and <img> tags request by their plain
+# name (preload_hints.py): a hashed preload would not match the request
+SKIP_PRELOAD_AS = {'font', 'image'}
+
+
+def hashed_name(rel, digest):
+    stem, ext = os.path.splitext(rel)
+    return f'{stem}.{digest[:HASH_LENGTH]}{ext}'
+
+
+def original_name(rel):
+    # assets/js/main.3f9a1c2b7d.js -> assets/js/main.js; other names unchanged
+    match = HASHED_NAME_PATTERN.match(rel)
+    return match.group(1) + match.group(2) if match else rel
+
+
+def iter_references(content):
+    # Yields (match of the url attribute, tag match) for every fingerprintable
+    # <script src>, <link href> and <use href> of a page
+    for tag in REFERENCE_TAG_PATTERN.finditer(content):
+        name = tag.group(1).lower()
+        if name == 'link':
+            rel = REL_ATTR_PATTERN.search(tag.group(0))
+            rels = rel.group(2).lower().split() if rel else []
+            if SKIP_LINK_RELS.intersection(rels):
+                continue
+            as_attr = AS_ATTR_PATTERN.search(tag.group(0))
+            if 'preload' in rels and as_attr and as_attr.group(2).lower() in SKIP_PRELOAD_AS:
+                continue
+        url = URL_ATTR_PATTERNS[name].search(tag.group(0))
+        if url is not None:
+            yield url, tag
+
+
+def find_assets(root, pages):
+    # Local files referenced by the pages, as original (unhashed) paths, so
+    # pages rewritten by an earlier run are picked up again
+    assets = set()
+    for page in pages:
+        for url, _ in iter_references(read_text(os.path.join(root, page))):
+            rel = local_path(url.group(3))
+            if rel is None:
+                continue
+            rel = original_name(rel)
+            if os.path.isfile(os.path.join(root, rel)):
+                assets.add(rel)
+    return sorted(assets)
+
+
+def fingerprint_asset(root, rel, manifest):
+    # Returns the hashed path of rel, copying the file when its content changed
+    path = os.path.join(root, rel)
+    record = manifest.get(SCOPE, rel)
+    if (manifest.check(SCOPE, rel, path, SCOPE) is None
+            and os.path.exists(os.path.join(root, record['hashed']))):
+        return record['hashed'], False
+    digest = digest_file(path)
+    hashed = hashed_name(rel, digest)
+    target = os.path.join(root, hashed)
+    if not os.path.exists(target):
+        tmp = target + '.tmp'
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+    manifest.record(SCOPE, rel, path, SCOPE, digest=digest, hashed=hashed)
+    return hashed, True
+
+
+def load_asset_manifest(root):
+    try:
+        with open(os.path.join(root, ASSET_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_asset_manifest(root, mapping):
+    path = os.path.join(root, ASSET_MANIFEST)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(mapping, f, indent=1, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp, path)
+
+
+class FingerprintRewrite(Transform):
+    name = 'fingerprint'
+    label = 'hashed asset references'
+
+    def __init__(self, mapping, exclude=None):
+        super().__init__(exclude)
+        # original path -> hashed path
+        self.mapping = mapping
+
+    def apply(self, content):
+        out = []
+        pos = 0
+        for url, tag in iter_references(content):
+            rel = local_path(url.group(3))
+            hashed = self.mapping.get(original_name(rel)) if rel else None
+            if hashed is None or hashed == rel:
+                continue
+            parsed = urllib.parse.urlparse(url.group(3).strip())
+            prefix = '/' if parsed.path.startswith('/') else ''
+            new_url = urllib.parse.urlunparse(parsed._replace(path=prefix + urllib.parse.quote(hashed)))
+            start = tag.start() + url.start(3)
+            out.append(content[pos:start])
+            out.append(new_url)
+            pos = tag.start() + url.end(3)
+        out.append(content[pos:])
+        return ''.join(out), True
+
+    def signature(self):
+        return combine_keys(super().signature(),
+                            *(f'{src}:{hashed}' for src, hashed in sorted(self.mapping.items())))
+
+
+class ImmutableAssets:
+    # Hashed paths of the asset manifest, for CustomHTTPRequestHandler. The
+    # manifest is reloaded when it changes, checked at most once per
+    # check_interval seconds.
+    def __init__(self, root, check_interval=1.0):
+        self.path = os.path.join(root, ASSET_MANIFEST)
+        self.check_interval = check_interval
+        self._hashed = frozenset()
+        self._state = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def __contains__(self, rel):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                self._reload()
+        return rel in self._hashed
+
+    def _reload(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._hashed, self._state = frozenset(), None
+            return
+        state = (st.st_mtime_ns, st.st_size)
+        if state != self._state:
+            self._state = state
+            self._hashed = frozenset(load_asset_manifest(os.path.dirname(self.path)).values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Copy assets to content-hashed names and '
+                                                 'rewrite page references')
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--keep-old', action='store_true',
+                        help='keep hashed copies that are no longer referenced')
+    parser.add_argument('--dry-run', action='store_true', help='report page changes without writing')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    pages = discover_pages(args.root) + [p for p in PARTIALS
+                                         if os.path.exists(os.path.join(args.root, p))]
+    manifest = BuildManifest.load(os.path.join(args.root, MANIFEST_NAME))
+    previous = load_asset_manifest(args.root)
+    assets = find_assets(args.root, pages)
+
+    print(f'Fingerprinting {len(assets)} assets referenced by {len(pages)} pages')
+    print('=' * 50)
+    mapping = {}
+    copied = 0
+    for rel in assets:
+        if args.dry_run:
+            record = manifest.get(SCOPE, rel)
+            mapping[rel] = record['hashed'] if record else hashed_name(
+                rel, digest_file(os.path.join(args.root, rel)))
+            continue
+        mapping[rel], changed = fingerprint_asset(args.root, rel, manifest)
+        if changed:
+            copied += 1
+            print(f'✓ {rel} -> {os.path.basename(mapping[rel])}')
+
+    if not args.dry_run:
+        if not args.keep_old:
+            current = set(mapping.values())
+            for stale in sorted(set(previous.values()) - current):
+                if HASHED_NAME_PATTERN.match(stale):
+                    try:
+                        os.remove(os.path.join(args.root, stale))
+                        print(f'  removed {stale}')
+                    except FileNotFoundError:
+                        pass
+        manifest.prune(SCOPE, set(assets))
+        manifest.save()
+        if mapping != previous:
+            save_asset_manifest(args.root, mapping)
+        print(f'{copied} assets copied, {len(assets) - copied} unchanged')
+        print()
+
+    results = rewrite_pages(args.root, pages, [FingerprintRewrite(mapping)],
+                            workers=args.workers, dry_run=args.dry_run)
+    errors = [r for r in results if r.error]
+    changed = [r.page for r in results if r.changed]
+    for result in errors:
+        print(f'✗ {result.page}: {result.error}')
+    verb = 'would be rewritten' if args.dry_run else 'rewritten'
+    print(f'{len(changed)} pages {verb} in {time.perf_counter() - started:.2f}s')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -70,11 +70,45 @@ class SpectacleSync {
   updatePageContent() {
     if (!this.spectacleData) return;
 
-    this.updateMetaTags();
-    this.updateHeroSection();
-    this.updateContentSections();
-    this.updateSidebar();
-    this.updateMediaContent();
+    // Pages prerendered by spectacle_prerender.py carry the versions of the
+    // data they were built from: only redo the parts that changed since
+    const spectacleVersion = this.spectacleData.updated_at || '';
+    if (spectacleVersion !== this.getVersion('spectacle-version')) {
+      this.updateMetaTags();
+      this.updateHeroSection();
+      this.updateContentSections();
+      this.updateSpectacleInfo();
+      this.updatePricing();
+      this.updateMediaContent();
+      this.setVersion('spectacle-version', spectacleVersion);
+    }
+
+    const sessionsVersion = this.getSessionsVersion();
+    if (sessionsVersion !== this.getVersion('spectacle-sessions-version')) {
+      this.updateShowtimes();
+      this.setVersion('spectacle-sessions-version', sessionsVersion);
+    }
+  }
+
+  getSessionsVersion() {
+    return this.spectacleSessions
+      .map(session => `${session.id}@${session.updated_at || ''}`)
+      .join(',');
+  }
+
+  getVersion(name) {
+    const meta = document.querySelector(`meta[name="${name}"]`);
+    return meta ? meta.getAttribute('content') : null;
+  }
+
+  setVersion(name, version) {
+    let meta = document.querySelector(`meta[name="${name}"]`);
+    if (!meta) {
+      meta = document.createElement('meta');
+      meta.setAttribute('name', name);
+      document.head.appendChild(meta);
+    }
+    meta.setAttribute('content', version);
   }
 
   updateMetaTags() {
@@ -85,8 +119,9 @@ class SpectacleSync {
     
     // Update meta description
     const metaDesc = document.querySelector('meta[name="description"]');
-    if (metaDesc && data.short_description) {
-      metaDesc.setAttribute('content', data.short_description);
+    const description = data.meta_description || data.short_description;
+    if (metaDesc && description) {
+      metaDesc.setAttribute('content', description);
     }
     
     // Update meta keywords
@@ -107,8 +142,9 @@ class SpectacleSync {
     
     // Update hero subtitle
     const heroSubtitle = document.querySelector('.hero-subtitle, .spectacle-hero__subtitle');
-    if (heroSubtitle && data.short_description) {
-      heroSubtitle.textContent = data.short_description;
+    const subtitle = data.subtitle || data.short_description;
+    if (heroSubtitle && subtitle) {
+      heroSubtitle.textContent = subtitle;
     }
     
     // Update hero description
@@ -183,12 +219,6 @@ class SpectacleSync {
     });
   }
 
-  updateSidebar() {
-    this.updateSpectacleInfo();
-    this.updateShowtimes();
-    this.updatePricing();
-  }
-
   updateSpectacleInfo() {
     const data = this.spectacleData;
     
@@ -234,7 +264,8 @@ class SpectacleSync {
     item.className = 'showtime-item';
     
     const sessionDate = new Date(session.session_date);
-    const dateStr = sessionDate.toLocaleDateString('fr-FR', {
+    // A month-only or free-text label ("Décembre 2025") is shown as is
+    const dateStr = session.date_label || sessionDate.toLocaleDateString('fr-FR', {
       weekday: 'long',
       year: 'numeric',
       month: 'long',
@@ -395,7 +426,7 @@ class SpectacleSync {
         .order('session_date', { ascending: true });
       
       this.spectacleSessions = sessions || [];
-      this.updateShowtimes();
+      this.updatePageContent();
     }
   }
 }
@@ -0,0 +1,319 @@
+/**
+ * Spectacles Catalogue
+ * Search and filters of spectacles.html over the prebuilt index
+ * (assets/data/spectacles-index.json, written by spectacle_prerender.py).
+ *
+ * A query is an AND of bitmaps: the selected level or age group (facet
+ * bitmaps of the index) and, for each word typed, the spectacles of every
+ * indexed term starting with it. The page ships the first cards; cards of
+ * the other matches are only built when the end of the list scrolls into
+ * view, a batch at a time.
+ */
+
+class SpectaclesCatalogue {
+  constructor(options = {}) {
+    this.container = document.querySelector('#spectacles-container');
+    this.searchInput = document.querySelector('#spectaclesSearch');
+    this.counter = document.querySelector('.spectacles-search .results-counter');
+    this.emptyMessage = document.querySelector('#spectaclesEmpty');
+    this.sentinel = document.querySelector('#spectaclesMore');
+    this.batchSize = options.batchSize || 6;
+    // Facet groups the filter buttons select from
+    this.filterGroups = options.filterGroups || ['audience', 'age'];
+
+    this.index = null;
+    this.filter = 'all';
+    this.query = '';
+    this.matches = [];
+    this.shown = 0;
+    // slug -> card element, prerendered or built from the index
+    this.cards = new Map();
+    this.bitmaps = new Map();
+
+    if (!this.container) return;
+    this.container.querySelectorAll('.spectacle-item[data-slug]').forEach(card => {
+      this.cards.set(card.dataset.slug, card);
+    });
+    this.bindEvents();
+    this.ready = this.load();
+  }
+
+  indexUrl() {
+    // The preload link carries the (possibly fingerprinted) index URL
+    const link = document.getElementById('spectaclesIndex');
+    return link ? link.href : 'assets/data/spectacles-index.json';
+  }
+
+  async load() {
+    try {
+      const response = await fetch(this.indexUrl());
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      this.index = await response.json();
+    } catch (error) {
+      // Keep the prerendered cards; filters fall back to data-category
+      console.error('Error loading spectacles index:', error);
+      return;
+    }
+    this.field = {};
+    this.index.fields.forEach((name, i) => { this.field[name] = i; });
+    this.stopwords = new Set(this.index.stopwords);
+    this.byteLength = (this.index.count + 7) >> 3;
+
+    if (this.filter === 'all' && !this.query && this.isPrerenderedPrefix()) {
+      // The page already shows the first matches: only wire the lazy loading
+      this.matches = this.index.docs.map((doc, i) => i);
+      this.shown = this.cards.size;
+      this.updateCounter();
+      this.observe();
+    } else {
+      this.update();
+    }
+  }
+
+  isPrerenderedPrefix() {
+    // True when the prerendered cards are the first spectacles of the index
+    const slugs = [...this.cards.keys()];
+    return slugs.every((slug, i) => i < this.index.count &&
+      this.index.docs[i][this.field.slug] === slug);
+  }
+
+  bindEvents() {
+    if (this.searchInput) {
+      let timer = null;
+      this.searchInput.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => this.setQuery(this.searchInput.value), 120);
+      });
+    }
+    if (this.sentinel && 'IntersectionObserver' in window) {
+      this.observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+          this.showMore();
+        }
+      }, { rootMargin: '300px 0px' });
+    }
+  }
+
+  observe() {
+    // Re-observing reports the sentinel's current visibility again, so the
+    // next batch follows while the end of the list is still on screen
+    if (!this.observer) return;
+    this.observer.unobserve(this.sentinel);
+    if (this.shown < this.matches.length) {
+      this.observer.observe(this.sentinel);
+    }
+  }
+
+  setFilter(value) {
+    this.filter = value || 'all';
+    this.refresh();
+  }
+
+  setQuery(text) {
+    this.query = (text || '').trim();
+    this.refresh();
+  }
+
+  refresh() {
+    if (!this.container) return;
+    this.ready.then(() => {
+      if (this.index) {
+        this.update();
+      } else {
+        this.fallbackFilter();
+      }
+    });
+  }
+
+  update() {
+    this.matches = this.computeMatches();
+    this.shown = 0;
+    this.cards.forEach(card => { card.style.display = 'none'; });
+    this.showMore();
+    this.updateCounter();
+  }
+
+  showMore() {
+    const next = this.matches.slice(this.shown, this.shown + this.batchSize);
+    next.forEach(i => {
+      const card = this.getCard(i);
+      // Appending in match order keeps the list order whatever was built before
+      this.container.appendChild(card);
+      card.style.display = 'block';
+    });
+    this.shown += next.length;
+    this.observe();
+  }
+
+  updateCounter() {
+    const count = this.matches.length;
+    if (this.counter) {
+      this.counter.textContent = `${count} spectacle${count > 1 ? 's' : ''} disponible${count > 1 ? 's' : ''}`;
+    }
+    if (this.emptyMessage) {
+      this.emptyMessage.hidden = count > 0;
+    }
+  }
+
+  computeMatches() {
+    const bits = new Uint8Array(this.byteLength).fill(255);
+    if (this.filter !== 'all') {
+      this.intersect(bits, this.facetBitmap(this.filter));
+    }
+    this.tokenize(this.query).forEach(word => {
+      this.intersect(bits, this.prefixBitmap(word));
+    });
+    const matches = [];
+    for (let i = 0; i < this.index.count; i++) {
+      if (bits[i >> 3] & (1 << (i & 7))) {
+        matches.push(i);
+      }
+    }
+    return matches;
+  }
+
+  intersect(bits, other) {
+    for (let i = 0; i < bits.length; i++) {
+      bits[i] &= other[i];
+    }
+  }
+
+  facetBitmap(value) {
+    if (!this.bitmaps.has(value)) {
+      const group = this.filterGroups.find(name => (this.index.facets[name] || {})[value]);
+      const encoded = group ? this.index.facets[group][value] : null;
+      this.bitmaps.set(value, encoded ? this.decode(encoded) : new Uint8Array(this.byteLength));
+    }
+    return this.bitmaps.get(value);
+  }
+
+  prefixBitmap(word) {
+    // Union of the postings of every term starting with word
+    const terms = this.index.terms;
+    let low = 0;
+    let high = terms.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (terms[mid] < word) {
+        low = mid + 1;
+      } else {
+        high = mid;
+      }
+    }
+    const bits = new Uint8Array(this.byteLength);
+    for (let j = low; j < terms.length && terms[j].startsWith(word); j++) {
+      this.index.postings[j].forEach(i => { bits[i >> 3] |= 1 << (i & 7); });
+    }
+    return bits;
+  }
+
+  decode(encoded) {
+    const raw = atob(encoded);
+    const bits = new Uint8Array(this.byteLength);
+    for (let i = 0; i < raw.length; i++) {
+      bits[i] = raw.charCodeAt(i);
+    }
+    return bits;
+  }
+
+  tokenize(text) {
+    // Same normalization as spectacle_index.tokenize()
+    return text.toLowerCase().normalize('NFD').replace(/\p{Mn}/gu, '')
+      .split(/[^\p{L}\p{N}]+/u)
+      .filter(token => token.length >= this.index.minTokenLength && !this.stopwords.has(token));
+  }
+
+  getCard(i) {
+    const doc = this.index.docs[i];
+    const slug = doc[this.field.slug];
+    if (!this.cards.has(slug)) {
+      this.cards.set(slug, this.createCard(doc, i));
+    }
+    return this.cards.get(slug);
+  }
+
+  docFilters(i) {
+    const filters = [];
+    this.filterGroups.forEach(group => {
+      Object.keys(this.index.facets[group] || {}).forEach(value => {
+        if (this.facetBitmap(value)[i >> 3] & (1 << (i & 7))) {
+          filters.push(value);
+        }
+      });
+    });
+    return filters.join(' ');
+  }
+
+  createCard(doc, i) {
+    // Same markup as render_card() in spectacle_prerender.py
+    const get = name => escapeHtml(doc[this.field[name]]);
+    const filters = escapeHtml(this.docFilters(i));
+    const meta = [['fa-calendar-alt', 'period'], ['fa-users', 'ages'], ['fa-clock', 'duration'],
+      ['fa-map-marker-alt', 'venue']]
+      .filter(([, name]) => doc[this.field[name]])
+      .map(([icon, name]) => `
+            <div class="meta-item">
+              <div class="meta-icon"><i class="fas ${icon}"></i></div>
+              <span>${get(name)}</span>
+            </div>`).join('');
+
+    const card = document.createElement('div');
+    card.className = `col-lg-4 col-md-6 spectacle-item ${filters}`.trim();
+    card.dataset.category = filters;
+    card.dataset.slug = doc[this.field.slug];
+    card.innerHTML = `
+      <div class="spectacle-card fade-in-up visible">
+        <div class="card-image-wrapper">
+          <img src="${get('image')}" alt="${get('title')}" class="card-image" loading="lazy">
+          <div class="card-status">Disponible</div>
+          <div class="card-category">${get('category')}</div>
+        </div>
+        <div class="card-content">
+          <h3 class="card-title">${get('title')}</h3>
+          <p class="card-description">
+            ${get('description')}
+          </p>
+          <div class="card-meta">${meta}
+          </div>
+          <div class="card-actions">
+            <a href="${get('booking')}" class="btn-primary-custom">
+              <i class="fas fa-ticket-alt"></i> Réserver
+            </a>
+            <a href="spectacle-${get('slug')}.html" class="btn-secondary-custom">
+              <i class="fas fa-info-circle"></i> Détails
+            </a>
+          </div>
+        </div>
+      </div>
+    `;
+    return card;
+  }
+
+  fallbackFilter() {
+    // Without the index: filter the prerendered cards by data-category
+    this.cards.forEach(card => {
+      const categories = (card.dataset.category || '').split(' ');
+      const show = this.filter === 'all' || categories.includes(this.filter);
+      card.style.display = show ? 'block' : 'none';
+    });
+  }
+}
+
+function escapeHtml(value) {
+  return String(value)
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;');
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  window.spectaclesCatalogue = new SpectaclesCatalogue();
+});
+
+// Export for module usage
+if (typeof module !== 'undefined' && module.exports) {
+  module.exports = SpectaclesCatalogue;
+}
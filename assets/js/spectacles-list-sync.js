@@ -31,7 +31,11 @@ class SpectaclesListSync {
     setTimeout(async () => {
       await this.loadSpectaclesData();
       await this.loadCategories();
-      this.updateSpectaclesList();
+      // spectacles.html is prerendered by spectacle_prerender.py: keep its
+      // cards unless a spectacle changed since the build
+      if (this.getListVersion() !== this.getPrerenderedVersion()) {
+        this.updateSpectaclesList();
+      }
       this.setupFilters();
       this.setupRealTimeUpdates();
     }, 2000);
@@ -133,6 +137,17 @@ class SpectaclesListSync {
     this.updateSpectaclesCounter(filteredSpectacles.length);
   }
 
+  getListVersion() {
+    return this.spectacles
+      .map(spectacle => `${spectacle.id}@${spectacle.updated_at || ''}`)
+      .join(',');
+  }
+
+  getPrerenderedVersion() {
+    const meta = document.querySelector('meta[name="spectacles-version"]');
+    return meta ? meta.getAttribute('content') : null;
+  }
+
   filterSpectacles() {
     if (this.currentFilter === 'all') {
       return this.spectacles;
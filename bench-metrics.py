@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# Request metrics overhead benchmark: the cost of one RequestMetrics.record()
+# call (single thread and contended), and server throughput, latency and
+# CPU per request with metrics on and with --no-metrics.
+#
+#   python3 bench-metrics.py --iterations 200000 --duration 5
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from request_metrics import RequestMetrics, route_label
+
+PATHS = [
+    '/',
+    '/spectacles',
+    '/about',
+    '/assets/css/style.css',
+    '/assets/js/main.js',
+    '/missing-page',
+]
+
+ROUTES = [route_label(p) for p in ('index.html', 'spectacles.html', 'about.html',
+                                   'assets/css/style.css', 'assets/js/main.js')] + [None]
+
+
+def bench_record(iterations, threads):
+    # Nanoseconds per record() call with `threads` threads recording at once
+    metrics = RequestMetrics()
+
+    def work():
+        for i in range(iterations):
+            metrics.record(ROUTES[i % len(ROUTES)], 200, 1024, 0.0003 * (i % 7))
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return elapsed / (iterations * threads) * 1e9
+
+
+def bench_label(iterations):
+    # Nanoseconds per route_label() call (cached)
+    rels = ['index.html', 'spectacles.html', 'assets/js/main.3f9a1c2b7d.js', 'assets/img/a.jpg']
+    started = time.perf_counter()
+    for i in range(iterations):
+        route_label(rels[i % len(rels)])
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, extra_args):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'custom_server.py')
+    proc = subprocess.Popen([sys.executable, script, '--port', str(port)] + extra_args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def cpu_seconds(pid):
+    # user + system CPU of a running process, from /proc (Linux)
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rpartition(')')[2].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_client(port, stop, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    i = 0
+    while not stop.is_set():
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            conn.getresponse().read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def run_load(extra_args, duration, concurrency):
+    port = free_port()
+    proc = start_server(port, extra_args)
+    try:
+        # Warm the file cache before measuring
+        for path in PATHS:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            conn.close()
+
+        latencies = []
+        stop = threading.Event()
+        clients = [threading.Thread(target=run_client, args=(port, stop, latencies), daemon=True)
+                   for _ in range(concurrency)]
+        cpu_before = cpu_seconds(proc.pid)
+        started = time.perf_counter()
+        for t in clients:
+            t.start()
+        time.sleep(duration)
+        stop.set()
+        for t in clients:
+            t.join(6)
+        elapsed = time.perf_counter() - started
+        cpu_after = cpu_seconds(proc.pid)
+    finally:
+        proc.kill()
+        proc.wait()
+    cpu_us = None
+    if cpu_before is not None and cpu_after is not None and latencies:
+        cpu_us = (cpu_after - cpu_before) / len(latencies) * 1e6
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_us': cpu_us,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the request metrics overhead')
+    parser.add_argument('--iterations', type=int, default=200000, help='record() calls per thread')
+    parser.add_argument('--threads', type=int, default=8, help='threads for the contended run')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per load run, 0 skips')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client connections')
+    args = parser.parse_args()
+
+    print('Request metrics overhead')
+    print('=' * 60)
+    rows = [
+        ('route_label (cached)', bench_label(args.iterations)),
+        ('record, 1 thread', bench_record(args.iterations, 1)),
+        (f'record, {args.threads} threads', bench_record(args.iterations, args.threads)),
+    ]
+    for label, ns in rows:
+        print(f'{label:<28}{ns:>8.0f} ns/call')
+    if args.duration <= 0:
+        return
+
+    print()
+    print(f'Load test: {args.concurrency} clients, {args.duration:g}s per run')
+    print(f'{"mode":<16}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"CPU us/req":>12}')
+    results = {}
+    for label, extra in (('--no-metrics', ['--no-metrics']), ('metrics', [])):
+        result = results[label] = run_load(extra, args.duration, args.concurrency)
+        cpu = f'{result["cpu_us"]:.0f}' if result['cpu_us'] is not None else '-'
+        print(f'{label:<16}{result["rps"]:>10.1f}{result["p50_ms"]:>10.2f}'
+              f'{result["p99_ms"]:>10.2f}{cpu:>12}')
+    base, on = results['--no-metrics'], results['metrics']
+    if base['cpu_us'] and on['cpu_us']:
+        print(f'CPU overhead: {on["cpu_us"] - base["cpu_us"]:+.1f} us/request '
+              f'({(on["cpu_us"] / base["cpu_us"] - 1) * 100:+.1f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Micro-benchmark of clean-URL routing cost per request: the previous
+# per-request filesystem probing against the precomputed RouteIndex.
+#
+#   python3 bench-routing.py --iterations 200000
+import argparse
+import os
+import time
+
+from route_index import RouteIndex
+
+SAMPLE_PATHS = [
+    '/',
+    '/spectacles',
+    '/spectacle-casse-noisette',
+    '/about',
+    '/index.html',
+    '/assets/css/style.css',
+    '/assets/js/main.js',
+    '/missing-page',
+    '/assets/img/missing.jpg',
+]
+
+SPECTACLE_PAGES = [
+    'spectacle-alice-chez-les-merveilles',
+    'spectacle-antigone',
+    'spectacle-casse-noisette',
+    'spectacle-charlotte',
+    'spectacle-estevanico',
+    'spectacle-le-petit-prince',
+    'spectacle-leau-la',
+    'spectacle-lenfant-de-larbre',
+    'spectacle-simple-comme-bonjour',
+    'spectacle-tara-sur-la-lune'
+]
+
+
+def legacy_route(path, root):
+    # The routing done by custom_server.py before the route index, plus the
+    # stat SimpleHTTPRequestHandler needs to find out the file is missing
+    path = path[1:] if path.startswith('/') else path
+    if not path:
+        path = 'index.html'
+    if path in SPECTACLE_PAGES:
+        path = path + '.html'
+    elif not path.endswith('.html') and '.' not in path:
+        html_path = path + '.html'
+        if os.path.exists(os.path.join(root, html_path)):
+            path = html_path
+    full = os.path.join(root, path)
+    return path if os.path.isfile(full) else None
+
+
+def measure(fn, paths, iterations):
+    started = time.perf_counter()
+    n = 0
+    while n < iterations:
+        for path in paths:
+            fn(path)
+        n += len(paths)
+    return (time.perf_counter() - started) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark clean-URL routing cost')
+    parser.add_argument('--root', default='.')
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    started = time.perf_counter()
+    index = RouteIndex(root, poll_interval=0)
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    index.refresh()
+    rescan = time.perf_counter() - started
+
+    legacy = measure(lambda p: legacy_route(p, root), SAMPLE_PATHS, args.iterations)
+    indexed = measure(index.resolve, SAMPLE_PATHS, args.iterations)
+
+    print('Routing cost per request')
+    print('=' * 50)
+    print(f'Route index: {len(index):,} routes built in {build * 1000:.1f} ms, '
+          f'no-change rescan {rescan * 1000:.2f} ms')
+    print(f'  filesystem probing : {legacy * 1e6:8.2f} µs/request')
+    print(f'  route index lookup : {indexed * 1e6:8.2f} µs/request')
+    print(f'  speedup            : {legacy / indexed:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
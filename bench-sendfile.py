@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# Large-file serving benchmark: server CPU time per GB served with file
+# bodies copied through Python buffers (--no-sendfile, the previous
+# behaviour) and with sendfile, for whole downloads and for chunked range
+# requests (resumed downloads, media seeking).
+#
+#   python3 bench-sendfile.py --size 64 --total 2
+import argparse
+import http.client
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+READ_SIZE = 1024 * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, extra_args):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'custom_server.py')
+    proc = subprocess.Popen([sys.executable, script, '--port', str(port)] + extra_args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def cpu_seconds(pid):
+    # user + system CPU of a running process, from /proc (Linux)
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rpartition(')')[2].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def download(port, path, file_size, total_bytes, chunk_bytes):
+    # Fetches path until total_bytes have been received; with chunk_bytes the
+    # file is requested in consecutive Range requests
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    received = offset = 0
+    try:
+        while received < total_bytes:
+            headers = {}
+            if chunk_bytes:
+                end = min(offset + chunk_bytes, file_size) - 1
+                headers['Range'] = f'bytes={offset}-{end}'
+                offset = 0 if end + 1 >= file_size else end + 1
+            conn.request('GET', path, headers=headers)
+            resp = conn.getresponse()
+            if resp.status not in (200, 206):
+                raise RuntimeError(f'unexpected status {resp.status}')
+            while True:
+                data = resp.read(READ_SIZE)
+                if not data:
+                    break
+                received += len(data)
+    finally:
+        conn.close()
+    return received
+
+
+def run(root, file_size, total_bytes, chunk_bytes, extra_args):
+    port = free_port()
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    proc = start_server(port, ['--root', root] + extra_args)
+    try:
+        cpu_before = cpu_seconds(proc.pid)
+        started = time.perf_counter()
+        received = download(port, '/media.bin', file_size, total_bytes, chunk_bytes)
+        elapsed = time.perf_counter() - started
+        cpu_after = cpu_seconds(proc.pid)
+    finally:
+        proc.kill()
+        proc.wait()
+    if cpu_before is None or cpu_after is None:
+        # No /proc: whole-process CPU from rusage, including start-up
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = ((usage_after.ru_utime + usage_after.ru_stime)
+               - (usage_before.ru_utime + usage_before.ru_stime))
+    else:
+        cpu = cpu_after - cpu_before
+    gb = received / 1024 ** 3
+    return {'gb': gb, 'cpu_per_gb': cpu / gb, 'mb_per_s': received / 1024 ** 2 / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark server CPU per GB for large files')
+    parser.add_argument('--size', type=int, default=64, help='test file size in MB')
+    parser.add_argument('--total', type=float, default=2.0, help='GB to download per run')
+    parser.add_argument('--chunk', type=int, default=4, help='range request size in MB')
+    args = parser.parse_args()
+
+    file_size = args.size * 1024 * 1024
+    total_bytes = int(args.total * 1024 ** 3)
+    chunk_bytes = args.chunk * 1024 * 1024
+    runs = [
+        ('copy, whole file', 0, ['--no-sendfile']),
+        ('sendfile, whole file', 0, []),
+        (f'copy, {args.chunk} MB ranges', chunk_bytes, ['--no-sendfile']),
+        (f'sendfile, {args.chunk} MB ranges', chunk_bytes, []),
+    ]
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, 'media.bin'), 'wb') as f:
+            for _ in range(args.size):
+                f.write(os.urandom(1024 * 1024))
+
+        print(f'Large file serving: {args.size} MB file, {args.total:g} GB per run')
+        print('=' * 60)
+        print(f'{"mode":<28}{"CPU s/GB":>12}{"MB/s":>10}{"GB":>10}')
+        for label, chunk, extra in runs:
+            result = run(root, file_size, total_bytes, chunk, extra)
+            print(f'{label:<28}{result["cpu_per_gb"]:>12.3f}{result["mb_per_s"]:>10.0f}'
+                  f'{result["gb"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
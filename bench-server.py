@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# Load-test benchmark: compares the single-threaded server against the
+# concurrent worker-pool server, and optionally the pre-fork supervisor
+# with several worker processes, on the same set of pages and assets.
+#
+#   python3 bench-server.py --duration 10 --concurrency 16 --slow-clients 1
+#   python3 bench-server.py --workers 4 --idle-clients 24     # idle keep-alive browsers
+#   python3 bench-server.py --processes 0 --client-processes 4   # one process per core
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import prefork
+
+DEFAULT_PATHS = [
+    '/',
+    '/spectacles',
+    '/spectacle-tara-sur-la-lune',
+    '/assets/css/style.css',
+    '/assets/js/main.js',
+    '/assets/img/children drawing on the wall pattern v1.jpg',
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, extra_args):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'custom_server.py')
+    proc = subprocess.Popen([sys.executable, script, '--port', str(port)] + extra_args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def hold_slow_client(port, stop):
+    # Sends an incomplete request and keeps the connection open, like a
+    # stalled mobile client.
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=1) as s:
+            s.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\n')
+            stop.wait()
+    except OSError:
+        pass
+
+
+def hold_idle_client(port, stop, ready):
+    # Makes one request and keeps the connection open without using it,
+    # like a browser between page views.
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', '/')
+        conn.getresponse().read()
+    except (OSError, http.client.HTTPException):
+        pass
+    ready.release()
+    stop.wait()
+    conn.close()
+
+
+def run_client(port, paths, stop, latencies, errors, timeout):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('GET', quote(path))
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                errors.append(resp.status)
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append('conn')
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def collect_load(port, paths, duration, concurrency, slow_clients, timeout, idle_clients=0):
+    stop = threading.Event()
+    slow = [threading.Thread(target=hold_slow_client, args=(port, stop), daemon=True)
+            for _ in range(slow_clients)]
+    for t in slow:
+        t.start()
+    time.sleep(0.1 if slow_clients else 0)
+    ready = threading.Semaphore(0)
+    idle = [threading.Thread(target=hold_idle_client, args=(port, stop, ready), daemon=True)
+            for _ in range(idle_clients)]
+    for t in idle:
+        t.start()
+    for _ in idle:
+        ready.acquire()
+
+    latencies, errors = [], []
+    clients = [threading.Thread(target=run_client,
+                                args=(port, paths, stop, latencies, errors, timeout),
+                                daemon=True)
+               for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in clients:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in clients:
+        t.join(timeout + 1)
+    elapsed = time.perf_counter() - started
+    return latencies, len(errors), elapsed
+
+
+def run_load(port, paths, duration, concurrency, slow_clients, timeout, client_processes=1,
+             idle_clients=0):
+    # Clients in one Python process are capped by its GIL; spread them over
+    # client_processes to load a multi-process server
+    if client_processes <= 1:
+        latencies, errors, elapsed = collect_load(port, paths, duration, concurrency,
+                                                  slow_clients, timeout, idle_clients)
+    else:
+        shares = [concurrency // client_processes + (i < concurrency % client_processes)
+                  for i in range(client_processes)]
+        with ProcessPoolExecutor(max_workers=client_processes) as pool:
+            runs = list(pool.map(collect_load, [port] * client_processes,
+                                 [paths] * client_processes, [duration] * client_processes,
+                                 shares, [slow_clients if i == 0 else 0
+                                          for i in range(client_processes)],
+                                 [timeout] * client_processes,
+                                 [idle_clients if i == 0 else 0
+                                  for i in range(client_processes)]))
+        latencies = [latency for run in runs for latency in run[0]]
+        errors = sum(run[1] for run in runs)
+        elapsed = max(run[2] for run in runs)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark single-threaded vs concurrent serving')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent client connections')
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='connections that send a partial request and stall')
+    parser.add_argument('--idle-clients', type=int, default=0,
+                        help='connections kept open, unused, after one request')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--processes', type=int, default=None,
+                        help='also run the pre-fork server with this many processes '
+                             '(0: one per CPU core)')
+    parser.add_argument('--client-processes', type=int, default=1,
+                        help='processes the client connections are spread over (default: 1)')
+    parser.add_argument('--timeout', type=float, default=2.0, help='client socket timeout')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='request path (repeatable, default: a mix of pages and assets)')
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    modes = [
+        ('single-threaded', ['--single-threaded']),
+        (f'thread pool ({args.workers} workers)', ['--workers', str(args.workers)]),
+    ]
+    if args.processes is not None:
+        processes = args.processes or prefork.default_processes()
+        modes.append((f'pre-fork ({processes} processes)',
+                      ['--workers', str(args.workers), '--processes', str(processes)]))
+
+    print(f'Load test: {args.concurrency} clients, {args.slow_clients} slow clients, '
+          f'{args.idle_clients} idle clients, {args.duration:.0f}s per run')
+    print('=' * 72)
+    print(f'{"mode":<28}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"ok":>8}{"errors":>8}')
+    for label, extra in modes:
+        port = free_port()
+        proc = start_server(port, extra)
+        try:
+            result = run_load(port, paths, args.duration, args.concurrency,
+                              args.slow_clients, args.timeout, args.client_processes,
+                              args.idle_clients)
+        finally:
+            # SIGTERM, so that a supervisor stops its workers
+            proc.terminate()
+            proc.wait()
+        print(f'{label:<28}{result["rps"]:>10.1f}{result["p50_ms"]:>10.2f}'
+              f'{result["p99_ms"]:>10.2f}{result["requests"]:>8}{result["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# Performance regression suite. One run measures:
+#
+#   - the server under load (custom_server.py, or server.py with --server):
+#     requests/s, p50/p99 latency, CPU time per request and peak RSS of the
+#     server processes, with client threads fetching every page by its
+#     clean URL and the resources of the home page
+#   - every HTML page's transfer weight and request count (the page plus
+#     everything it loads, compressible files at their served size), from
+#     link_graph.ReferenceGraph
+#
+# Results are appended to a JSON history file, and the run fails (exit
+# status 1) when a budget of the config file (bench-budget.json) is
+# exceeded or when a metric regressed past its tolerance against the
+# median of the last passing runs on the same host and load settings.
+# --accept records an intended regression as passing; the baseline then
+# starts from that run.
+#
+#   python3 bench-suite.py
+#   python3 bench-suite.py --root dist --duration 10 --concurrency 16
+#   python3 bench-suite.py --no-load            # page weight only
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+from link_graph import ReferenceGraph
+from site_pages import discover_pages
+
+DEFAULT_CONFIG = 'bench-budget.json'
+DEFAULT_HISTORY = 'bench-history.json'
+DEFAULT_SETTINGS = {
+    'server': 'custom_server.py',
+    'server_args': [],
+    'duration': 5.0,
+    'concurrency': 8,
+    'timeout': 5.0,
+    'history': DEFAULT_HISTORY,
+    'history_size': 200,
+    'budgets': {},
+    'regression': {'baseline_runs': 5, 'server_tolerance': 0.25, 'page_tolerance': 0.05},
+}
+
+# Server metrics: key -> True when higher is better
+SERVER_METRICS = {
+    'rps': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'cpu_us': False,
+    'peak_rss_mb': False,
+}
+# Budget keys of the config and the server metric they bound
+SERVER_BUDGETS = {
+    'rps_min': 'rps',
+    'p50_ms_max': 'p50_ms',
+    'p99_ms_max': 'p99_ms',
+    'cpu_us_max': 'cpu_us',
+    'peak_rss_mb_max': 'peak_rss_mb',
+}
+PAGE_BUDGETS = {
+    'transfer_kb_max': 'transfer_kb',
+    'requests_max': 'requests',
+}
+
+
+def load_config(path):
+    settings = json.loads(json.dumps(DEFAULT_SETTINGS))
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return settings
+    regression = dict(settings['regression'], **config.pop('regression', {}))
+    settings.update(config)
+    settings['regression'] = regression
+    return settings
+
+
+# --- Load ----------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(script, port, root, extra_args):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    proc = subprocess.Popen([sys.executable, script, '--port', str(port), '--root', root]
+                            + extra_args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{os.path.basename(script)} exited with status {proc.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def process_tree(pid):
+    # pid and its descendants (the workers of a supervisor), from /proc
+    parents = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                parents[int(name)] = int(f.read().rpartition(')')[2].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    tree = [pid]
+    for current in tree:
+        tree.extend(child for child, parent in parents.items() if parent == current)
+    return tree
+
+
+def cpu_seconds(pids):
+    # user + system CPU of running processes, from /proc (Linux); None elsewhere
+    total = 0.0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rpartition(')')[2].split()
+        except OSError:
+            return None
+        total += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return total
+
+
+def peak_rss_mb(pids):
+    # Sum of the peak resident set sizes (VmHWM) of the processes
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            return None
+    return total / 1024
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_client(port, paths, offset, stop, latencies, errors, timeout):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    i = offset
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'br, gzip'})
+            resp = conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            continue
+        if resp.status >= 400:
+            errors.append(path)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def load_paths(graph, pages):
+    # Every page by its clean URL, plus the resources of the home page
+    paths = ['/' if page == 'index.html' else '/' + quote(page[:-5]) for page in pages]
+    if 'index.html' in pages:
+        paths += ['/' + quote(rel) for rel in sorted(graph.page_resources('index.html'))
+                  if rel != 'index.html']
+    return paths
+
+
+def run_load(settings, root, paths):
+    port = free_port()
+    proc = start_server(settings['server'], port, root, settings['server_args'])
+    timeout = settings['timeout']
+    try:
+        # Warm the caches before measuring
+        for path in paths:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            conn.close()
+
+        pids = process_tree(proc.pid)
+        latencies, errors = [], []
+        stop = threading.Event()
+        concurrency = settings['concurrency']
+        clients = [threading.Thread(target=run_client,
+                                    args=(port, paths, i * len(paths) // concurrency, stop,
+                                          latencies, errors, timeout),
+                                    daemon=True)
+                   for i in range(concurrency)]
+        cpu_before = cpu_seconds(pids)
+        started = time.perf_counter()
+        for t in clients:
+            t.start()
+        time.sleep(settings['duration'])
+        stop.set()
+        for t in clients:
+            t.join(timeout + 1)
+        elapsed = time.perf_counter() - started
+        cpu_after = cpu_seconds(pids)
+        rss = peak_rss_mb(pids)
+    finally:
+        # SIGTERM, so that a supervisor stops its workers
+        proc.terminate()
+        proc.wait()
+    cpu_us = None
+    if cpu_before is not None and cpu_after is not None and latencies:
+        cpu_us = (cpu_after - cpu_before) / len(latencies) * 1e6
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_us': cpu_us,
+        'peak_rss_mb': rss,
+        'processes': len(pids),
+    }
+
+
+# --- Budgets and regressions -------------------------------------------------
+
+def load_history(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def save_history(path, runs):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(runs, f, indent=1, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp, path)
+
+
+def check_budgets(run, budgets):
+    # Yields (label, value, limit, passed) for every budget of the config
+    server = run.get('server')
+    if server is not None:
+        for key, metric in SERVER_BUDGETS.items():
+            limit, value = budgets.get(key), server.get(metric)
+            if limit is None or value is None:
+                continue
+            passed = value >= limit if key.endswith('_min') else value <= limit
+            yield f'server {metric}', value, limit, passed
+    page_budgets = budgets.get('pages', {})
+    for page, weight in sorted(run['pages'].items()):
+        limits = dict(budgets.get('page', {}), **page_budgets.get(page, {}))
+        for key, metric in PAGE_BUDGETS.items():
+            if key in limits:
+                yield f'{page} {metric}', weight[metric], limits[key], weight[metric] <= limits[key]
+
+
+def baseline_runs(history, run, count):
+    # The last passing runs comparable with run: same host and load settings,
+    # none older than the last accepted regression
+    comparable = [past for past in history
+                  if past.get('passed') and past.get('host') == run['host']
+                  and past.get('load') == run['load']]
+    accepted = [i for i, past in enumerate(comparable) if past.get('accepted')]
+    if accepted:
+        comparable = comparable[accepted[-1]:]
+    return comparable[-count:]
+
+
+def check_regressions(run, baseline, regression):
+    # Yields (label, value, baseline median, passed) per metric
+    if not baseline:
+        return
+    server = run.get('server')
+    if server is not None:
+        tolerance = regression['server_tolerance']
+        for key, higher_is_better in SERVER_METRICS.items():
+            values = [past['server'][key] for past in baseline
+                      if past.get('server') and past['server'].get(key) is not None]
+            if not values or server.get(key) is None:
+                continue
+            median = statistics.median(values)
+            if higher_is_better:
+                passed = server[key] >= median * (1 - tolerance)
+            else:
+                passed = server[key] <= median * (1 + tolerance)
+            yield f'server {key}', server[key], median, passed
+    tolerance = regression['page_tolerance']
+    for page, weight in sorted(run['pages'].items()):
+        for metric in ('transfer_kb', 'requests'):
+            values = [past['pages'][page][metric] for past in baseline if page in past['pages']]
+            if values:
+                median = statistics.median(values)
+                yield (f'{page} {metric}', weight[metric], median,
+                       weight[metric] <= median * (1 + tolerance))
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def format_value(value):
+    return f'{value:,.2f}' if isinstance(value, float) else f'{value:,}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the performance suite and check it against '
+                                                 'the budgets and the run history')
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--config', default=DEFAULT_CONFIG,
+                        help=f'budget and load settings (default: {DEFAULT_CONFIG})')
+    parser.add_argument('--server', help='server script (default from the config: custom_server.py)')
+    parser.add_argument('--duration', type=float, help='seconds of load')
+    parser.add_argument('--concurrency', type=int, help='concurrent client connections')
+    parser.add_argument('--history', help='JSON history file')
+    parser.add_argument('--no-load', action='store_true', help='measure page weight only')
+    parser.add_argument('--no-history', action='store_true', help='do not record this run')
+    parser.add_argument('--accept', action='store_true',
+                        help='record the run as passing, making it part of the baseline')
+    args = parser.parse_args(argv)
+
+    settings = load_config(args.config)
+    for name in ('server', 'duration', 'concurrency', 'history'):
+        if getattr(args, name) is not None:
+            settings[name] = getattr(args, name)
+
+    started = time.perf_counter()
+    pages = discover_pages(args.root)
+    graph = ReferenceGraph(args.root).build(pages)
+    graph.save()
+    run = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'host': platform.node(),
+        'cpus': os.cpu_count(),
+        'load': None,
+        'server': None,
+        'pages': {},
+    }
+    for page in pages:
+        weight = graph.page_weight(page)
+        run['pages'][page] = {'transfer_kb': round(weight['transfer'] / 1024, 1),
+                              'requests': weight['requests']}
+
+    print(f'Performance suite: {len(pages)} pages')
+    print('=' * 60)
+    if not args.no_load:
+        paths = load_paths(graph, pages)
+        run['load'] = {'server': settings['server'], 'server_args': settings['server_args'],
+                       'duration': settings['duration'], 'concurrency': settings['concurrency'],
+                       'paths': len(paths)}
+        print(f'Load: {settings["server"]} {" ".join(settings["server_args"])}'.rstrip()
+              + f', {settings["concurrency"]} clients, {settings["duration"]:g}s, '
+              f'{len(paths)} paths')
+        server = run['server'] = run_load(settings, args.root, paths)
+        cpu = f'{server["cpu_us"]:.0f} us' if server['cpu_us'] is not None else '-'
+        rss = f'{server["peak_rss_mb"]:.1f} MB' if server['peak_rss_mb'] is not None else '-'
+        print(f'  {server["rps"]:.1f} req/s, p50 {server["p50_ms"]:.2f} ms, '
+              f'p99 {server["p99_ms"]:.2f} ms, CPU {cpu}/request, peak RSS {rss} '
+              f'({server["processes"]} processes)')
+        print(f'  {server["requests"]} requests, {server["errors"]} errors')
+        print()
+
+    heaviest = sorted(run['pages'].items(), key=lambda item: -item[1]['transfer_kb'])
+    print('Page weight (page + resources, transfer size):')
+    for page, weight in heaviest:
+        print(f'  {page:<44}{weight["requests"]:>6} req{weight["transfer_kb"]:>12,.0f} KB')
+    print()
+
+    history = load_history(settings['history'])
+    failures = 0
+    checks = list(check_budgets(run, settings['budgets']))
+    print(f'Budgets ({args.config}):')
+    for label, value, limit, passed in checks:
+        if not passed:
+            failures += 1
+            print(f'  ✗ {label}: {format_value(value)} (budget {format_value(limit)})')
+    if not checks:
+        print('  · no budgets configured')
+    elif not failures:
+        print(f'  ✓ {len(checks)} budgets met')
+
+    regression = settings['regression']
+    baseline = baseline_runs(history, run, regression['baseline_runs'])
+    print(f'Regressions (median of the last {len(baseline)} passing runs on this host):')
+    regressions = list(check_regressions(run, baseline, regression))
+    for label, value, median, passed in regressions:
+        if not passed:
+            failures += 1
+            change = (value / median - 1) * 100 if median else 0.0
+            print(f'  ✗ {label}: {format_value(value)} vs {format_value(median)} ({change:+.1f}%)')
+    if not baseline:
+        print('  · no baseline yet')
+    elif all(passed for _, _, _, passed in regressions):
+        print(f'  ✓ {len(regressions)} metrics within tolerance')
+
+    run['passed'] = failures == 0 or args.accept
+    if args.accept and failures:
+        run['accepted'] = True
+    if not args.no_history:
+        history.append(run)
+        save_history(settings['history'], history[-settings['history_size']:])
+
+    print()
+    status = '✓ passed' if failures == 0 else ('⚠ accepted' if args.accept else '✗ failed')
+    print(f'{status}: {failures} budget/regression failures in '
+          f'{time.perf_counter() - started:.1f}s'
+          + ('' if args.no_history else f', recorded in {settings["history"]}'))
+    return 0 if failures == 0 or args.accept else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# Builds the deploy copy of the site. The checkout is copied to dist/
+# (build tooling left out), then the stages that rewrite pages and assets
+# in place run on the copy, in order:
+#
+#   responsive_images.py  WebP derivatives and srcset
+#   svg_sprite.py         shared SVG sprite
+#   css_purge.py          unused CSS rules, icon font subsets
+#   asset_bundle.py       CSS/JS bundles, critical CSS
+#   asset_fingerprint.py  content-hashed asset names
+#   preload_hints.py      preload map and <link rel="preload"> tags
+#   precompress.py        .gz/.br siblings
+#
+# The committed pages are never touched. Only files that changed in the
+# checkout are copied again, and every stage skips what it has already
+# processed, so rebuilds are quick; --clean starts from an empty dist/.
+#
+#   python3 build-dist.py
+#   python3 build-dist.py --clean --pack site.pack
+#   python3 build-dist.py --skip responsive,purge
+import argparse
+import fnmatch
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+DEFAULT_OUTPUT = 'dist'
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__'}
+# Build tooling and local outputs that are not part of the site
+EXCLUDE = ('*.py', '*.pyc', '*.sh', '*.md', '*.jsonl', '*.tmp', '*.pack')
+
+# (name, script, extra arguments)
+STAGES = [
+    ('responsive', 'responsive_images.py', []),
+    ('sprite', 'svg_sprite.py', []),
+    ('purge', 'css_purge.py', []),
+    ('bundle', 'asset_bundle.py', []),
+    ('fingerprint', 'asset_fingerprint.py', []),
+    ('preload', 'preload_hints.py', []),
+    ('precompress', 'precompress.py', []),
+]
+
+
+def iter_source_files(source, output):
+    # Yields the paths, relative to source, of the files of the site
+    output = os.path.abspath(output)
+    for dirpath, dirnames, filenames in os.walk(source):
+        dirnames[:] = sorted(d for d in dirnames
+                             if d not in SKIP_DIRS and not d.startswith('.')
+                             and os.path.abspath(os.path.join(dirpath, d)) != output)
+        for name in sorted(filenames):
+            if name.startswith('.') or any(fnmatch.fnmatch(name, p) for p in EXCLUDE):
+                continue
+            yield os.path.relpath(os.path.join(dirpath, name), source)
+
+
+def copy_site(source, output):
+    # Copies the files whose size or mtime differ from the copy in output.
+    # Returns (files copied, files in the site).
+    copied = total = 0
+    for rel in iter_source_files(source, output):
+        total += 1
+        src = os.path.join(source, rel)
+        dst = os.path.join(output, rel)
+        st = os.stat(src)
+        try:
+            dst_st = os.stat(dst)
+            if dst_st.st_size == st.st_size and dst_st.st_mtime_ns == st.st_mtime_ns:
+                continue
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(src, dst)
+        copied += 1
+    return copied, total
+
+
+def run_stage(script, args):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    sys.stdout.flush()
+    return subprocess.call([sys.executable, path] + args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the deploy copy of the site')
+    parser.add_argument('--source', default='.', help='checkout to build from (default: current directory)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help=f'deploy copy to write (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--clean', action='store_true', help='remove the deploy copy first')
+    parser.add_argument('--skip', help='comma-separated stages to leave out: '
+                                       + ', '.join(name for name, _, _ in STAGES))
+    parser.add_argument('--pack', metavar='PATH',
+                        help='also pack the deploy copy into a site archive (see site_archive.py)')
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.source) == os.path.abspath(args.output):
+        print('✗ the deploy copy must not be the checkout itself')
+        return 2
+    skipped = {s.strip() for s in args.skip.split(',')} if args.skip else set()
+    unknown = skipped - {name for name, _, _ in STAGES}
+    if unknown:
+        print(f'✗ unknown stage(s): {", ".join(sorted(unknown))}')
+        return 2
+
+    started = time.perf_counter()
+    if args.clean and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+    copied, total = copy_site(args.source, args.output)
+    print(f'Copied {copied} of {total} files to {args.output}/')
+    print()
+
+    for name, script, extra in STAGES:
+        if name in skipped:
+            print(f'· {name} skipped')
+            continue
+        if name == 'responsive' and importlib.util.find_spec('PIL') is None:
+            # Without Pillow, derivatives already in the copy are still used
+            print('⚠ Pillow is not installed, no new image derivatives')
+            extra = extra + ['--rewrite-only']
+        status = run_stage(script, ['--root', args.output] + extra)
+        print()
+        if status:
+            print(f'✗ {name} failed ({script} exited with {status})')
+            return status
+
+    if args.pack:
+        status = run_stage('site_archive.py', ['pack', '--root', args.output, '--output', args.pack])
+        if status:
+            return status
+    print(f'Built {args.output}/ in {time.perf_counter() - started:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
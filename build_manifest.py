@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Content-hash manifest for incremental build steps.
+#
+# For every output file a step records the hash of the inputs it was built
+# from (partials, transform set, options...) plus the file's own content
+# hash and mtime/size. A file is clean when the input key is unchanged and
+# the file still has the recorded content; the content is only re-hashed
+# when mtime/size differ, so checking an unchanged tree costs one stat per
+# file.
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = '.build-manifest.json'
+
+
+def digest_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_text(text):
+    return digest_bytes(text.encode('utf-8'))
+
+
+def digest_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def combine_keys(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8') if isinstance(part, str) else part)
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class BuildManifest:
+    def __init__(self, path, data=None):
+        self.path = path
+        data = data or {}
+        if data.get('version') != MANIFEST_VERSION:
+            data = {}
+        self.sections = data.get('sections', {})
+        self.modified = False
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError):
+            return cls(path)
+
+    def save(self):
+        if not self.modified:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'sections': self.sections}, f,
+                      indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self.modified = False
+
+    def section(self, scope):
+        return self.sections.setdefault(scope, {})
+
+    def get(self, scope, name):
+        return self.sections.get(scope, {}).get(name)
+
+    def check(self, scope, name, path, key):
+        # Returns None when path is clean for key, otherwise the reason it
+        # is dirty ('new', 'inputs changed', 'edited', 'missing')
+        record = self.get(scope, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return 'missing'
+        if record is None:
+            return 'new'
+        if record.get('key') != key:
+            return 'inputs changed'
+        if record.get('mtime_ns') == st.st_mtime_ns and record.get('size') == st.st_size:
+            return None
+        if digest_file(path) != record.get('digest'):
+            return 'edited'
+        # Touched but identical: remember the new stat so the next check is cheap
+        record['mtime_ns'] = st.st_mtime_ns
+        record['size'] = st.st_size
+        self.modified = True
+        return None
+
+    def record(self, scope, name, path, key, digest=None, **extra):
+        st = os.stat(path)
+        entry = {
+            'key': key,
+            'digest': digest or digest_file(path),
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+        }
+        entry.update(extra)
+        self.section(scope)[name] = entry
+        self.modified = True
+        return entry
+
+    def forget(self, scope, name):
+        if self.sections.get(scope, {}).pop(name, None) is not None:
+            self.modified = True
+
+    def prune(self, scope, keep):
+        section = self.sections.get(scope, {})
+        for name in [name for name in section if name not in keep]:
+            del section[name]
+            self.modified = True
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# HTTP range requests (RFC 9110 section 14) for CustomHTTPRequestHandler:
+# Range / If-Range parsing and the body objects used to send one or more
+# byte ranges of an in-memory entry or of a file. File bodies are sent with
+# socket.sendfile() (os.sendfile on Linux/macOS), so large media never pass
+# through Python buffers.
+import email.utils
+import io
+import os
+import stat
+
+# More ranges than this in one request are answered with the full body
+MAX_RANGES = 16
+
+
+def parse_range(header, size):
+    # Returns None when the header is absent, malformed or asks for too many
+    # ranges (the full body is then sent), [] when no range is satisfiable
+    # (416), or a sorted list of coalesced (start, end) pairs, end inclusive.
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    specs = spec.split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for item in specs:
+        first, dash, last = item.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else None
+                if start < 0 or (end is not None and end < start):
+                    return None
+            else:
+                suffix = int(last)
+                if suffix < 0:
+                    return None
+                if suffix == 0:
+                    continue
+                start, end = max(0, size - suffix), size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(headers, etag, last_modified):
+    # A Range is only honoured when If-Range (if any) still names the
+    # current representation: a strong ETag or the exact Last-Modified date.
+    if_range = headers.get('If-Range')
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == etag
+    if if_range.startswith('W/'):
+        return False
+    try:
+        return (email.utils.parsedate_to_datetime(if_range)
+                == email.utils.parsedate_to_datetime(last_modified))
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+
+
+def content_range(start, end, size):
+    return f'bytes {start}-{end}/{size}'
+
+
+def multipart_boundary(etag):
+    return 'range-' + etag.strip('"W/').replace('-', '')
+
+
+def multipart_parts(ranges, size, content_type, boundary):
+    # Yields (part header bytes, start, end) per range of a
+    # multipart/byteranges body; multipart_trailer closes the body.
+    for start, end in ranges:
+        head = (f'\r\n--{boundary}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Range: {content_range(start, end, size)}\r\n\r\n').encode('latin-1')
+        yield head, start, end
+
+
+def multipart_trailer(boundary):
+    return f'\r\n--{boundary}--\r\n'.encode('latin-1')
+
+
+def multipart_length(ranges, size, content_type, boundary):
+    return (sum(len(head) + end - start + 1
+                for head, start, end in multipart_parts(ranges, size, content_type, boundary))
+            + len(multipart_trailer(boundary)))
+
+
+def memory_body(body, ranges, content_type, boundary):
+    # Response body for ranges of an in-memory entry
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return io.BytesIO(body[start:end + 1])
+    out = io.BytesIO()
+    for head, start, end in multipart_parts(ranges, len(body), content_type, boundary):
+        out.write(head)
+        out.write(body[start:end + 1])
+    out.write(multipart_trailer(boundary))
+    out.seek(0)
+    return out
+
+
+class BufferBody:
+    # Body returned by send_head for an entry whose bytes are a memoryview of
+    # a mapped file (site_archive.py): written to the socket from the
+    # mapping, without copying it into a BytesIO first
+    def __init__(self, view):
+        self.view = view
+
+    def send(self, wfile):
+        wfile.write(self.view)
+        return self.view.nbytes
+
+    def close(self):
+        self.view = None
+
+
+class FileBody:
+    # File object returned by send_head for bodies served from disk: a list
+    # of segments, each an optional literal prefix plus a byte span of the
+    # file. CustomHTTPRequestHandler.copyfile sends the spans with sendfile.
+    def __init__(self, f, segments, trailer=b''):
+        self.file = f
+        # [(prefix bytes, offset, length)]
+        self.segments = segments
+        self.trailer = trailer
+
+    @classmethod
+    def whole(cls, f, size):
+        return cls(f, [(b'', 0, size)])
+
+    @classmethod
+    def ranges(cls, f, size, ranges, content_type, boundary):
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            return cls(f, [(b'', start, end - start + 1)])
+        segments = [(head, start, end - start + 1)
+                    for head, start, end in multipart_parts(ranges, size, content_type, boundary)]
+        return cls(f, segments, multipart_trailer(boundary))
+
+    def send(self, sock, wfile, use_sendfile=True):
+        # Returns the number of body bytes written
+        sent = 0
+        for prefix, offset, length in self.segments:
+            if prefix:
+                wfile.write(prefix)
+                sent += len(prefix)
+            if use_sendfile:
+                sent += sock.sendfile(self.file, offset, length)
+            else:
+                sent += self._copy(wfile, offset, length)
+        if self.trailer:
+            wfile.write(self.trailer)
+            sent += len(self.trailer)
+        return sent
+
+    def _copy(self, wfile, offset, length, bufsize=64 * 1024):
+        self.file.seek(offset)
+        copied = 0
+        while length > 0:
+            chunk = self.file.read(min(bufsize, length))
+            if not chunk:
+                break
+            wfile.write(chunk)
+            length -= len(chunk)
+            copied += len(chunk)
+        return copied
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(st):
+    # Files served from disk are not hashed: the ETag is derived from
+    # mtime and size, like most static servers do
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def open_regular_file(path):
+    # Returns (file, stat) for a regular file, or None
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    try:
+        st = os.fstat(f.fileno())
+    except OSError:
+        f.close()
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        f.close()
+        return None
+    return f, st
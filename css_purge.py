@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# Unused-CSS purging and icon-font subsetting. Every class, id and tag used
+# by the pages, the shared partials and the site's scripts (for classes
+# toggled at runtime) is indexed; the stylesheets are then reduced to the
+# rules that can match, and the FontAwesome .woff2 fonts to the glyphs of
+# the icons in use. Bytes saved are reported per asset.
+#
+# Incremental: the token index of a file is only rebuilt when the file
+# changed (.purge-cache/index.json), and an asset is only processed again
+# when the token set or the asset itself changed. The unpurged originals
+# are kept in .purge-cache/originals/, so runs on an already purged tree
+# start from the full files.
+#
+# Font subsetting needs fontTools and brotli (pip install fonttools brotli).
+# Runs on the deploy copy, before asset_bundle.py:
+#
+#   python3 css_purge.py --root dist
+#   python3 css_purge.py --root dist --safelist 'modal-*' 'swiper-*'
+import argparse
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from fontTools import subset as font_subset
+    import brotli  # noqa: F401  (fontTools needs it for woff2)
+except ImportError:
+    font_subset = None
+
+from asset_bundle import (OUTPUT_DIR as BUNDLE_DIR, SelectorTokens, TokenCollector, filter_css,
+                          minify_css, split_css_blocks)
+from build_manifest import MANIFEST_NAME, BuildManifest, combine_keys, digest_file
+from site_pages import PARTIALS, discover_pages, read_text, write_text
+
+CACHE_DIR = '.purge-cache'
+SCOPE = 'css_purge'
+INDEX_VERSION = '1'
+# Part of the stylesheet key: purged output of an older minifier is redone
+PURGE_VERSION = '2'
+
+DEFAULT_STYLESHEETS = ['assets/css/bootstrap.min.css', 'assets/css/fontawesome.min.css']
+DEFAULT_FONT_DIR = 'assets/fonts'
+SCRIPT_DIR = 'assets/js'
+
+# Classes that scripts build from parts (e.g. 'is-' + state) and so never
+# appear whole in the corpus
+DEFAULT_SAFELIST = ['show', 'showing', 'active', 'fade', 'collapse', 'collapsing', 'was-validated',
+                    'is-valid', 'is-invalid', 'modal-*', 'swiper-*', 'mfp-*', 'wow', 'animate__*']
+
+SCRIPT_TOKEN_PATTERN = re.compile(r'[A-Za-z_][\w-]*')
+ICON_CLASS_PATTERN = re.compile(r'^\.(fa-[\w-]+)(?::(?::)?before)?$')
+ICON_CODEPOINT_PATTERN = re.compile(r'(?:--fa|content)\s*:\s*"((?:\\[0-9a-fA-F]+\s?)+)"')
+FONT_URL_PATTERN = re.compile(r'url\(\s*["\']?([^"\')]+\.woff2)')
+
+
+class CorpusCollector(TokenCollector):
+    # Adds the identifiers found in inline scripts to the classes and ids
+    def __init__(self):
+        super().__init__()
+        self._in_script = False
+
+    def handle_starttag(self, tag, attrs):
+        super().handle_starttag(tag, attrs)
+        self._in_script = tag == 'script'
+
+    def handle_endtag(self, tag):
+        if tag == 'script':
+            self._in_script = False
+
+    def handle_data(self, data):
+        if self._in_script:
+            tokens = SCRIPT_TOKEN_PATTERN.findall(data)
+            self.classes.update(tokens)
+            self.ids.update(tokens)
+
+
+def scan_file(path):
+    # Returns {'tags': [...], 'classes': [...], 'ids': [...]} for a page or
+    # a script
+    if path.endswith('.js'):
+        tokens = sorted(set(SCRIPT_TOKEN_PATTERN.findall(read_text(path))))
+        return {'tags': [t.lower() for t in tokens], 'classes': tokens, 'ids': tokens}
+    collector = CorpusCollector()
+    collector.feed(read_text(path))
+    collector.close()
+    return {'tags': sorted(collector.tags), 'classes': sorted(collector.classes),
+            'ids': sorted(collector.ids)}
+
+
+def corpus_files(root):
+    files = discover_pages(root) + [p for p in PARTIALS if os.path.exists(os.path.join(root, p))]
+    script_dir = os.path.join(root, SCRIPT_DIR)
+    for dirpath, dirnames, filenames in os.walk(script_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            if name.endswith('.js'):
+                files.append(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/'))
+    return [f for f in files if not f.startswith(BUNDLE_DIR + '/')]
+
+
+def build_index(root, files):
+    # Token index of the corpus, rescanning only files that changed.
+    # Returns (SelectorTokens, number of files rescanned).
+    index = BuildManifest.load(os.path.join(root, CACHE_DIR, 'index.json'))
+    tags, classes, ids = set(), set(), set()
+    rescanned = 0
+    for rel in files:
+        path = os.path.join(root, rel)
+        record = index.get('tokens', rel)
+        if index.check('tokens', rel, path, INDEX_VERSION) is not None:
+            record = index.record('tokens', rel, path, INDEX_VERSION, **scan_file(path))
+            rescanned += 1
+        tags.update(record['tags'])
+        classes.update(record['classes'])
+        ids.update(record['ids'])
+    index.prune('tokens', set(files))
+    os.makedirs(os.path.join(root, CACHE_DIR), exist_ok=True)
+    index.save()
+    return SelectorTokens(tags, classes, ids), rescanned
+
+
+def icon_codepoints(css):
+    # fa-* icon class -> codepoints, from rules such as
+    # .fa-house{--fa:"\f015"} (v6) or .fa-house:before{content:"\f015"}
+    icons = {}
+    for prelude, body in split_css_blocks(css):
+        if body is None or prelude.startswith('@'):
+            continue
+        match = ICON_CODEPOINT_PATTERN.search(body)
+        if match is None:
+            continue
+        codepoints = {int(cp, 16) for cp in re.findall(r'\\([0-9a-fA-F]+)', match.group(1))}
+        for selector in prelude.split(','):
+            name = ICON_CLASS_PATTERN.match(selector.strip())
+            if name:
+                icons.setdefault(name.group(1), set()).update(codepoints)
+    return icons
+
+
+def original_source(root, rel, manifest):
+    # Path of the unpurged original of rel: the file itself when it is new
+    # or was replaced since the last run, otherwise the saved copy
+    path = os.path.join(root, rel)
+    saved = os.path.join(root, CACHE_DIR, 'originals', rel)
+    record = manifest.get(SCOPE, rel)
+    if (record is not None and os.path.exists(saved)
+            and digest_file(path) == record['digest']
+            and digest_file(saved) == record.get('original')):
+        return saved
+    os.makedirs(os.path.dirname(saved), exist_ok=True)
+    shutil.copyfile(path, saved)
+    return saved
+
+
+def purge_stylesheet(source, target, tokens):
+    css = minify_css(read_text(source))
+    purged = filter_css(css, tokens, keep_keyframes=True)
+    tmp = target + '.tmp'
+    write_text(tmp, purged)
+    os.replace(tmp, target)
+
+
+def subset_font(source, target, codepoints):
+    options = font_subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    options.notdef_outline = True
+    options.name_IDs = ['*']
+    font = font_subset.load_font(source, options)
+    subsetter = font_subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    tmp = target + '.tmp'
+    font_subset.save_font(font, tmp, options)
+    os.replace(tmp, target)
+
+
+def process_asset(kind, source, target, payload):
+    # Worker: returns (error or None, seconds)
+    started = time.perf_counter()
+    try:
+        if kind == 'css':
+            purge_stylesheet(source, target, payload)
+        else:
+            subset_font(source, target, payload)
+    except Exception as e:  # fontTools raises a wide range of errors
+        return f'{type(e).__name__}: {e}', time.perf_counter() - started
+    return None, time.perf_counter() - started
+
+
+def _process_asset_star(args):
+    return process_asset(*args)
+
+
+def find_fonts(root, sources, font_dir):
+    # .woff2 files referenced by the stylesheets (rel -> original source)
+    # and present in font_dir
+    fonts = set()
+    for rel, source in sources.items():
+        css_dir = os.path.dirname(rel)
+        for url in FONT_URL_PATTERN.findall(read_text(source)):
+            font = os.path.normpath(os.path.join(css_dir, url)).replace(os.sep, '/')
+            if font.startswith(font_dir.rstrip('/') + '/') and os.path.exists(os.path.join(root, font)):
+                fonts.add(font)
+    return sorted(fonts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Purge unused CSS and subset icon fonts')
+    parser.add_argument('--root', required=True, help='deploy copy of the site, e.g. dist')
+    parser.add_argument('--css', nargs='+', default=DEFAULT_STYLESHEETS, metavar='FILE',
+                        help='stylesheets to purge (default: bootstrap and fontawesome)')
+    parser.add_argument('--fonts', default=DEFAULT_FONT_DIR,
+                        help=f'icon font directory (default: {DEFAULT_FONT_DIR})')
+    parser.add_argument('--no-fonts', action='store_true', help='do not subset fonts')
+    parser.add_argument('--safelist', nargs='*', default=[], metavar='GLOB',
+                        help='extra class globs to keep')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    root = args.root
+    files = corpus_files(root)
+    tokens, rescanned = build_index(root, files)
+    tokens.safelist = tuple(DEFAULT_SAFELIST + args.safelist)
+    print(f'Indexed {len(files)} files ({rescanned} rescanned): {len(tokens.classes):,} classes, '
+          f'{len(tokens.ids):,} ids, {len(tokens.tags):,} tags')
+    print('=' * 60)
+
+    manifest = BuildManifest.load(os.path.join(root, MANIFEST_NAME))
+    stylesheets = [rel for rel in args.css if os.path.exists(os.path.join(root, rel))]
+    jobs = []
+    sizes = {}
+    token_key = combine_keys(PURGE_VERSION, tokens.key())
+
+    # Stylesheets: sources are resolved first so fonts and icons are read
+    # from the unpurged originals
+    sources = {rel: original_source(root, rel, manifest) for rel in stylesheets}
+    for rel in stylesheets:
+        if manifest.check(SCOPE, rel, os.path.join(root, rel), token_key) is None:
+            continue
+        jobs.append(('css', sources[rel], os.path.join(root, rel), tokens))
+        sizes[rel] = os.path.getsize(sources[rel])
+
+    if not args.no_fonts:
+        icons = {}
+        for rel in stylesheets:
+            for name, codepoints in icon_codepoints(read_text(sources[rel])).items():
+                icons.setdefault(name, set()).update(codepoints)
+        used = {name for name in icons if tokens.has_class(name)}
+        codepoints = sorted(set().union(*(icons[name] for name in used))) if used else []
+        print(f'{len(used)} of {len(icons)} icons in use, {len(codepoints)} glyphs')
+        fonts = find_fonts(root, sources, args.fonts)
+        if fonts and font_subset is None:
+            print('⚠ fontTools/brotli not installed (pip install fonttools brotli), fonts left as they are')
+            fonts = []
+        font_key = combine_keys('fonts', *map(str, codepoints))
+        for rel in fonts:
+            if manifest.check(SCOPE, rel, os.path.join(root, rel), font_key) is None:
+                continue
+            source = original_source(root, rel, manifest)
+            jobs.append(('font', source, os.path.join(root, rel), codepoints))
+            sizes[rel] = os.path.getsize(source)
+
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_process_asset_star, jobs))
+    else:
+        results = [_process_asset_star(job) for job in jobs]
+
+    # Outputs are recorded before anything is printed, so an interrupted
+    # report cannot leave purged files that the next run takes for originals
+    report = []
+    for (kind, source, target, _), (error, seconds) in zip(jobs, results):
+        rel = os.path.relpath(target, root).replace(os.sep, '/')
+        if error:
+            shutil.copyfile(source, target)
+            report.append((rel, error, 0, 0, seconds))
+            continue
+        before, after = sizes[rel], os.path.getsize(target)
+        manifest.record(SCOPE, rel, target, token_key if kind == 'css' else font_key,
+                        original=digest_file(source), before=before, after=after)
+        report.append((rel, None, before, after, seconds))
+    manifest.save()
+
+    errors = 0
+    for rel, error, before, after, seconds in report:
+        if error:
+            errors += 1
+            print(f'✗ {rel}: {error} (original restored)')
+        else:
+            print(f'✓ {rel}: {before / 1024:,.1f} KB → {after / 1024:,.1f} KB '
+                  f'(-{(before - after) / 1024:,.1f} KB, {seconds * 1000:.0f} ms)')
+    total_before = sum(r[2] for r in report)
+    total_after = sum(r[3] for r in report)
+
+    print()
+    unchanged = len(stylesheets) - sum(1 for job in jobs if job[0] == 'css')
+    print(f'{len(jobs)} assets processed, {unchanged} stylesheets unchanged; '
+          f'saved {(total_before - total_after) / 1024:,.1f} KB '
+          f'in {time.perf_counter() - started:.2f}s')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,58 +1,915 @@
 #!/usr/bin/env python3
+import argparse
+import email.utils
+import functools
 import http.server
-import socketserver
+import io
 import os
+import selectors
+import socket
+import socketserver
+import sys
+import threading
+import time
+import types
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import access_log
+import byte_ranges
+import precompress
+import prefork
+import request_metrics
+from access_log import AccessLog
+from asset_fingerprint import CACHE_CONTROL, ImmutableAssets
+from page_templates import DEFAULT_CHECK_INTERVAL, DEFAULT_SOURCE_DIR, TemplateEngine, TemplateError
+from preload_hints import PreloadHints
+from request_metrics import RequestMetrics, route_label
+from route_index import DEFAULT_POLL_INTERVAL, RouteIndex
+from site_archive import SiteArchive
+from site_pages import discover_pages
+from static_cache import DEFAULT_MAX_BYTES, CacheEntry, StaticFileCache, is_not_modified
+
+DEFAULT_WORKERS = 32
+DEFAULT_BACKLOG = 128
+DEFAULT_KEEP_ALIVE_TIMEOUT = 5.0
+DEFAULT_MAX_CONNECTIONS = 512
+
 
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    def setup(self):
+        # Keep-alive is only enabled by the concurrent server: on the
+        # single-threaded server an idle browser connection would block
+        # every other client until it is closed.
+        if getattr(self.server, 'keep_alive', False):
+            self.protocol_version = 'HTTP/1.1'
+            self.timeout = self.server.keep_alive_timeout
+            # Headers and body go out in separate writes; with Nagle on, a
+            # reused connection stalls on the peer's delayed ACK.
+            self.disable_nagle_algorithm = True
+        super().setup()
+
+    def handle(self):
+        # With the thread-pool server's idle watcher, a kept-alive connection
+        # is handed back ("parked") between requests instead of holding its
+        # worker until the next request or the keep-alive timeout
+        self.parked = False
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if self.can_park():
+                self.parked = True
+                return
+            self.handle_one_request()
+
+    def can_park(self):
+        if getattr(self.server, 'idle_connections', None) is None:
+            return False
+        # Pipelined requests already buffered in rfile are served right away
+        self.connection.settimeout(0)
+        try:
+            return not self.rfile.peek(1)
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def resume(self):
+        # Serves the next requests of a parked connection, once bytes arrived
+        try:
+            self.handle()
+        finally:
+            self.finish()
+
+    def finish(self):
+        if not getattr(self, 'parked', False):
+            super().finish()
+
+    def handle_one_request(self):
+        # Each request is timed from its request line (idle time on a
+        # kept-alive connection is not counted) to the last body byte
+        self.started = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self.started is not None and self.status_code is not None:
+                self.request_done(time.perf_counter() - self.started)
+            # A draining server closes kept-alive connections after the
+            # current response
+            if getattr(self.server, 'draining', False):
+                self.close_connection = True
+
+    def request_done(self, seconds):
+        # Feeds the request metrics and the access log once the response is
+        # sent; both only queue or count, nothing is written here
+        route = self.route if self.status_code != http.HTTPStatus.NOT_FOUND else None
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is not None:
+            metrics.record(route, self.status_code, self.bytes_sent, seconds)
+        log = getattr(self.server, 'access_log', None)
+        if log is not None:
+            headers = self.headers if self.headers_parsed else {}
+            log.log((time.time() - seconds, self.client_address[0], self.command,
+                     self.request_target, int(self.status_code), self.bytes_sent,
+                     seconds * 1000, route, headers.get('Referer'), headers.get('User-Agent')))
+
+    def parse_request(self):
+        self.started = time.perf_counter()
+        self.route = None
+        self.status_code = None
+        self.bytes_sent = 0
+        self.request_target = None
+        self.headers_parsed = ok = super().parse_request()
+        # self.path is rewritten to the served file later on
+        self.request_target = getattr(self, 'path', None)
+        return ok
+
+    def log_request(self, code='-', size='-'):
+        # With the server's access log, requests are logged by request_done
+        # when the body has been sent instead of on stderr here
+        if not hasattr(self.server, 'access_log'):
+            super().log_request(code, size)
+
+    def log_error(self, format, *args):
+        # send_error's "code 404, message File not found" is in the access
+        # log already; other errors still go to stderr
+        if not (format.startswith('code %d') and hasattr(self.server, 'access_log')):
+            super().log_error(format, *args)
+
+    def send_response_only(self, code, message=None):
+        self.status_code = code
+        super().send_response_only(code, message)
+
+    def send_error(self, code, message=None, explain=None):
+        # The error page is written by the base class, not through
+        # copyfile(); its Content-Length is counted for the request metrics
+        self.error_length = 0
+        try:
+            super().send_error(code, message, explain)
+            if self.command != 'HEAD':
+                self.bytes_sent = getattr(self, 'bytes_sent', 0) + self.error_length
+        finally:
+            del self.error_length
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'content-length' and hasattr(self, 'error_length'):
+            self.error_length = int(value)
+        super().send_header(keyword, value)
+
     def do_GET(self):
-        # Parse the URL
+        if self.is_metrics_request():
+            self.send_metrics()
+        elif self.rewrite_path():
+            if self.link_header and getattr(self.server, 'early_hints', False):
+                self.send_early_hints()
+            super().do_GET()
+
+    def do_HEAD(self):
+        if self.is_metrics_request():
+            self.send_metrics()
+        elif self.rewrite_path():
+            super().do_HEAD()
+
+    def is_metrics_request(self):
+        return (getattr(self.server, 'metrics', None) is not None
+                and self.path.partition('?')[0] == request_metrics.METRICS_PATH)
+
+    def send_metrics(self):
+        # Prometheus text by default, JSON for ?format=json
+        self.route = request_metrics.METRICS_PATH
+        cache = getattr(self.server, 'file_cache', None)
+        cache_stats = cache.stats() if cache is not None else None
+        query = self.path.partition('?')[2]
+        if request_metrics.wants_json(query, self.headers.get('Accept')):
+            body = self.server.metrics.to_json(cache_stats)
+            content_type = request_metrics.JSON_CONTENT_TYPE
+        else:
+            body = self.server.metrics.to_prometheus(cache_stats)
+            content_type = request_metrics.PROMETHEUS_CONTENT_TYPE
+        body = body.encode('utf-8')
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+            self.bytes_sent += len(body)
+
+    def rewrite_path(self):
+        # Maps the clean URL onto a file in the document root. Returns False
+        # when a 404 has already been sent.
         parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
-        
-        # Remove leading slash
-        if path.startswith('/'):
-            path = path[1:]
-        
-        # If path is empty, serve index.html
-        if not path or path == '/':
-            path = 'index.html'
-        
-        # List of spectacle pages without .html extension
-        spectacle_pages = [
-            'spectacle-alice-chez-les-merveilles',
-            'spectacle-antigone', 
-            'spectacle-casse-noisette',
-            'spectacle-charlotte',
-            'spectacle-estevanico',
-            'spectacle-le-petit-prince',
-            'spectacle-leau-la',
-            'spectacle-lenfant-de-larbre',
-            'spectacle-simple-comme-bonjour',
-            'spectacle-tara-sur-la-lune'
-        ]
-        
-        # Check if the requested path is a spectacle page without .html
-        if path in spectacle_pages:
-            path = path + '.html'
-        
-        # Check if file exists without extension, add .html
-        elif not path.endswith('.html') and not '.' in path:
+        path = urllib.parse.unquote(parsed_path.path)
+
+        # Page sources rendered on the fly take precedence over built pages
+        self.rendered_page = None
+        self.archive_entry = None
+        self.cache_control = None
+        self.link_header = None
+        rendered_pages = getattr(self.server, 'rendered_pages', None)
+        if rendered_pages is not None:
+            self.rendered_page = rendered_pages.resolve(path)
+            if self.rendered_page is not None:
+                self.path = '/' + urllib.parse.quote(self.rendered_page)
+                self.route = route_label(self.rendered_page)
+                self.link_header = self.preload_link_header(self.rendered_page)
+                return True
+
+        # A packed site (see site_archive.py) is served from its mapping
+        site_archive = getattr(self.server, 'site_archive', None)
+        if site_archive is not None:
+            self.archive_entry = site_archive.resolve(path)
+            if self.archive_entry is None:
+                self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+                return False
+            self.route = route_label(self.archive_entry.rel)
+            self.cache_control = self.archive_entry.cache_control
+            self.link_header = self.archive_entry.link
+            return True
+
+        route_index = getattr(self.server, 'route_index', None)
+        if route_index is None:
+            rel = self.resolve_on_disk(path)
+            self.path = '/' + urllib.parse.quote(rel)
+            self.route = route_label(rel)
+        else:
+            route = route_index.resolve(path)
+            if route is None:
+                self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+                return False
+            rel, is_dir = route
+            # Directories keep the original path so SimpleHTTPRequestHandler
+            # can redirect to the trailing-slash form
+            self.path = parsed_path.path if is_dir else '/' + urllib.parse.quote(rel)
+            self.route = route_label(rel, is_dir)
+
+        # Fingerprinted assets (see asset_fingerprint.py) never change
+        immutable_assets = getattr(self.server, 'immutable_assets', None)
+        if immutable_assets is not None and rel in immutable_assets:
+            self.cache_control = CACHE_CONTROL
+        self.link_header = self.preload_link_header(rel)
+        return True
+
+    def preload_link_header(self, rel):
+        # Link: rel=preload value of a page's critical resources (see
+        # preload_hints.py), None for other files
+        preload_hints = getattr(self.server, 'preload_hints', None)
+        if preload_hints is None or not rel.endswith('.html'):
+            return None
+        return preload_hints.get(rel)
+
+    def send_early_hints(self):
+        # 103 Early Hints with the page's Link header, so the browser starts
+        # fetching its critical resources before the page itself arrives.
+        # Interim responses are HTTP/1.1 only.
+        if self.request_version != 'HTTP/1.1' or self.protocol_version != 'HTTP/1.1':
+            return
+        self.wfile.write(f'HTTP/1.1 103 Early Hints\r\nLink: {self.link_header}\r\n\r\n'
+                         .encode('latin-1'))
+
+    def resolve_on_disk(self, path):
+        # Clean-URL rules without a route index: the empty path serves
+        # index.html and an extension-less path serves path + '.html'
+        path = path.lstrip('/')
+        if not path:
+            return 'index.html'
+        if not path.endswith('.html') and '.' not in os.path.basename(path):
             html_path = path + '.html'
-            if os.path.exists(html_path):
-                path = html_path
-        
-        # Update the path in the request
-        self.path = '/' + path
-        
-        # Call the parent method to handle the request
-        super().do_GET()
+            if os.path.exists(os.path.join(self.directory, html_path)):
+                return html_path
+        return path
+
+    def send_head(self):
+        # Serve regular files from the in-memory cache, or from disk with
+        # sendfile when they are too large to cache; directories and missing
+        # files go through SimpleHTTPRequestHandler.
+        if getattr(self, 'rendered_page', None) is not None:
+            try:
+                entry = self.server.rendered_pages.entry(self.rendered_page)
+            except (OSError, TemplateError) as e:
+                self.log_error('template %s: %s', self.rendered_page, e)
+                self.send_error(http.HTTPStatus.INTERNAL_SERVER_ERROR, 'Template error')
+                return None
+            return self.send_entry(entry, self.server.rendered_pages)
+        if getattr(self, 'archive_entry', None) is not None:
+            return self.send_entry(self.archive_entry, self.server.site_archive)
+
+        if self.path.endswith('/'):
+            return super().send_head()
+
+        fs_path = self.translate_path(self.path)
+        content_type = self.guess_type(fs_path)
+        cache = getattr(self.server, 'file_cache', None)
+        entry = cache.get(fs_path, content_type) if cache is not None else None
+        if entry is not None:
+            return self.send_entry(entry, cache)
+        opened = byte_ranges.open_regular_file(fs_path)
+        if opened is None:
+            return super().send_head()
+        return self.send_file(*opened, content_type, fs_path)
+
+    def send_entry(self, entry, store):
+        # Sends headers for an in-memory entry (cached file, rendered page or
+        # archive entry) and returns its body as a file object. store provides
+        # get_variant.
+        # Pick a Content-Encoding from Accept-Encoding for text assets
+        body, etag, encoding = entry.body, entry.etag, None
+        if entry.compressible:
+            encoding = precompress.negotiate(self.headers.get('Accept-Encoding'))
+            encoded = store.get_variant(entry, encoding) if encoding else None
+            if encoded:
+                body, etag = encoded, entry.variant_etag(encoding)
+            else:
+                encoding = None
+
+        if is_not_modified(self.headers, etag, entry.mtime):
+            return self.send_not_modified(etag, entry.last_modified, entry.compressible)
+
+        # Ranges apply to the selected representation, encoded or not
+        ranges = self.requested_ranges(len(body), etag, entry.last_modified)
+        if ranges == []:
+            return self.send_range_not_satisfiable(len(body))
+        boundary = self.send_status(ranges, len(body), entry.content_type, etag)
+        self.send_header('Last-Modified', entry.last_modified)
+        self.send_header('ETag', etag)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if entry.compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        if ranges is None:
+            if isinstance(body, memoryview):
+                return byte_ranges.BufferBody(body)
+            return io.BytesIO(body)
+        return byte_ranges.memory_body(body, ranges, entry.content_type, boundary)
+
+    def send_file(self, f, st, content_type, path=None):
+        # Sends headers for an open regular file and returns a FileBody whose
+        # byte spans copyfile() hands to sendfile. Text assets go out as
+        # their precompressed sibling when the client accepts its encoding.
+        etag = byte_ranges.file_etag(st)
+        last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        mtime = int(st.st_mtime)
+        compressible = path is not None and precompress.is_compressible(path)
+        encoding = None
+        try:
+            if compressible:
+                encoded = self.open_precompressed(path, st)
+                if encoded is not None:
+                    f.close()
+                    encoding, f, st = encoded
+                    etag = etag[:-1] + '-' + encoding + '"'
+            if is_not_modified(self.headers, etag, mtime):
+                f.close()
+                return self.send_not_modified(etag, last_modified, compressible)
+            ranges = self.requested_ranges(st.st_size, etag, last_modified)
+            if ranges == []:
+                f.close()
+                return self.send_range_not_satisfiable(st.st_size)
+            boundary = self.send_status(ranges, st.st_size, content_type, etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('ETag', etag)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            if compressible:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+        except BaseException:
+            f.close()
+            raise
+        if ranges is None:
+            return byte_ranges.FileBody.whole(f, st.st_size)
+        return byte_ranges.FileBody.ranges(f, st.st_size, ranges, content_type, boundary)
+
+    def open_precompressed(self, path, st):
+        # (encoding, file, stat) of the precompressed sibling (see
+        # precompress.py) for Accept-Encoding, when it is at least as new as
+        # the source; None otherwise
+        encoding = precompress.negotiate(self.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return None
+        opened = byte_ranges.open_regular_file(path + precompress.SUFFIXES[encoding])
+        if opened is None:
+            return None
+        if opened[1].st_mtime_ns < st.st_mtime_ns:
+            opened[0].close()
+            return None
+        return (encoding, *opened)
+
+    def requested_ranges(self, size, etag, last_modified):
+        # None to send the whole body, [] when no requested range can be
+        # satisfied, otherwise the (start, end) byte ranges to send
+        if self.command != 'GET':
+            return None
+        ranges = byte_ranges.parse_range(self.headers.get('Range'), size)
+        if ranges is None or not byte_ranges.if_range_matches(self.headers, etag, last_modified):
+            return None
+        return ranges
+
+    def send_status(self, ranges, size, content_type, etag):
+        # Sends the status line and the headers that depend on the ranges
+        # being sent. Returns the multipart boundary for several ranges.
+        boundary = None
+        if ranges is None:
+            self.send_response(http.HTTPStatus.OK)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(size))
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_response(http.HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Range', byte_ranges.content_range(start, end, size))
+            self.send_header('Content-Length', str(end - start + 1))
+        else:
+            boundary = byte_ranges.multipart_boundary(etag)
+            length = byte_ranges.multipart_length(ranges, size, content_type, boundary)
+            self.send_response(http.HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-type', f'multipart/byteranges; boundary={boundary}')
+            self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        if self.cache_control:
+            self.send_header('Cache-Control', self.cache_control)
+        if self.link_header:
+            self.send_header('Link', self.link_header)
+        return boundary
+
+    def send_not_modified(self, etag, last_modified, vary=False):
+        self.send_response(http.HTTPStatus.NOT_MODIFIED)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        if self.cache_control:
+            self.send_header('Cache-Control', self.cache_control)
+        if vary:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        return None
+
+    def send_range_not_satisfiable(self, size):
+        self.send_response(http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.send_header('Content-Range', f'bytes */{size}')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return None
+
+    def copyfile(self, source, outputfile):
+        # File bodies go out with sendfile (no copies through Python
+        # buffers) and archive bodies straight from the mapping; other
+        # in-memory bodies and directory listings are copied.
+        # Body bytes are counted for the request metrics.
+        if isinstance(source, byte_ranges.FileBody):
+            self.bytes_sent += source.send(self.connection, outputfile,
+                                           use_sendfile=getattr(self.server, 'use_sendfile', True))
+        elif isinstance(source, byte_ranges.BufferBody):
+            self.bytes_sent += source.send(outputfile)
+        elif isinstance(source, io.BytesIO):
+            with source.getbuffer() as view:
+                length = view.nbytes - source.tell()
+            super().copyfile(source, outputfile)
+            self.bytes_sent += length
+        else:
+            # Directory index file opened by SimpleHTTPRequestHandler
+            start = source.tell()
+            super().copyfile(source, outputfile)
+            self.bytes_sent += source.tell() - start
+
+
+class RenderedPages:
+    # Page sources (see page_templates.py) rendered on request. The engine
+    # caches compiled templates and renders; an entry is rebuilt only when
+    # the render itself changes.
+    def __init__(self, root, src=DEFAULT_SOURCE_DIR, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.engine = TemplateEngine(root, check_interval=check_interval)
+        self.src_dir = os.path.join(self.engine.root, src)
+        self.check_interval = check_interval
+        self._names = frozenset()
+        self._dir_mtime_ns = None
+        self._checked_at = 0.0
+        self._entries = {}
+
+    def resolve(self, url_path):
+        name = url_path.lstrip('/') or 'index.html'
+        if not name.endswith('.html'):
+            name += '.html'
+        return name if name in self._page_names() else None
+
+    def entry(self, name):
+        path = os.path.join(self.src_dir, name)
+        text, deps = self.engine.render_with_dependencies(path)
+        cached = self._entries.get(name)
+        if cached is not None and cached[0] is text:
+            return cached[1]
+        mtime_ns = max(state[0] for state in deps.values())
+        st = types.SimpleNamespace(st_mtime=mtime_ns / 1e9, st_mtime_ns=mtime_ns,
+                                   st_size=len(text))
+        entry = CacheEntry(path, text.encode('utf-8'), st, 'text/html; charset=utf-8',
+                           time.monotonic())
+        self._entries[name] = (text, entry)
+        return entry
+
+    def get_variant(self, entry, token):
+        if token not in entry.variants:
+            entry.variants[token] = precompress.load_variant(entry.path, entry.body,
+                                                             entry.mtime_ns, token)
+        return entry.variants[token]
+
+    def _page_names(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._names
+        self._checked_at = now
+        try:
+            mtime_ns = os.stat(self.src_dir).st_mtime_ns
+        except OSError:
+            self._names = frozenset()
+            return self._names
+        if mtime_ns != self._dir_mtime_ns:
+            self._dir_mtime_ns = mtime_ns
+            self._names = frozenset(discover_pages(self.src_dir))
+        return self._names
+
+
+class IdleConnections:
+    # Connections waiting for a request: new ones and kept-alive ones between
+    # requests. One thread watches them with a selector and hands a
+    # connection to a worker only once bytes arrive, so idle browser
+    # connections do not hold worker threads. Connections idle for longer
+    # than timeout are closed.
+    def __init__(self, server, timeout):
+        self.server = server
+        self.timeout = timeout
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._waker = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._waker.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._draining = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='http-idle', daemon=True)
+        self._thread.start()
+
+    def watch(self, request, client_address, handler=None):
+        # handler is the parked handler of a kept-alive connection, None for
+        # a new connection
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._pending.append((request, client_address, handler))
+        if closed:
+            self.server.close_idle(request, handler)
+        else:
+            self._wake()
+
+    def drain(self):
+        # Closes the kept-alive connections and waits until the new ones
+        # have been handed to a worker or have timed out
+        with self._lock:
+            self._draining = True
+        self._wake()
+        self._thread.join()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._wake()
+        self._thread.join()
+
+    def _wake(self):
+        try:
+            self._waker.send(b'\0')
+        except OSError:
+            # Buffer full: the thread is due to wake up already
+            pass
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    pending, self._pending = self._pending, []
+                    draining, closed = self._draining, self._closed
+                deadline = time.monotonic() + self.timeout
+                for request, client_address, handler in pending:
+                    try:
+                        self._selector.register(request, selectors.EVENT_READ,
+                                                (client_address, handler, deadline))
+                    except (OSError, ValueError):
+                        self.server.close_idle(request, handler)
+                watched = [key for key in self._selector.get_map().values()
+                           if key.fileobj is not self._wakeup]
+                if closed or draining:
+                    for key in watched:
+                        if closed or key.data[1] is not None:
+                            self._close(key)
+                    watched = [key for key in watched if not closed and key.data[1] is None]
+                    if not watched:
+                        break
+                now = time.monotonic()
+                timeout = max(0.0, min(key.data[2] for key in watched) - now) if watched else None
+                for key, _ in self._selector.select(timeout):
+                    if key.fileobj is self._wakeup:
+                        try:
+                            while self._wakeup.recv(4096):
+                                pass
+                        except OSError:
+                            pass
+                        continue
+                    self._selector.unregister(key.fileobj)
+                    self.server.dispatch(key.fileobj, *key.data[:2])
+                now = time.monotonic()
+                for key in list(self._selector.get_map().values()):
+                    if key.fileobj is not self._wakeup and key.data[2] <= now:
+                        self._close(key)
+        finally:
+            with self._lock:
+                self._closed = True
+                pending, self._pending = self._pending, []
+            for request, _, handler in pending:
+                self.server.close_idle(request, handler)
+            for key in list(self._selector.get_map().values()):
+                if key.fileobj is not self._wakeup:
+                    self._close(key)
+            self._selector.close()
+            self._wakeup.close()
+            self._waker.close()
+
+    def _close(self, key):
+        self._selector.unregister(key.fileobj)
+        self.server.close_idle(key.fileobj, key.data[1])
+
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    # Connections are handed to a fixed pool of worker threads. With
+    # keep-alive, connections wait for their requests in IdleConnections and
+    # only take a worker to serve them; the accept loop blocks at
+    # max_connections open connections. Ready connections wait for a free
+    # worker, and excess connections wait in the kernel listen backlog
+    # (request_queue_size) instead of piling up in memory.
+    allow_reuse_address = True
+
+    def __init__(self, server_address, RequestHandlerClass, workers=DEFAULT_WORKERS,
+                 backlog=DEFAULT_BACKLOG, keep_alive=True,
+                 keep_alive_timeout=DEFAULT_KEEP_ALIVE_TIMEOUT,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, bind_and_activate=True):
+        self.workers = workers
+        self.request_queue_size = backlog
+        self.keep_alive = keep_alive
+        self.keep_alive_timeout = keep_alive_timeout
+        self._slots = threading.BoundedSemaphore(workers)
+        self._connections = threading.Semaphore(max_connections)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http-worker')
+        self.idle_connections = IdleConnections(self, keep_alive_timeout) if keep_alive else None
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        if self.idle_connections is not None:
+            self._connections.acquire()
+            self.idle_connections.watch(request, client_address)
+            return
+        self.dispatch(request, client_address)
+
+    def dispatch(self, request, client_address, handler=None):
+        self._slots.acquire()
+        try:
+            self._pool.submit(self._process_request_worker, request, client_address, handler)
+        except RuntimeError:
+            # Pool already shut down
+            self._slots.release()
+            self.close_idle(request, handler)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _process_request_worker(self, request, client_address, handler=None):
+        parked = None
+        try:
+            if handler is None:
+                handler = self.finish_request(request, client_address)
+            else:
+                handler.resume()
+            if getattr(handler, 'parked', False):
+                parked = handler
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if parked is None:
+                self.shutdown_request(request)
+            self._slots.release()
+        if parked is not None:
+            self.idle_connections.watch(request, client_address, parked)
+
+    def close_idle(self, request, handler=None):
+        if handler is not None:
+            handler.parked = False
+            handler.finish()
+        self.shutdown_request(request)
+
+    def shutdown_request(self, request):
+        super().shutdown_request(request)
+        if self.idle_connections is not None:
+            self._connections.release()
+
+    def drain(self):
+        # Graceful stop, once serve_forever() has returned: connections
+        # already queued on the socket are served, then requests in flight
+        # are waited for
+        accept_queued(self)
+        if self.idle_connections is not None:
+            self.idle_connections.drain()
+        self._pool.shutdown(wait=True)
+
+    def server_close(self):
+        super().server_close()
+        if self.idle_connections is not None:
+            self.idle_connections.close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        close_access_log(self)
+
+
+class SingleThreadedHTTPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def drain(self):
+        accept_queued(self)
+
+    def server_close(self):
+        super().server_close()
+        close_access_log(self)
+
+
+def accept_queued(server):
+    # Serves the connections the kernel has accepted but serve_forever() has
+    # not picked up yet, then closes the listening socket. With SO_REUSEPORT
+    # the connections queued on a closed socket would be reset, not handed
+    # to the other workers.
+    server.draining = True
+    server.socket.setblocking(False)
+    while True:
+        try:
+            request, client_address = server.get_request()
+        except OSError:
+            break
+        request.setblocking(True)
+        try:
+            server.process_request(request, client_address)
+        except Exception:
+            server.handle_error(request, client_address)
+            server.shutdown_request(request)
+    server.socket.close()
+
+
+def close_access_log(server):
+    log = getattr(server, 'access_log', None)
+    if log is not None:
+        log.close()
+
+
+def make_server(port, root='.', handler_class=CustomHTTPRequestHandler, single_threaded=False,
+                workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG,
+                keep_alive_timeout=DEFAULT_KEEP_ALIVE_TIMEOUT,
+                max_connections=DEFAULT_MAX_CONNECTIONS, cache_bytes=DEFAULT_MAX_BYTES,
+                route_poll_interval=DEFAULT_POLL_INTERVAL, templates=None, host='',
+                use_sendfile=True, metrics=True, access_log_path='-',
+                access_log_options=None, reuse_port=False, early_hints=False, archive=None):
+    # reuse_port binds with SO_REUSEPORT, so that the workers of a
+    # prefork.Supervisor can each listen on the same port. With archive, files
+    # are served from that packed site instead of the root directory.
+    root = os.path.abspath(root)
+    # Opened before binding, so an unreadable archive fails without a socket
+    site_archive = SiteArchive(archive) if archive else None
+    handler = functools.partial(handler_class, directory=root)
+    if single_threaded:
+        httpd = SingleThreadedHTTPServer((host, port), handler, bind_and_activate=False)
+    else:
+        httpd = ThreadPoolHTTPServer((host, port), handler, workers=workers, backlog=backlog,
+                                     keep_alive=keep_alive_timeout > 0,
+                                     keep_alive_timeout=keep_alive_timeout,
+                                     max_connections=max_connections,
+                                     bind_and_activate=False)
+    try:
+        if reuse_port:
+            httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        httpd.server_bind()
+        httpd.server_activate()
+    except BaseException:
+        httpd.server_close()
+        raise
+    httpd.site_archive = site_archive
+    if site_archive is None:
+        httpd.file_cache = StaticFileCache(max_bytes=cache_bytes) if cache_bytes > 0 else None
+        httpd.route_index = RouteIndex(root, poll_interval=route_poll_interval).start()
+        httpd.immutable_assets = ImmutableAssets(root)
+        httpd.preload_hints = PreloadHints(root)
+    else:
+        # Routes, Cache-Control and preload hints come from the archive index
+        httpd.file_cache = httpd.route_index = None
+        httpd.immutable_assets = httpd.preload_hints = None
+    httpd.rendered_pages = RenderedPages(root, templates) if templates else None
+    httpd.use_sendfile = use_sendfile
+    httpd.early_hints = early_hints
+    httpd.metrics = RequestMetrics() if metrics else None
+    httpd.access_log = (AccessLog(access_log_path, **(access_log_options or {})).start()
+                        if access_log_path else None)
+    return httpd
+
+
+def add_server_arguments(parser, default_port):
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--root', default='.', help='document root (default: current directory)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'worker threads (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--backlog', type=int, default=DEFAULT_BACKLOG,
+                        help=f'listen backlog (default: {DEFAULT_BACKLOG})')
+    parser.add_argument('--keep-alive', type=float, default=DEFAULT_KEEP_ALIVE_TIMEOUT,
+                        help='idle keep-alive timeout in seconds, 0 disables keep-alive '
+                             f'(default: {DEFAULT_KEEP_ALIVE_TIMEOUT})')
+    parser.add_argument('--max-connections', type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help='open connections, idle ones included, before new ones wait in '
+                             f'the backlog (default: {DEFAULT_MAX_CONNECTIONS})')
+    parser.add_argument('--single-threaded', action='store_true',
+                        help='serve one request at a time (previous behaviour)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='worker processes sharing the port (SO_REUSEPORT) under a '
+                             'supervisor, 0 for one per CPU core (default: 1, no supervisor)')
+    parser.add_argument('--drain-timeout', type=float, default=prefork.DEFAULT_DRAIN_TIMEOUT,
+                        help='seconds a stopping worker process may take to finish its '
+                             f'requests (default: {prefork.DEFAULT_DRAIN_TIMEOUT:.0f})')
+    parser.add_argument('--watch-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help='seconds between route index rescans, 0 disables watching '
+                             f'(default: {DEFAULT_POLL_INTERVAL})')
+    parser.add_argument('--archive', metavar='PATH',
+                        help='serve the packed site PATH (see site_archive.py) from memory-mapped '
+                             'storage instead of the root directory')
+    parser.add_argument('--templates', nargs='?', const=DEFAULT_SOURCE_DIR, metavar='DIR',
+                        help='render page sources from DIR on request '
+                             f'(default DIR: {DEFAULT_SOURCE_DIR})')
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help='in-memory file cache size in MB, 0 disables the cache '
+                             f'(default: {DEFAULT_MAX_BYTES // (1024 * 1024)})')
+    parser.add_argument('--no-sendfile', action='store_true',
+                        help='copy file bodies through Python buffers instead of sendfile')
+    parser.add_argument('--early-hints', action='store_true',
+                        help='send 103 Early Hints with the preload hints of pages')
+    parser.add_argument('--no-metrics', action='store_true',
+                        help=f'do not record request metrics or serve {request_metrics.METRICS_PATH}')
+    parser.add_argument('--access-log', default='-', metavar='PATH',
+                        help='JSON-lines access log file, - for stderr (default: -)')
+    parser.add_argument('--no-access-log', action='store_true', help='do not log requests')
+    parser.add_argument('--access-log-max-size', type=float,
+                        default=access_log.DEFAULT_MAX_BYTES / (1024 * 1024), metavar='MB',
+                        help='rotate the access log at this size, 0 disables rotation '
+                             f'(default: {access_log.DEFAULT_MAX_BYTES // (1024 * 1024)})')
+    parser.add_argument('--access-log-backups', type=int, default=access_log.DEFAULT_BACKUPS,
+                        help=f'rotated files kept (default: {access_log.DEFAULT_BACKUPS})')
+    parser.add_argument('--access-log-sample', type=float, default=1.0, metavar='RATE',
+                        help='fraction of successful requests logged; errors are always '
+                             'logged (default: 1.0)')
+
+
+def server_from_args(args, reuse_port=False):
+    return make_server(args.port, root=args.root, single_threaded=args.single_threaded,
+                       workers=args.workers, backlog=args.backlog,
+                       keep_alive_timeout=args.keep_alive,
+                       max_connections=args.max_connections,
+                       cache_bytes=int(args.cache_size * 1024 * 1024),
+                       route_poll_interval=args.watch_interval,
+                       templates=args.templates,
+                       use_sendfile=not args.no_sendfile,
+                       metrics=not args.no_metrics,
+                       access_log_path=None if args.no_access_log else args.access_log,
+                       access_log_options={
+                           'max_bytes': int(args.access_log_max_size * 1024 * 1024),
+                           'backups': args.access_log_backups,
+                           'sample_rate': args.access_log_sample,
+                       },
+                       reuse_port=reuse_port,
+                       early_hints=args.early_hints,
+                       archive=args.archive)
+
+
+def supervisor_from_args(args):
+    # Workers build their servers after the fork, so no thread, cache or
+    # open log file is shared between processes
+    processes = args.processes or prefork.default_processes()
+    return prefork.Supervisor(functools.partial(server_from_args, args, reuse_port=True),
+                              processes, args.port, drain_timeout=args.drain_timeout)
+
 
 if __name__ == "__main__":
-    PORT = 8000
-    
-    with socketserver.TCPServer(("", PORT), CustomHTTPRequestHandler) as httpd:
-        print(f"Server running at http://localhost:{PORT}/")
+    parser = argparse.ArgumentParser(description='Static site server with clean URLs')
+    add_server_arguments(parser, default_port=8000)
+    args = parser.parse_args()
+
+    if args.processes != 1:
+        supervisor = supervisor_from_args(args)
+        print(f"Server running at http://localhost:{args.port}/ "
+              f"({supervisor.processes} processes, kill -HUP {os.getpid()} to reload)")
+        sys.exit(supervisor.run())
+
+    with server_from_args(args) as httpd:
+        mode = 'single-threaded' if args.single_threaded else f'{args.workers} workers'
+        print(f"Server running at http://localhost:{args.port}/ ({mode})")
         print("Press Ctrl+C to stop the server")
         try:
             httpd.serve_forever()
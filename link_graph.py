@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# Site-wide reference graph and integrity check. Every page is parsed (in
+# parallel) for the URLs it references: links, scripts, stylesheets,
+# images, posters, srcset candidates, inline style url()s. Stylesheets and
+# scripts reached from the pages are parsed in turn (CSS url()/@import,
+# asset paths in script strings). Each reference is resolved with the
+# clean-URL rules of the server (route_index.RouteIndex), and the graph
+# gives:
+#
+#   - broken references, with the file and line they come from
+#   - orphaned assets: images, media, documents and fonts under assets/
+#     that nothing references but that are still shipped
+#   - per-page transfer weight: the page plus everything it loads, with
+#     compressible files counted at their served (compressed) size
+#
+# Extracted references are cached per file in .link-cache/graph.json, so a
+# re-check only parses the files that changed.
+#
+#   python3 link_graph.py
+#   python3 link_graph.py --root dist --format json --output link-report.json
+import argparse
+import html.parser
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import precompress
+from build_manifest import BuildManifest
+from route_index import RouteIndex
+from site_pages import discover_pages, read_text
+
+CACHE_DIR = '.link-cache'
+GRAPH_VERSION = '2'
+CHUNK_SIZE = 64 * 1024
+
+# Reference kinds. Resources are fetched with the page and count towards
+# its weight; links are navigation; optional references (srcset
+# candidates, media sources, URLs in scripts) are fetched on demand.
+LINK = 'link'
+RESOURCE = 'resource'
+OPTIONAL = 'optional'
+
+DEFAULT_ASSET_DIRS = ('assets',)
+ORPHAN_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.svg', '.ico', '.bmp',
+    '.mp4', '.webm', '.mov', '.mp3', '.ogg', '.wav',
+    '.pdf', '.zip',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot',
+}
+WEIGHT_CATEGORIES = {
+    '.html': 'html', '.css': 'css', '.js': 'js', '.mjs': 'js',
+    '.woff': 'fonts', '.woff2': 'fonts', '.ttf': 'fonts', '.otf': 'fonts', '.eot': 'fonts',
+}
+
+RESOURCE_LINK_RELS = {'stylesheet', 'icon', 'apple-touch-icon', 'mask-icon', 'preload',
+                      'modulepreload', 'manifest'}
+OPTIONAL_LINK_RELS = {'prefetch', 'prerender'}
+OPTIONAL_SRC_TAGS = {'video', 'audio', 'source', 'track'}
+# data-* attributes read by assets/js/main.js when the page loads
+RESOURCE_DATA_ATTRS = {'data-bg-src'}
+META_URL_NAMES = {'og:image', 'og:video', 'og:audio', 'twitter:image', 'msapplication-tileimage'}
+
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(["']?)(.*?)\1\s*\)''', re.IGNORECASE | re.DOTALL)
+CSS_IMPORT_PATTERN = re.compile(r'''@import\s+(["'])(.*?)\1''', re.IGNORECASE)
+CSS_ESCAPE_PATTERN = re.compile(r'\\(.)')
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+FONT_FACE_PATTERN = re.compile(r'@font-face\s*\{[^}]*\}', re.IGNORECASE)
+FONT_SRC_PATTERN = re.compile(r'\bsrc\s*:[^;}]*', re.IGNORECASE)
+# Quoted paths with a directory and a file extension, e.g. 'assets/img/x.jpg'
+SCRIPT_PATH_PATTERN = re.compile(
+    r'''(["'`])((?:\.{0,2}/)?[\w\-. %@]+(?:/[\w\-. %@']+)+\.[A-Za-z0-9]{2,5})\1''')
+
+
+class ReferenceCollector(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # [kind, url, line]
+        self.references = []
+        self._in_style = False
+
+    def add(self, kind, url, line=None):
+        if url and url.strip():
+            self.references.append([kind, url.strip(), line or self.getpos()[0]])
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ('a', 'area'):
+            self.add(LINK, attrs.get('href'))
+        elif tag == 'link':
+            rels = set((attrs.get('rel') or '').lower().split())
+            if rels & RESOURCE_LINK_RELS:
+                kind = RESOURCE
+            elif rels & OPTIONAL_LINK_RELS:
+                kind = OPTIONAL
+            else:
+                kind = LINK
+            self.add(kind, attrs.get('href'))
+        elif tag == 'form':
+            self.add(LINK, attrs.get('action'))
+        elif tag == 'object':
+            self.add(RESOURCE, attrs.get('data'))
+        elif tag == 'meta':
+            name = (attrs.get('property') or attrs.get('name') or '').lower()
+            if name in META_URL_NAMES:
+                self.add(LINK, attrs.get('content'))
+        elif tag == 'style':
+            self._in_style = True
+
+        if 'src' in attrs and tag != 'link':
+            self.add(OPTIONAL if tag in OPTIONAL_SRC_TAGS else RESOURCE, attrs['src'])
+        if attrs.get('poster'):
+            self.add(RESOURCE, attrs['poster'])
+        for candidate in parse_srcset(attrs.get('srcset')):
+            self.add(OPTIONAL, candidate)
+        if attrs.get('style'):
+            for kind, url, _ in css_references(attrs['style']):
+                self.add(kind, url)
+        for name, value in attrs.items():
+            if name.startswith('data-') and value and '/' in value and '.' in value:
+                self.add(RESOURCE if name in RESOURCE_DATA_ATTRS else OPTIONAL, value)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag == 'style':
+            self._in_style = False
+
+    def handle_endtag(self, tag):
+        if tag == 'style':
+            self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            refs = css_references(data)
+            lines = line_numbers(data, [offset for _, _, offset in refs])
+            for (kind, url, _), line in zip(refs, lines):
+                self.add(kind, url, self.getpos()[0] + line - 1)
+
+
+def parse_srcset(value):
+    # 'a.webp 400w, b.webp 800w' -> ['a.webp', 'b.webp']
+    if not value:
+        return []
+    return [candidate.split()[0] for candidate in value.split(',') if candidate.strip()]
+
+
+def css_references(css):
+    # (kind, url, offset) triples of a stylesheet or style attribute. In an
+    # @font-face src list browsers fetch the first format they support, so
+    # the fallbacks after the first url() are optional.
+    css = CSS_COMMENT_PATTERN.sub(lambda m: re.sub(r'[^\n]', ' ', m.group(0)), css)
+    fallbacks = set()
+    for block in FONT_FACE_PATTERN.finditer(css):
+        for src in FONT_SRC_PATTERN.finditer(css, block.start(), block.end()):
+            urls = list(CSS_URL_PATTERN.finditer(css, src.start(), src.end()))
+            fallbacks.update(m.start() for m in urls[1:])
+    refs = [(RESOURCE, m.group(2), m.start()) for m in CSS_IMPORT_PATTERN.finditer(css)]
+    refs += [(OPTIONAL if m.start() in fallbacks else RESOURCE,
+              CSS_ESCAPE_PATTERN.sub(r'\1', m.group(2).strip()), m.start())
+             for m in CSS_URL_PATTERN.finditer(css)]
+    refs.sort(key=lambda ref: ref[2])
+    return refs
+
+
+def line_numbers(text, offsets):
+    # 1-based line of each offset (offsets in increasing order)
+    lines = []
+    line, pos = 1, 0
+    for offset in offsets:
+        line += text.count('\n', pos, offset)
+        pos = offset
+        lines.append(line)
+    return lines
+
+
+def extract_references(root, rel):
+    # References of one file as [kind, url, line]; runs in a worker process
+    path = os.path.join(root, rel)
+    ext = os.path.splitext(rel)[1].lower()
+    try:
+        if ext == '.html':
+            collector = ReferenceCollector()
+            with open(path, 'r', encoding='utf-8') as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    collector.feed(chunk)
+            collector.close()
+            return rel, collector.references, None
+        text = read_text(path)
+    except (OSError, UnicodeDecodeError) as e:
+        return rel, [], str(e)
+    if ext == '.css':
+        refs = [(kind, url, offset) for kind, url, offset in css_references(text)]
+    else:
+        # Scripts: quoted asset paths, fetched when the script runs
+        refs = [(OPTIONAL, m.group(2), m.start()) for m in SCRIPT_PATH_PATTERN.finditer(text)]
+    lines = line_numbers(text, [offset for _, _, offset in refs])
+    return rel, [[kind, url, line] for (kind, url, _), line in zip(refs, lines)], None
+
+
+def _extract_star(args):
+    return extract_references(*args)
+
+
+def is_parsed(rel):
+    return os.path.splitext(rel)[1].lower() in ('.html', '.css', '.js', '.mjs')
+
+
+class ReferenceGraph:
+    def __init__(self, root, workers=None, force=False):
+        self.root = os.path.abspath(root)
+        self.workers = workers or os.cpu_count() or 1
+        self.routes = RouteIndex(self.root, poll_interval=0)
+        self.cache = BuildManifest.load(os.path.join(self.root, CACHE_DIR, 'graph.json'))
+        if force:
+            self.cache.sections.clear()
+        # rel -> [[kind, url, line]]
+        self.references = {}
+        self.errors = {}
+        self.parsed = 0
+        # rel -> [(kind, url, line, target rel or None)]
+        self.edges = {}
+        self._sizes = {}
+
+    def build(self, pages):
+        # Parses the pages, then the stylesheets and scripts they reach,
+        # wave by wave; every wave is parsed in parallel
+        self.pages = list(pages)
+        wave = [p for p in self.pages if os.path.isfile(os.path.join(self.root, p))]
+        seen = set(wave)
+        while wave:
+            self._load(wave)
+            next_wave = []
+            for rel in wave:
+                self.edges[rel] = edges = []
+                js_base = '' if rel.endswith(('.js', '.mjs')) else rel
+                for kind, url, line in self.references[rel]:
+                    target = self.resolve(js_base, url)
+                    if target is None:
+                        continue
+                    edges.append((kind, url, line, target or None))
+                    if target and target not in seen and is_parsed(target) and kind != LINK:
+                        seen.add(target)
+                        next_wave.append(target)
+            wave = next_wave
+        self.cache.prune('refs', set(self.references))
+        os.makedirs(os.path.join(self.root, CACHE_DIR), exist_ok=True)
+        self.cache.save()
+        return self
+
+    def _load(self, rels):
+        dirty = []
+        for rel in rels:
+            if self.cache.check('refs', rel, os.path.join(self.root, rel), GRAPH_VERSION) is None:
+                self.references[rel] = self.cache.get('refs', rel)['references']
+            else:
+                dirty.append(rel)
+        jobs = [(self.root, rel) for rel in dirty]
+        if self.workers <= 1 or len(jobs) <= 1:
+            results = [_extract_star(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+                results = list(pool.map(_extract_star, jobs,
+                                        chunksize=max(1, len(jobs) // (self.workers * 4))))
+        for rel, refs, error in results:
+            self.references[rel] = refs
+            if error:
+                self.errors[rel] = error
+                continue
+            self.cache.record('refs', rel, os.path.join(self.root, rel), GRAPH_VERSION,
+                              references=refs)
+        self.parsed += len(dirty)
+
+    def resolve(self, base_rel, url):
+        # Root-relative file a reference from base_rel is served from, ''
+        # when it does not resolve (404), None when it is not local.
+        # Scripts resolve against the document, i.e. the site root.
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme or parsed.netloc or not parsed.path or url.startswith(('#', 'data:')):
+            return None
+        path = urllib.parse.unquote(urllib.parse.urljoin('/' + base_rel, parsed.path))
+        route = self.routes.resolve(path)
+        if route is None:
+            return ''
+        rel, is_dir = route
+        if is_dir:
+            # Directories are only content when they have an index page
+            index = rel.rstrip('/') + '/index.html' if rel.strip('/') else 'index.html'
+            return index if '/' + index in self.routes.files else ''
+        return rel
+
+    def broken(self):
+        # [(source, line, kind, url)]
+        return [(source, line, kind, url)
+                for source, edges in sorted(self.edges.items())
+                for kind, url, line, target in edges if target is None]
+
+    def reachable(self):
+        # Every file referenced, directly or through stylesheets and scripts
+        seen = set(self.pages)
+        queue = deque(self.pages)
+        while queue:
+            for _, _, _, target in self.edges.get(queue.popleft(), ()):
+                if target and target not in seen:
+                    seen.add(target)
+                    queue.append(target)
+        return seen
+
+    def orphans(self, asset_dirs=DEFAULT_ASSET_DIRS):
+        reachable = self.reachable()
+        prefixes = tuple(d.strip('/') + '/' for d in asset_dirs)
+        candidates = {rel for rel in self.routes.files.values()
+                      if rel.startswith(prefixes)
+                      and os.path.splitext(rel)[1].lower() in ORPHAN_EXTENSIONS}
+        return sorted(candidates - reachable)
+
+    def page_resources(self, page):
+        # The page and every file it loads, following resource edges only
+        seen = {page}
+        queue = deque([page])
+        while queue:
+            for kind, _, _, target in self.edges.get(queue.popleft(), ()):
+                if kind == RESOURCE and target and target not in seen:
+                    seen.add(target)
+                    queue.append(target)
+        return seen
+
+    def page_weight(self, page):
+        files = self.page_resources(page)
+        weight = {'page': page, 'requests': len(files), 'bytes': 0, 'transfer': 0,
+                  'by_type': {}}
+        for rel in files:
+            size, transfer = self.sizes(rel)
+            weight['bytes'] += size
+            weight['transfer'] += transfer
+            category = WEIGHT_CATEGORIES.get(os.path.splitext(rel)[1].lower(), 'images/other')
+            weight['by_type'][category] = weight['by_type'].get(category, 0) + transfer
+        return weight
+
+    def sizes(self, rel):
+        # (bytes on disk, bytes on the wire); compressed sizes are cached
+        if rel in self._sizes:
+            return self._sizes[rel]
+        path = os.path.join(self.root, rel)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        transfer = size
+        if size >= precompress.MIN_SIZE and precompress.is_compressible(path):
+            token = precompress.ENCODINGS[0][0]
+            if self.cache.check('sizes', rel, path, token) is None:
+                transfer = self.cache.get('sizes', rel)['transfer']
+            else:
+                with open(path, 'rb') as f:
+                    body = f.read()
+                encoded = precompress.load_variant(path, body, os.stat(path).st_mtime_ns, token)
+                transfer = len(encoded) if encoded else size
+                self.cache.record('sizes', rel, path, token, transfer=transfer)
+        self._sizes[rel] = size, transfer
+        return self._sizes[rel]
+
+    def save(self):
+        self.cache.save()
+
+
+def format_kb(size):
+    return f'{size / 1024:,.0f} KB'
+
+
+def build_report(graph, asset_dirs, started):
+    broken = graph.broken()
+    orphans = graph.orphans(asset_dirs)
+    weights = sorted((graph.page_weight(page) for page in graph.pages),
+                     key=lambda w: w['transfer'], reverse=True)
+    orphan_bytes = sum(graph.sizes(rel)[0] for rel in orphans)
+    graph.save()
+    return {
+        'broken': [{'source': source, 'line': line, 'kind': kind, 'url': url}
+                   for source, line, kind, url in broken],
+        'orphans': [{'path': rel, 'bytes': graph.sizes(rel)[0]} for rel in orphans],
+        'pages': weights,
+        'errors': graph.errors,
+        'summary': {
+            'pages': len(graph.pages),
+            'files': len(graph.edges),
+            'references': sum(len(edges) for edges in graph.edges.values()),
+            'parsed': graph.parsed,
+            'broken': len(broken),
+            'orphans': len(orphans),
+            'orphan_bytes': orphan_bytes,
+            'seconds': round(time.perf_counter() - started, 6),
+        },
+    }
+
+
+def format_text(report):
+    lines = ['Link and Asset Check:', '=' * 40]
+    by_source = {}
+    for ref in report['broken']:
+        by_source.setdefault(ref['source'], []).append(ref)
+    for source, refs in by_source.items():
+        lines.append(f'✗ {source}')
+        for ref in refs:
+            where = f':{ref["line"]}' if ref['line'] else ''
+            lines.append(f'    - {ref["kind"]} {ref["url"]} ({source}{where})')
+    for rel, error in sorted(report['errors'].items()):
+        lines.append(f'✗ {rel} - {error}')
+
+    summary = report['summary']
+    if report['orphans']:
+        lines += ['', f'Orphaned assets ({summary["orphans"]}, '
+                      f'{format_kb(summary["orphan_bytes"])}):']
+        lines += [f'    {format_kb(o["bytes"]):>10}  {o["path"]}' for o in report['orphans']]
+
+    lines += ['', 'Page weight (page + resources, transfer size):',
+              f'    {"page":<44}{"requests":>9}{"transfer":>12}{"on disk":>12}']
+    for w in report['pages']:
+        lines.append(f'    {w["page"]:<44}{w["requests"]:>9}{format_kb(w["transfer"]):>12}'
+                     f'{format_kb(w["bytes"]):>12}')
+
+    lines.append('')
+    status = '⚠' if summary['broken'] or report['errors'] else '🎉'
+    lines.append(f'{status} {summary["broken"]} broken references, {summary["orphans"]} orphaned '
+                 f'assets in {summary["pages"]} pages ({summary["references"]} references, '
+                 f'{summary["parsed"]} of {summary["files"]} files parsed, '
+                 f'{summary["seconds"] * 1000:.0f} ms)')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check page references: broken links, '
+                                                 'orphaned assets and page weight')
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--asset-dirs', default=','.join(DEFAULT_ASSET_DIRS),
+                        help='comma-separated directories checked for orphaned assets '
+                             f'(default: {",".join(DEFAULT_ASSET_DIRS)})')
+    parser.add_argument('--format', choices=['text', 'json'], default='text')
+    parser.add_argument('--output', help='write the report to a file instead of stdout')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: CPU count, 1 runs in-process)')
+    parser.add_argument('--force', action='store_true', help='ignore the cached graph')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    graph = ReferenceGraph(args.root, workers=args.workers, force=args.force)
+    graph.build(discover_pages(args.root))
+    asset_dirs = [d.strip() for d in args.asset_dirs.split(',') if d.strip()]
+    report = build_report(graph, asset_dirs, started)
+
+    if args.format == 'json':
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+    else:
+        output = format_text(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 1 if report['broken'] or report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
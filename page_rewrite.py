@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# Page rewrite engine. Replaces the one-off update-*.py scripts: each page is
+# read once, every selected transform is applied to the in-memory content,
+# and the file is written back only when the output differs. Pages are
+# processed in parallel across a process pool.
+#
+# A content-hash manifest (.build-manifest.json in the site root) records,
+# per page, the hash of the transforms and partials applied and of the
+# resulting page. Pages whose inputs and content are unchanged are skipped
+# without being read.
+#
+#   python3 page_rewrite.py                          # standard header/footer/styles/auth
+#   python3 page_rewrite.py --preset auth-integration --dry-run
+#   python3 page_rewrite.py --transforms header,footer --pages about.html contact.html
+#   python3 page_rewrite.py --force                  # ignore the manifest
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from build_manifest import MANIFEST_NAME, BuildManifest, combine_keys, digest_text
+from page_templates import TemplateError, render_partial
+from site_pages import (FOOTER_PARTIAL, HEADER_PARTIAL, discover_pages, read_text,
+                        select_pages, write_text)
+
+# Standard CSS for all pages
+STANDARD_CSS = '''  <style>
+    /* Header Menu Hover Color Fix */
+    .vs-header .main-menu ul li a svg path {
+      fill: #BDCF00 !important;
+    }
+  </style>'''
+
+# Standard stylesheet includes, copied from the home page
+STANDARD_STYLESHEETS = '''  <!-- Bootstrap -->
+  <link rel="stylesheet" href="assets/css/bootstrap.min.css">
+  <!-- Fontawesome Icon -->
+  <link rel="stylesheet" href="assets/css/fontawesome.min.css">
+  <link rel="stylesheet" href="assets/css/magnific-popup.min.css">
+  <!-- Slick Slider -->
+  <link rel="stylesheet" href="assets/css/swiper-bundle.css">
+  <!-- animate css -->
+  <link rel="stylesheet" href="assets/css/animate.min.css">
+  <!-- AOS Animation Library -->
+  <link href="https://unpkg.com/aos@2.3.1/dist/aos.css" rel="stylesheet">
+  <!-- Theme Custom CSS -->
+  <link rel="stylesheet" href="assets/css/style.css">'''
+
+# Supabase CDN and auth styles, added before </head>
+SUPABASE_HEAD = '''
+  <!-- Supabase -->
+  <script src="https://unpkg.com/@supabase/supabase-js@2"></script>
+  <!-- Authentication Styles -->
+  <link rel="stylesheet" href="assets/css/auth-styles.css">'''
+
+# Auth scripts, added before </body>
+AUTH_SCRIPTS = '''
+  <!-- Authentication Scripts -->
+  <script src="assets/js/supabase-config.js"></script>
+  <script src="assets/js/spectacles-auth.js"></script>'''
+
+# Regions are matched from the start of their first line so the replacement
+# keeps its own indentation and repeated runs are idempotent
+HEADER_PATTERN = re.compile(
+    r'(?:^[ \t]*)?(?:<!--=+\s*Mobile Menu\s*=+-->|<div class="vs-menu-wrapper">'
+    r'|<!--=+\s*Header Area\s*=+-->).*?</header>',
+    re.DOTALL | re.MULTILINE)
+FOOTER_PATTERN = re.compile(
+    r'(?:^[ \t]*)?<div class="vs-footer bg-title">.*?</div>(?=\s*<!--\*+\s*Back To Top)',
+    re.DOTALL | re.MULTILINE)
+NAV_PATTERN = re.compile(r'(?:^[ \t]*)?<nav class="main-menu[^>]*>.*?</nav>',
+                         re.DOTALL | re.MULTILINE)
+STYLESHEETS_PATTERN = re.compile(
+    r'(?:^[ \t]*)?<!-- Bootstrap -->.*?<!-- Theme Custom CSS -->\s*'
+    r'<link rel="stylesheet" href="assets/css/style\.css">',
+    re.DOTALL | re.MULTILINE)
+HEADER_AREA_PATTERN = re.compile(r'^[ \t]*<!--=+\s*Header Area\s*=+-->', re.MULTILINE)
+BODY_PATTERN = re.compile(r'<body[^>]*>')
+
+
+class Transform:
+    name = None
+    label = None
+    # Pages this transform never touches
+    exclude = ()
+
+    def __init__(self, exclude=None):
+        if exclude is not None:
+            self.exclude = tuple(exclude)
+
+    def applies_to(self, page):
+        return page not in self.exclude
+
+    def apply(self, content):
+        # Returns (content, found); found is False when the page has no
+        # region this transform can anchor on
+        raise NotImplementedError
+
+    def signature(self):
+        # Identifies the transform and its parameters
+        return f'{type(self).__name__}:{self.name}:{sorted(self.exclude)}'
+
+
+class RegionSwap(Transform):
+    def __init__(self, name, label, pattern, replacement, exclude=None):
+        super().__init__(exclude)
+        self.name = name
+        self.label = label
+        self.pattern = pattern
+        self.replacement = replacement
+
+    def apply(self, content):
+        new, count = self.pattern.subn(lambda m: self.replacement, content, count=1)
+        return new, count > 0
+
+    def signature(self):
+        return f'{super().signature()}:{self.pattern.pattern}:{self.replacement}'
+
+
+class Inject(Transform):
+    # Inserts snippet before the closing tag unless marker is already present
+    def __init__(self, name, label, snippet, before, marker, exclude=None):
+        super().__init__(exclude)
+        self.name = name
+        self.label = label
+        self.snippet = snippet
+        self.before = before
+        self.marker = marker
+
+    def apply(self, content):
+        if self.marker in content:
+            return content, True
+        if self.before not in content:
+            return content, False
+        return content.replace(self.before, f'{self.snippet}\n{self.before}', 1), True
+
+    def signature(self):
+        return f'{super().signature()}:{self.before}:{self.marker}:{self.snippet}'
+
+
+class InsertAfterBody(Transform):
+    def __init__(self, name, label, snippet, marker, exclude=None):
+        super().__init__(exclude)
+        self.name = name
+        self.label = label
+        self.snippet = snippet
+        self.marker = marker
+
+    def apply(self, content):
+        if self.marker in content:
+            return content, True
+        new, count = BODY_PATTERN.subn(lambda m: f'{m.group(0)}\n{self.snippet}', content, count=1)
+        return new, count > 0
+
+    def signature(self):
+        return f'{super().signature()}:{self.marker}:{self.snippet}'
+
+
+def extract_nav(header):
+    match = NAV_PATTERN.search(header)
+    return match.group(0) if match else None
+
+
+def extract_mobile_menu(header):
+    # The part of the standard header before the Header Area banner
+    match = HEADER_AREA_PATTERN.search(header)
+    return header[:match.start()].rstrip() if match else None
+
+
+def load_partials(root='.'):
+    # Partials are rendered, so their own includes are expanded
+    return {
+        'header': render_partial(HEADER_PARTIAL, root),
+        'footer': render_partial(FOOTER_PARTIAL, root),
+    }
+
+
+def build_transforms(names, partials):
+    header = partials['header'].rstrip('\n')
+    footer = partials['footer'].rstrip('\n')
+    factories = {
+        'header': lambda: RegionSwap('header', 'header', HEADER_PATTERN, header),
+        'footer': lambda: RegionSwap('footer', 'footer', FOOTER_PATTERN, footer,
+                                     exclude=['index.html']),
+        'nav': lambda: RegionSwap('nav', 'navigation', NAV_PATTERN, extract_nav(header)),
+        'mobile-menu': lambda: InsertAfterBody('mobile-menu', 'mobile menu',
+                                               extract_mobile_menu(header), 'vs-menu-wrapper'),
+        'styles': lambda: RegionSwap('styles', 'stylesheet includes', STYLESHEETS_PATTERN,
+                                     STANDARD_STYLESHEETS, exclude=['index.html']),
+        'css-fix': lambda: Inject('css-fix', 'CSS fix', STANDARD_CSS, '</head>', STANDARD_CSS,
+                                  exclude=['index.html']),
+        'supabase': lambda: Inject('supabase', 'Supabase CDN', SUPABASE_HEAD, '</head>',
+                                   'supabase-js@2'),
+        'auth-scripts': lambda: Inject('auth-scripts', 'auth scripts', AUTH_SCRIPTS, '</body>',
+                                       'supabase-config.js'),
+    }
+    unknown = [name for name in names if name not in factories]
+    if unknown:
+        raise ValueError(f'unknown transform(s): {", ".join(unknown)}')
+    return [factories[name]() for name in names]
+
+
+TRANSFORM_NAMES = ['header', 'footer', 'nav', 'mobile-menu', 'styles', 'css-fix', 'supabase',
+                   'auth-scripts']
+
+# Presets reproduce the former update-*.py scripts. 'pages' and 'exclude'
+# are glob patterns over the discovered pages.
+PRESETS = {
+    'standard': {
+        'transforms': ['header', 'footer', 'styles', 'css-fix', 'supabase', 'auth-scripts'],
+    },
+    'all-pages': {  # update-all-pages.py
+        'transforms': ['header', 'footer'],
+        'exclude': ['index.html'],
+    },
+    'remaining-pages': {  # update-remaining-pages.py
+        'transforms': ['mobile-menu', 'nav', 'footer'],
+        'pages': ['gallery.html', 'spectacle-*.html'],
+    },
+    'header-auth': {  # update-header-auth.py
+        'transforms': ['header'],
+    },
+    'headers': {  # update-headers.py
+        'transforms': ['styles', 'css-fix'],
+        'exclude': ['index.html'],
+    },
+    'auth-integration': {  # update-auth-integration.py
+        'transforms': ['supabase', 'auth-scripts'],
+    },
+}
+
+
+class PageResult:
+    __slots__ = ('page', 'changed', 'updated', 'missing', 'error', 'digest')
+
+    def __init__(self, page, changed=False, updated=(), missing=(), error=None, digest=None):
+        self.page = page
+        self.changed = changed
+        self.updated = list(updated)
+        self.missing = list(missing)
+        self.error = error
+        self.digest = digest
+
+
+def apply_transforms(content, page, transforms):
+    # Returns (content, labels updated, labels whose anchor is missing)
+    updated, missing = [], []
+    for transform in transforms:
+        if not transform.applies_to(page):
+            continue
+        new, found = transform.apply(content)
+        if not found:
+            missing.append(transform.label)
+        elif new != content:
+            updated.append(transform.label)
+        content = new
+    return content, updated, missing
+
+
+def rewrite_page(root, page, transforms, dry_run=False):
+    path = os.path.join(root, page)
+    try:
+        original = read_text(path)
+        content, updated, missing = apply_transforms(original, page, transforms)
+        changed = content != original
+        if changed and not dry_run:
+            write_text(path, content)
+    except OSError as e:
+        return PageResult(page, error=str(e))
+    return PageResult(page, changed, updated, missing, digest=digest_text(content))
+
+
+def _rewrite_page_star(args):
+    return rewrite_page(*args)
+
+
+def rewrite_pages(root, pages, transforms, workers=None, dry_run=False):
+    jobs = [(root, page, transforms, dry_run) for page in pages]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(jobs) <= 1:
+        return [_rewrite_page_star(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(_rewrite_page_star, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def page_keys(pages, transforms):
+    # Input key per page: the signatures (parameters and partial contents)
+    # of the transforms that apply to it
+    signatures = {}
+    keys = {}
+    for page in pages:
+        applicable = tuple(t.signature() for t in transforms if t.applies_to(page))
+        if applicable not in signatures:
+            signatures[applicable] = combine_keys(*applicable)
+        keys[page] = signatures[applicable]
+    return keys
+
+
+def manifest_scope(transforms):
+    return 'page_rewrite:' + ','.join(t.name for t in transforms)
+
+
+def find_dirty_pages(root, pages, keys, manifest, scope):
+    # Returns {page: reason} for the pages that need a rewrite
+    if manifest is None:
+        return {page: 'forced' for page in pages}
+    dirty = {}
+    for page in pages:
+        reason = manifest.check(scope, page, os.path.join(root, page), keys[page])
+        if reason is not None:
+            dirty[page] = reason
+    return dirty
+
+
+def print_results(results, dry_run=False):
+    for result in results:
+        if result.error:
+            print(f'✗ {result.page}: {result.error}')
+            continue
+        status = '✓' if result.changed else '·'
+        print(f'{status} {result.page}' + ('' if result.changed else ' (unchanged)'))
+        verb = 'Would update' if dry_run else 'Updated'
+        for label in result.updated:
+            print(f'    ✓ {verb} {label}')
+        for label in result.missing:
+            print(f'    ⚠ Could not find {label} pattern')
+
+
+def add_selection_arguments(parser):
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--preset', default='standard', choices=sorted(PRESETS),
+                        help='transform set and page selection (default: standard)')
+    parser.add_argument('--transforms',
+                        help=f'comma-separated transforms, overrides the preset '
+                             f'({", ".join(TRANSFORM_NAMES)})')
+    parser.add_argument('--pages', nargs='+', metavar='PAGE',
+                        help='pages or glob patterns to process (default: preset selection)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: CPU count, 1 runs in-process)')
+
+
+def resolve_selection(args):
+    preset = PRESETS[args.preset]
+    names = args.transforms.split(',') if args.transforms else preset['transforms']
+    transforms = build_transforms([name.strip() for name in names], load_partials(args.root))
+    include = args.pages or preset.get('pages')
+    exclude = None if args.pages else preset.get('exclude')
+    pages = select_pages(discover_pages(args.root), include, exclude)
+    return pages, transforms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply standard header/footer/script transforms to all pages')
+    add_selection_arguments(parser)
+    parser.add_argument('--dry-run', action='store_true', help='report changes without writing')
+    parser.add_argument('--force', action='store_true',
+                        help='process every page, ignoring the manifest')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        pages, transforms = resolve_selection(args)
+    except (OSError, ValueError, TemplateError) as e:
+        print(f'✗ {e}')
+        return 2
+
+    manifest = None if args.force else BuildManifest.load(os.path.join(args.root, MANIFEST_NAME))
+    scope = manifest_scope(transforms)
+    keys = page_keys(pages, transforms)
+    dirty = find_dirty_pages(args.root, pages, keys, manifest, scope)
+
+    print(f'Rewriting {len(pages)} pages: {", ".join(t.name for t in transforms)}')
+    print('=' * 50)
+    if dirty:
+        print(f'Dirty: {len(dirty)} of {len(pages)} pages')
+        for page, reason in dirty.items():
+            print(f'  • {page} ({reason})')
+        print()
+
+    results = rewrite_pages(args.root, list(dirty), transforms, workers=args.workers,
+                            dry_run=args.dry_run)
+    print_results(results, dry_run=args.dry_run)
+
+    if manifest is not None and not args.dry_run:
+        for result in results:
+            if result.error is None:
+                manifest.record(scope, result.page, os.path.join(args.root, result.page),
+                                keys[result.page], digest=result.digest)
+        manifest.prune(scope, set(discover_pages(args.root)))
+        manifest.save()
+
+    changed = sum(1 for r in results if r.changed)
+    errors = sum(1 for r in results if r.error)
+    elapsed = time.perf_counter() - started
+    print()
+    verb = 'would change' if args.dry_run else 'rewritten'
+    print(f'{changed} pages {verb}, {len(results) - changed - errors} unchanged, '
+          f'{len(pages) - len(results)} clean in {elapsed * 1000:.0f} ms')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
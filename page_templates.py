@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# Template/partial rendering layer. Page sources are HTML files whose shared
+# parts are replaced by include directives:
+#
+#   <!--#include file="standard-header.html" -->
+#
+# Include paths are relative to the site root and may nest (the standard
+# header includes partials/nav-decoration.svg). An included partial is
+# re-indented to the column of its directive. Templates are compiled once
+# into literal/include parts and cached in memory together with their
+# renders; a render is reused until one of the files it depends on changes.
+#
+#   python3 page_templates.py extract             # one-time: pages -> pages/ sources
+#   python3 page_templates.py build               # render pages/*.html into the site root
+#   python3 page_templates.py build --out dist
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+
+from site_pages import (FOOTER_PARTIAL, HEADER_PARTIAL, discover_pages, read_text,
+                        write_text)
+
+DEFAULT_SOURCE_DIR = 'pages'
+DEFAULT_CHECK_INTERVAL = 1.0
+MAX_INCLUDE_DEPTH = 16
+
+INCLUDE_PATTERN = re.compile(r'<!--#include\s+file="([^"]+)"\s*-->')
+
+
+class TemplateError(Exception):
+    pass
+
+
+class Include:
+    __slots__ = ('path', 'indent')
+
+    def __init__(self, path, indent):
+        self.path = path
+        self.indent = indent
+
+
+def compile_template(source):
+    # Splits source into literal strings and Include parts
+    parts = []
+    pos = 0
+    for match in INCLUDE_PATTERN.finditer(source):
+        line_start = source.rfind('\n', 0, match.start()) + 1
+        prefix = source[line_start:match.start()]
+        indent = prefix if not prefix.strip() else ''
+        if match.start() > pos:
+            parts.append(source[pos:match.start()])
+        parts.append(Include(match.group(1), indent))
+        pos = match.end()
+    if pos < len(source):
+        parts.append(source[pos:])
+    return parts
+
+
+def reindent(text, indent):
+    if not indent or '\n' not in text:
+        return text
+    return text.replace('\n', '\n' + indent)
+
+
+class TemplateEngine:
+    def __init__(self, root='.', check_interval=DEFAULT_CHECK_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.check_interval = check_interval
+        # path -> ((mtime_ns, size), compiled parts)
+        self._compiled = {}
+        # path -> (rendered text, {dependency path: (mtime_ns, size)}, checked_at)
+        self._renders = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name, base=None):
+        path = os.path.normpath(os.path.join(base or self.root, name))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise TemplateError(f'include outside the site root: {name}')
+        return path
+
+    def render(self, path):
+        # Renders the template at path (absolute or relative to the root)
+        return self.render_with_dependencies(path)[0]
+
+    def render_with_dependencies(self, path):
+        # Returns (text, {dependency path: (mtime_ns, size)})
+        path = self.resolve(path)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._renders.get(path)
+        if cached is not None:
+            text, deps, checked_at = cached
+            if now - checked_at < self.check_interval:
+                return text, deps
+            if self._deps_unchanged(deps):
+                with self._lock:
+                    self._renders[path] = (text, deps, now)
+                return text, deps
+
+        deps = {}
+        text = self._render(path, deps, ())
+        with self._lock:
+            self._renders[path] = (text, deps, now)
+        return text, deps
+
+    def _deps_unchanged(self, deps):
+        for dep, state in deps.items():
+            try:
+                st = os.stat(dep)
+            except OSError:
+                return False
+            if (st.st_mtime_ns, st.st_size) != state:
+                return False
+        return True
+
+    def _compile(self, path, deps):
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            raise TemplateError(f'missing template or partial: {os.path.relpath(path, self.root)}') from e
+        state = (st.st_mtime_ns, st.st_size)
+        deps[path] = state
+        with self._lock:
+            cached = self._compiled.get(path)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        parts = compile_template(read_text(path))
+        with self._lock:
+            self._compiled[path] = (state, parts)
+        return parts
+
+    def _render(self, path, deps, stack):
+        if path in stack:
+            chain = ' -> '.join(os.path.relpath(p, self.root) for p in stack + (path,))
+            raise TemplateError(f'include cycle: {chain}')
+        if len(stack) >= MAX_INCLUDE_DEPTH:
+            raise TemplateError(f'includes nested deeper than {MAX_INCLUDE_DEPTH}')
+        out = []
+        for part in self._compile(path, deps):
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                included = self._render(self.resolve(part.path), deps, stack + (path,))
+                out.append(reindent(included.rstrip('\n'), part.indent))
+        return ''.join(out)
+
+
+def render_partial(name, root='.'):
+    # Shared partials may themselves contain includes
+    return TemplateEngine(root, check_interval=0).render(name)
+
+
+def build_pages(root='.', src=DEFAULT_SOURCE_DIR, out=None, pages=None):
+    # Renders src/*.html into out (default: the site root). Returns a list of
+    # (page, status) with status 'written', 'unchanged' or an error message.
+    engine = TemplateEngine(root, check_interval=0)
+    src_dir = os.path.join(root, src)
+    out_dir = out or root
+    os.makedirs(out_dir, exist_ok=True)
+    names = pages or discover_pages(src_dir)
+    results = []
+    for name in names:
+        try:
+            text = engine.render(os.path.join(src_dir, name))
+        except (OSError, TemplateError) as e:
+            results.append((name, str(e)))
+            continue
+        target = os.path.join(out_dir, name)
+        try:
+            current = read_text(target)
+        except OSError:
+            current = None
+        if current == text:
+            results.append((name, 'unchanged'))
+        else:
+            write_text(target, text)
+            results.append((name, 'written'))
+    return results
+
+
+def extract_page(content):
+    # Turns a full page into a source: the header and footer regions are
+    # replaced by include directives. Returns (source, replaced labels).
+    from page_rewrite import FOOTER_PATTERN, HEADER_PATTERN
+    replaced = []
+    for label, pattern, partial in (('header', HEADER_PATTERN, HEADER_PARTIAL),
+                                    ('footer', FOOTER_PATTERN, FOOTER_PARTIAL)):
+        content, count = pattern.subn(
+            lambda m: f'<!--#include file="{partial}" -->', content, count=1)
+        if count:
+            replaced.append(label)
+    return content, replaced
+
+
+def extract_pages(root='.', src=DEFAULT_SOURCE_DIR, pages=None, overwrite=False):
+    src_dir = os.path.join(root, src)
+    os.makedirs(src_dir, exist_ok=True)
+    results = []
+    for name in pages or discover_pages(root):
+        target = os.path.join(src_dir, name)
+        if os.path.exists(target) and not overwrite:
+            results.append((name, None, 'exists'))
+            continue
+        source, replaced = extract_page(read_text(os.path.join(root, name)))
+        write_text(target, source)
+        results.append((name, replaced, 'written'))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render pages from sources and shared partials')
+    parser.add_argument('command', choices=['build', 'extract'])
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--src', default=DEFAULT_SOURCE_DIR,
+                        help=f'page sources, relative to the root (default: {DEFAULT_SOURCE_DIR})')
+    parser.add_argument('--out', help='output directory for build (default: the site root)')
+    parser.add_argument('--overwrite', action='store_true', help='extract: replace existing sources')
+    parser.add_argument('pages', nargs='*', help='pages to process (default: all)')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    errors = 0
+    if args.command == 'extract':
+        print(f'Extracting page sources into {args.src}/')
+        print('=' * 50)
+        for name, replaced, status in extract_pages(args.root, args.src, args.pages, args.overwrite):
+            if status == 'exists':
+                print(f'· {name} (source exists, use --overwrite)')
+                continue
+            print(f'✓ {name}')
+            for label in ('header', 'footer'):
+                if label not in replaced:
+                    print(f'    ⚠ Could not find {label} pattern, left inline')
+    else:
+        print(f'Rendering {args.src}/ into {args.out or args.root}')
+        print('=' * 50)
+        for name, status in build_pages(args.root, args.src, args.out, args.pages):
+            if status == 'written':
+                print(f'✓ {name}')
+            elif status == 'unchanged':
+                print(f'· {name} (unchanged)')
+            else:
+                errors += 1
+                print(f'✗ {name}: {status}')
+    print()
+    print(f'Done in {(time.perf_counter() - started) * 1000:.0f} ms')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
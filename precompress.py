@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# Precompressed text assets: writes .gz (and .br when the brotli module is
+# installed) siblings next to every text asset, and provides the
+# Accept-Encoding negotiation used by CustomHTTPRequestHandler.
+#
+#   python3 precompress.py            # compress everything under the current directory
+#   python3 precompress.py --root dist --force
+import argparse
+import gzip
+import os
+import sys
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.html', '.css', '.js', '.mjs', '.json', '.map', '.svg', '.xml', '.txt',
+    '.ico', '.ttf', '.otf', '.eot',
+}
+
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__'}
+
+# Files smaller than this are not worth a Content-Encoding header
+MIN_SIZE = 256
+
+
+def _gzip(data, level):
+    # mtime=0 keeps the output byte-identical between runs
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+# (encoding token, file suffix, compressor, build level, on-the-fly level),
+# in server preference order
+ENCODINGS = [('gzip', '.gz', _gzip, 9, 6)]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', _brotli, 11, 5))
+
+SUFFIXES = {token: suffix for token, suffix, _, _, _ in ENCODINGS}
+
+
+def is_compressible(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def parse_accept_encoding(header):
+    # Returns {token: qvalue} for the codings the client accepts
+    accepted = {}
+    for part in (header or '').split(','):
+        fields = part.strip().split(';')
+        token = fields[0].strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def negotiate(header):
+    # Picks the best coding we can produce, or None for identity
+    accepted = parse_accept_encoding(header)
+    if not accepted:
+        return None
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for token, _, _, _, _ in ENCODINGS:
+        q = accepted.get(token, wildcard)
+        if q > best_q:
+            best, best_q = token, q
+    return best
+
+
+def compress_bytes(data, token, build=False):
+    for name, _, compressor, build_level, lazy_level in ENCODINGS:
+        if name == token:
+            return compressor(data, build_level if build else lazy_level)
+    raise ValueError(f'unsupported encoding: {token}')
+
+
+def load_variant(path, body, mtime_ns, token):
+    # Returns the encoded body for an asset: the precompressed sibling when it
+    # is at least as new as the source, otherwise compressed on the fly.
+    # Returns None when encoding does not make the body smaller.
+    if len(body) < MIN_SIZE:
+        return None
+    sibling = path + SUFFIXES[token]
+    try:
+        if os.stat(sibling).st_mtime_ns >= mtime_ns:
+            with open(sibling, 'rb') as f:
+                return f.read()
+    except OSError:
+        pass
+    encoded = compress_bytes(body, token)
+    return encoded if len(encoded) < len(body) else None
+
+
+def iter_assets(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if is_compressible(path):
+                yield path
+
+
+def compress_asset(path, force=False):
+    # Writes the siblings for one asset; returns (original, {token: size})
+    # for the siblings written, skipping those already up to date.
+    st = os.stat(path)
+    if st.st_size < MIN_SIZE:
+        return st.st_size, {}
+    data = None
+    written = {}
+    for token, suffix, _, _, _ in ENCODINGS:
+        sibling = path + suffix
+        if not force and os.path.exists(sibling) and os.stat(sibling).st_mtime_ns >= st.st_mtime_ns:
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        encoded = compress_bytes(data, token, build=True)
+        if len(encoded) >= len(data):
+            if os.path.exists(sibling):
+                os.remove(sibling)
+            continue
+        # Written aside and renamed: a running server trusts any sibling
+        # at least as new as the source and must never read a partial one
+        tmp = sibling + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(encoded)
+        os.replace(tmp, sibling)
+        written[token] = len(encoded)
+    return st.st_size, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write precompressed siblings for text assets')
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--force', action='store_true', help='recompress up-to-date siblings too')
+    args = parser.parse_args()
+
+    tokens = ', '.join(token for token, _, _, _, _ in ENCODINGS)
+    print(f'Precompressing text assets ({tokens})...')
+    if brotli is None:
+        print('  ⚠ brotli module not installed, writing gzip only')
+    print('=' * 50)
+
+    started = time.perf_counter()
+    original_total = 0
+    encoded_total = {}
+    count = 0
+    for path in iter_assets(args.root):
+        original, written = compress_asset(path, force=args.force)
+        if not written:
+            continue
+        count += 1
+        original_total += original
+        sizes = ', '.join(f'{token} {size:,}' for token, size in written.items())
+        print(f'  ✓ {os.path.relpath(path, args.root)}: {original:,} → {sizes}')
+        for token, size in written.items():
+            encoded_total[token] = encoded_total.get(token, 0) + size
+
+    print()
+    print(f'{count} assets compressed in {time.perf_counter() - started:.2f}s')
+    for token, size in encoded_total.items():
+        ratio = original_total / size if size else 0
+        print(f'  {token}: {original_total:,} → {size:,} bytes ({ratio:.1f}x)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
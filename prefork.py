@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# Pre-fork supervisor for the site servers (--processes N).
+#
+# The supervisor forks N worker processes. Each one builds its own server
+# (thread pool, file cache, route index, access log) on a socket bound to
+# the shared port with SO_REUSEPORT, so the kernel spreads new connections
+# across the workers and requests are served on every core. The
+# supervisor itself never accepts a connection; it only watches its
+# workers:
+#
+#   SIGHUP           graceful reload: a new generation of workers is started
+#                    and, once all of them listen, the old ones stop
+#                    accepting, serve what is already queued or in flight
+#                    and exit. If the new workers fail to start, the old
+#                    ones keep serving.
+#   SIGTERM, SIGINT  graceful shutdown (a second signal kills the workers)
+#   worker exit      a worker that dies unexpectedly is replaced, after a
+#                    growing delay when it keeps dying right after starting
+#
+# Workers still running drain_timeout seconds after being asked to stop
+# are killed. A worker whose supervisor is gone stops on its own.
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+DEFAULT_READY_TIMEOUT = 10.0
+DEFAULT_DRAIN_TIMEOUT = 30.0
+# Restart delay of a worker that keeps dying: doubles from MIN to MAX, and
+# is reset by a worker that stayed up STABLE_AFTER seconds
+MIN_RESTART_DELAY = 0.1
+MAX_RESTART_DELAY = 5.0
+STABLE_AFTER = 10.0
+TICK = 0.2
+PARENT_CHECK_INTERVAL = 1.0
+
+
+def default_processes():
+    # One worker per core this process may run on
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def check_port(host, port):
+    # A bind without SO_REUSEPORT fails while anything listens on the port,
+    # including the workers of another supervisor, which would otherwise
+    # silently share the port with ours. Raises OSError.
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((host, port))
+
+
+def describe_exit(status):
+    code = os.waitstatus_to_exitcode(status)
+    if code < 0:
+        try:
+            return f'killed by {signal.Signals(-code).name}'
+        except ValueError:
+            return f'killed by signal {-code}'
+    return f'exit status {code}'
+
+
+class Worker:
+    def __init__(self, pid, generation, ready_fd):
+        self.pid = pid
+        self.generation = generation
+        # Read end of the pipe the worker writes to once it listens
+        self.ready_fd = ready_fd
+        self.ready = False
+        self.started = time.monotonic()
+        self.stop_deadline = None
+        self.killed = False
+
+
+class Supervisor:
+    def __init__(self, make_server, processes, port, host='',
+                 ready_timeout=DEFAULT_READY_TIMEOUT, drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+        # make_server() is called in each worker and must return a bound,
+        # listening server with SO_REUSEPORT set (see custom_server.make_server)
+        self.make_server = make_server
+        self.processes = processes
+        self.port = port
+        self.host = host
+        self.ready_timeout = ready_timeout
+        self.drain_timeout = drain_timeout
+        self.workers = {}
+        # Generation serving requests, and the one being started by a reload
+        self.generation = 0
+        self.pending = None
+        self.pending_deadline = None
+        self.restarts = []
+        self.restart_delay = 0.0
+        self.state = 'starting'
+        self._signals = []
+
+    def log(self, message):
+        print(f'[supervisor {os.getpid()}] {message}', file=sys.stderr, flush=True)
+
+    # Supervisor
+
+    def run(self):
+        # Returns the process exit status
+        try:
+            check_port(self.host, self.port)
+        except OSError as e:
+            self.log(f'✗ Cannot listen on port {self.port}: {e.strerror} '
+                     '(is another server running?)')
+            return 1
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+
+        if not self.start():
+            self.shutdown()
+            return 1
+        self.state = 'running'
+        pids = ', '.join(str(w.pid) for w in self.workers.values())
+        self.log(f'✓ {self.processes} workers listening on port {self.port} (pids {pids})')
+
+        while self.state == 'running':
+            self.handle_signals()
+            self.poll()
+            self.check_reload()
+            self.restart_due()
+            self.kill_overdue()
+        self.shutdown()
+        return 0
+
+    def start(self):
+        self.spawn_generation(self.generation)
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            self.poll()
+            if self.state != 'starting':
+                return False
+            if self.generation_ready(self.generation):
+                return True
+            if time.monotonic() > deadline:
+                self.log(f'✗ Workers not listening after {self.ready_timeout:.0f}s')
+                return False
+            if self._signals:
+                return False
+
+    def shutdown(self):
+        self.state = 'stopping'
+        self._signals.clear()
+        self.stop_workers(list(self.workers.values()))
+        while self.workers:
+            if any(signum != signal.SIGHUP for signum in self._signals):
+                # Second SIGINT/SIGTERM: do not wait for the drain
+                for worker in self.workers.values():
+                    worker.stop_deadline = 0
+            self._signals.clear()
+            self.poll()
+            self.kill_overdue()
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def handle_signals(self):
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum == signal.SIGHUP:
+                self.reload()
+            else:
+                self.log(f'{signal.Signals(signum).name}: stopping workers')
+                self.state = 'stopping'
+                return
+
+    def poll(self):
+        # Waits up to TICK for workers to report they listen, then reaps the
+        # workers that exited
+        waiting = {w.ready_fd: w for w in self.workers.values() if w.ready_fd is not None}
+        if waiting:
+            readable, _, _ = select.select(list(waiting), [], [], TICK)
+        else:
+            readable = []
+            time.sleep(TICK)
+        for fd in readable:
+            worker = waiting[fd]
+            worker.ready = os.read(fd, 1) == b'1'
+            self.close_ready_fd(worker)
+        self.reap()
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is not None:
+                self.close_ready_fd(worker)
+                self.worker_exited(worker, status)
+
+    def worker_exited(self, worker, status):
+        if worker.stop_deadline is not None or self.state == 'stopping':
+            return
+        self.log(f'✗ Worker {worker.pid} {describe_exit(status)}')
+        if self.state == 'starting':
+            self.state = 'failed'
+        elif worker.generation == self.pending:
+            self.abort_reload('a new worker exited')
+        elif worker.generation == self.generation:
+            now = time.monotonic()
+            if worker.ready and now - worker.started >= STABLE_AFTER:
+                self.restart_delay = 0.0
+            else:
+                self.restart_delay = min(max(self.restart_delay * 2, MIN_RESTART_DELAY),
+                                         MAX_RESTART_DELAY)
+            self.restarts.append(now + self.restart_delay)
+
+    def restart_due(self):
+        now = time.monotonic()
+        due = [when for when in self.restarts if when <= now]
+        if not due:
+            return
+        self.restarts = [when for when in self.restarts if when > now]
+        for _ in due:
+            worker = self.spawn(self.generation)
+            self.log(f'Restarted worker: {worker.pid}')
+
+    def reload(self):
+        if self.pending is not None:
+            self.log('Reload already in progress')
+            return
+        self.pending = self.generation + 1
+        self.pending_deadline = time.monotonic() + self.ready_timeout
+        self.log(f'SIGHUP: starting {self.processes} new workers')
+        self.spawn_generation(self.pending)
+
+    def check_reload(self):
+        if self.pending is None:
+            return
+        if self.generation_ready(self.pending):
+            old = [w for w in self.workers.values() if w.generation != self.pending]
+            self.generation, self.pending = self.pending, None
+            # Restarts still scheduled for the old generation are moot
+            self.restarts = []
+            self.stop_workers(old)
+            pids = ', '.join(str(w.pid) for w in self.workers.values()
+                             if w.generation == self.generation)
+            self.log(f'✓ Reloaded: new workers {pids}, draining {len(old)} old workers')
+        elif time.monotonic() > self.pending_deadline:
+            self.abort_reload(f'new workers not listening after {self.ready_timeout:.0f}s')
+
+    def abort_reload(self, reason):
+        self.stop_workers([w for w in self.workers.values() if w.generation == self.pending])
+        self.pending = None
+        self.log(f'✗ Reload failed ({reason}); keeping the current workers')
+
+    def generation_ready(self, generation):
+        workers = [w for w in self.workers.values() if w.generation == generation]
+        return len(workers) == self.processes and all(w.ready for w in workers)
+
+    def stop_workers(self, workers):
+        deadline = time.monotonic() + self.drain_timeout
+        for worker in workers:
+            if worker.stop_deadline is None:
+                worker.stop_deadline = deadline
+                self.send(worker, signal.SIGTERM)
+
+    def kill_overdue(self):
+        now = time.monotonic()
+        for worker in self.workers.values():
+            if worker.stop_deadline is not None and not worker.killed and now > worker.stop_deadline:
+                worker.killed = True
+                self.log(f'Worker {worker.pid} still running, killing it')
+                self.send(worker, signal.SIGKILL)
+
+    def send(self, worker, signum):
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def close_ready_fd(self, worker):
+        if worker.ready_fd is not None:
+            os.close(worker.ready_fd)
+            worker.ready_fd = None
+
+    def spawn_generation(self, generation):
+        for _ in range(self.processes):
+            self.spawn(generation)
+
+    def spawn(self, generation):
+        ready_r, ready_w = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                os.close(ready_r)
+                for worker in self.workers.values():
+                    if worker.ready_fd is not None:
+                        os.close(worker.ready_fd)
+                status = self.serve(ready_w)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+        os.close(ready_w)
+        worker = Worker(pid, generation, ready_r)
+        self.workers[pid] = worker
+        return worker
+
+    # Worker
+
+    def serve(self, ready_fd):
+        # Runs in the forked worker; returns its exit status
+        supervisor = os.getppid()
+        stopping = threading.Event()
+        server = None
+
+        def stop(*_):
+            # Also called from a signal handler: the loop is stopped from
+            # another thread, as shutdown() waits for serve_forever() to return
+            if not stopping.is_set():
+                stopping.set()
+                if server is not None:
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+
+        # Ctrl+C reaches the whole process group; the supervisor handles it
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, stop)
+
+        try:
+            server = self.make_server()
+        except OSError as e:
+            print(f'✗ Worker {os.getpid()}: cannot listen on port {self.port}: {e.strerror}',
+                  file=sys.stderr)
+            return 1
+        os.write(ready_fd, b'1')
+        os.close(ready_fd)
+
+        def watch_supervisor():
+            while not stopping.wait(PARENT_CHECK_INTERVAL):
+                if os.getppid() != supervisor:
+                    stop()
+
+        threading.Thread(target=watch_supervisor, name='supervisor-watch', daemon=True).start()
+        if stopping.is_set():
+            # SIGTERM arrived before the server existed
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        server.serve_forever()
+        server.drain()
+        server.server_close()
+        return 0
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+# Per-page critical resource map, for preload hints. For every page the
+# build works out what the browser would otherwise only discover after
+# parsing a large part of the document:
+#
+#   style   the local stylesheets of <head> (render-blocking, or preloaded
+#           by asset_bundle.py's critical CSS)
+#   font    the .woff2 fonts of the @font-face rules that the above-the-fold
+#           markup uses, by family and weight (at most --max-fonts)
+#   image   the hero image: the first image of the above-the-fold content
+#           outside the header, menus and popups (<img>, data-bg-src or an
+#           inline background-image), with its srcset
+#
+# The map is written to preload-map.json. CustomHTTPRequestHandler sends it
+# as Link: rel=preload headers with the page (and, with --early-hints, in a
+# 103 Early Hints response before it), and matching <link rel="preload">
+# tags are written at the top of each page's <head>.
+#
+# Incremental: a page is only analysed again when it, or one of the
+# stylesheets it was analysed with, changed (build manifest). Runs on the
+# deploy copy, after asset_fingerprint.py (hints carry the hashed names)
+# and before precompress.py:
+#
+#   python3 preload_hints.py --root dist
+import argparse
+import functools
+import html
+import html.parser
+import json
+import os
+import posixpath
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+from asset_bundle import (BODY_PATTERN, ELEMENT_PATTERN, NESTED_AT_RULES, SECTION_PATTERN,
+                          fold_tokens, parse_attrs, split_css_blocks)
+from build_manifest import MANIFEST_NAME, BuildManifest, combine_keys, digest_file, digest_text
+from site_pages import discover_pages, local_path, read_text, write_text
+
+PRELOAD_MAP = 'preload-map.json'
+SCOPE = 'preload_hints'
+MAP_VERSION = '1'
+DEFAULT_MAX_FONTS = 3
+
+BLOCK_START = '<!-- preload hints -->'
+BLOCK_END = '<!-- /preload hints -->'
+BLOCK_PATTERN = re.compile(r'[ \t]*' + re.escape(BLOCK_START) + r'.*?' + re.escape(BLOCK_END)
+                           + r'\n?', re.DOTALL)
+HEAD_PATTERN = re.compile(r'<head\b[^>]*>[ \t]*\n?', re.IGNORECASE)
+CHARSET_PATTERN = re.compile(r'<meta\s+charset\b[^>]*>[ \t]*\n?', re.IGNORECASE)
+
+FONT_FACE_PATTERN = re.compile(r'@font-face\s*$', re.IGNORECASE)
+DECLARATION_PATTERN = re.compile(r'''([\w-]+)\s*:\s*((?:"[^"]*"|'[^']*'|\([^)]*\)|[^;])*)''')
+VAR_PATTERN = re.compile(r'var\(\s*--[\w-]+\s*(?:,\s*(.*))?\)\s*$', re.DOTALL)
+WOFF2_SOURCE_PATTERN = re.compile(r'''url\(\s*(["']?)([^"')]*\.woff2(?:[?#][^"')]*)?)\1\s*\)''',
+                                  re.IGNORECASE)
+BACKGROUND_URL_PATTERN = re.compile(r'''background(?:-image)?\s*:[^;]*?url\(\s*(["']?)(.*?)\1\s*\)''',
+                                    re.IGNORECASE | re.DOTALL)
+FONT_WEIGHTS = {'normal': 400, 'bold': 700}
+
+# Subtrees that never hold the hero image
+SKIP_TAGS = {'header', 'nav', 'footer', 'template', 'noscript'}
+SKIP_CLASS_PATTERN = re.compile(r'menu|sidebar|sidemenu|popup|modal|cart|offcanvas|preloader|'
+                                r'search', re.IGNORECASE)
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'source', 'track', 'wbr'}
+
+
+# --- Analysis --------------------------------------------------------------
+
+def strip_hints(content):
+    return BLOCK_PATTERN.sub('', content, count=1)
+
+
+def resource_url(root, raw, base_dir=''):
+    # (file, URL relative to the site root) of a local reference, keeping
+    # its query string so the preload matches the later request; None for
+    # external URLs and missing files
+    rel = local_path(raw)
+    if rel is None:
+        return None
+    rel = posixpath.normpath(posixpath.join(base_dir, rel))
+    if not os.path.isfile(os.path.join(root, rel)):
+        return None
+    query = urllib.parse.urlparse(html.unescape(raw.strip())).query
+    return rel, urllib.parse.quote(rel) + (f'?{query}' if query else '')
+
+
+def head_styles(root, content):
+    # (file, URL) of the local stylesheets of <head>: <link rel=stylesheet>
+    # for all/screen media, and the rel=preload as=style links
+    # asset_bundle.py writes for bundles behind inlined critical CSS
+    styles = []
+    for match in ELEMENT_PATTERN.finditer(content):
+        if match.group('head_end'):
+            break
+        if not match.group('link'):
+            continue
+        attrs = parse_attrs(match.group('link_attrs'))
+        rels = attrs.get('rel', '').lower().split()
+        if not (('stylesheet' in rels and 'disabled' not in attrs
+                 and attrs.get('media', 'all').lower() in ('all', 'screen', ''))
+                or ('preload' in rels and attrs.get('as', '').lower() == 'style')):
+            continue
+        resource = resource_url(root, attrs.get('href', ''))
+        if resource is not None and resource not in styles:
+            styles.append(resource)
+    return styles
+
+
+def first_family(value):
+    # Primary family of a font-family value, through var() fallbacks
+    value = value.strip()
+    while True:
+        match = VAR_PATTERN.match(value)
+        if not match:
+            break
+        value = (match.group(1) or '').strip()
+    name = value.split(',')[0].strip().strip('"\'')
+    return name or None
+
+
+def font_weight(value):
+    value = value.strip().lower()
+    match = VAR_PATTERN.match(value)
+    if match:
+        value = (match.group(1) or '').strip()
+    if value in FONT_WEIGHTS:
+        return FONT_WEIGHTS[value]
+    return int(value) if value.isdigit() else None
+
+
+def css_rules(css):
+    # (prelude, declarations) of the rules of css, nested at-rules flattened
+    for prelude, body in split_css_blocks(css):
+        if body is None:
+            continue
+        if prelude.lower().startswith(NESTED_AT_RULES):
+            yield from css_rules(body)
+        else:
+            yield prelude, {name.lower(): value.strip()
+                            for name, value in DECLARATION_PATTERN.findall(body)}
+
+
+@functools.lru_cache(maxsize=None)
+def font_rules(root, rel):
+    # The @font-face rules of a stylesheet, as (family, lowest weight,
+    # highest weight, (file, URL) of the .woff2), and its selectors setting
+    # font-family or font-weight, as (selector, family, weight). Cached per
+    # process: every page of a pool worker shares the stylesheets.
+    faces, selectors = [], []
+    css_dir = posixpath.dirname(rel)
+    for prelude, decls in css_rules(read_text(os.path.join(root, rel))):
+        if FONT_FACE_PATTERN.match(prelude):
+            family = first_family(decls.get('font-family', ''))
+            source = WOFF2_SOURCE_PATTERN.search(decls.get('src', ''))
+            font = resource_url(root, source.group(2), css_dir) if source else None
+            if family and font is not None:
+                bounds = [font_weight(w) or 400 for w in decls.get('font-weight', '400').split()[:2]]
+                faces.append((family, min(bounds), max(bounds), font))
+            continue
+        family = first_family(decls['font-family']) if 'font-family' in decls else None
+        weight = font_weight(decls['font-weight']) if 'font-weight' in decls else None
+        if family or weight:
+            selectors.extend((selector.strip(), family, weight)
+                             for selector in prelude.split(','))
+    return faces, selectors
+
+
+def used_fonts(root, styles, tokens):
+    # (file, URL) of the .woff2 fonts of the @font-face rules whose family
+    # and weight are set by selectors matching the above-the-fold tokens, in
+    # stylesheet order
+    faces = []
+    families = {}
+    weights = {}
+    for rel in styles:
+        style_faces, selectors = font_rules(root, rel)
+        faces.extend(style_faces)
+        for selector, family, weight in selectors:
+            if not tokens.matches(selector):
+                continue
+            if family:
+                families.setdefault(selector, set()).add(family)
+            if weight:
+                weights.setdefault(selector, set()).add(weight)
+    # A family set without a weight by the same selector renders at 400
+    used = {(family, weight)
+            for selector, names in families.items()
+            for family in names
+            for weight in weights.get(selector, {400})}
+    fonts = []
+    for family, low, high, font in faces:
+        if font not in fonts and any(f == family and low <= w <= high for f, w in used):
+            fonts.append(font)
+    return fonts
+
+
+class HeroFinder(html.parser.HTMLParser):
+    # First image candidate of the markup outside skipped subtrees. A
+    # subtree skipped for its tag ends at the first closing tag of that name,
+    # whatever was left unclosed inside (pages nest unclosed <header>s).
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.skip_depth = None
+        self.skip_tag = None
+        self.found = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.found:
+            return
+        attrs = dict(attrs)
+        void = tag in VOID_TAGS
+        if self.skip_depth is None:
+            if tag in SKIP_TAGS or SKIP_CLASS_PATTERN.search(attrs.get('class') or ''):
+                if not void:
+                    self.skip_depth = len(self.stack)
+                    self.skip_tag = tag if tag in SKIP_TAGS else None
+            else:
+                self.found = self.candidate(tag, attrs)
+        if not void:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self.skip_tag is not None and tag == self.skip_tag:
+            del self.stack[self.skip_depth:]
+        elif tag in self.stack:
+            while self.stack.pop() != tag:
+                pass
+        else:
+            return
+        if self.skip_depth is not None and len(self.stack) <= self.skip_depth:
+            self.skip_depth = self.skip_tag = None
+
+    def candidate(self, tag, attrs):
+        if tag == 'img' and attrs.get('src') and attrs.get('loading') != 'lazy':
+            return {'url': attrs['src'], 'srcset': attrs.get('srcset'), 'sizes': attrs.get('sizes')}
+        if attrs.get('data-bg-src'):
+            return {'url': attrs['data-bg-src']}
+        background = BACKGROUND_URL_PATTERN.search(attrs.get('style') or '')
+        if background:
+            return {'url': background.group(2)}
+        return None
+
+
+def hero_image(root, content):
+    body = BODY_PATTERN.search(content)
+    start = body.end() if body else 0
+    sections = SECTION_PATTERN.finditer(content, start)
+    next(sections, None)
+    second = next(sections, None)
+    finder = HeroFinder()
+    finder.feed(content[start:second.start() if second else len(content)])
+    finder.close()
+    found = finder.found
+    if not found:
+        return None
+    resource = resource_url(root, found['url'])
+    if resource is None:
+        return None
+    hint = {'href': resource[1], 'as': 'image', 'fetchpriority': 'high'}
+    if found.get('srcset'):
+        hint['imagesrcset'] = found['srcset']
+        if found.get('sizes'):
+            hint['imagesizes'] = found['sizes']
+    return hint
+
+
+def analyze_page(root, content, max_fonts=DEFAULT_MAX_FONTS):
+    # Returns (hints, stylesheet files read) for a page without its hints
+    # block. Hint hrefs are URLs relative to the site root.
+    styles = head_styles(root, content)
+    hints = [{'href': url, 'as': 'style'} for _, url in styles]
+    rels = [rel for rel, _ in styles]
+    for _, url in used_fonts(root, rels, fold_tokens(content))[:max_fonts]:
+        hints.append({'href': url, 'as': 'font', 'type': 'font/woff2', 'crossorigin': ''})
+    hero = hero_image(root, content)
+    if hero is not None:
+        hints.append(hero)
+    return hints, rels
+
+
+# --- Output ----------------------------------------------------------------
+
+def hint_tag(hint):
+    attrs = [('rel', 'preload'), ('href', hint['href'])]
+    attrs += [(name, hint[name]) for name in ('as', 'type', 'crossorigin', 'imagesrcset',
+                                              'imagesizes', 'fetchpriority') if name in hint]
+    return '<link ' + ' '.join(name if value == '' else f'{name}="{html.escape(value)}"'
+                               for name, value in attrs) + '>'
+
+
+def link_header(hints):
+    # Link header value for a page's hints; URLs are absolute paths, since
+    # the page itself may be served from a clean URL
+    values = []
+    for hint in hints:
+        params = [f'</{hint["href"]}>', 'rel=preload', f'as={hint["as"]}']
+        if 'type' in hint:
+            params.append(f'type="{hint["type"]}"')
+        if 'crossorigin' in hint:
+            params.append('crossorigin')
+        if 'imagesrcset' in hint:
+            params.append(f'imagesrcset="{absolute_srcset(hint["imagesrcset"])}"')
+            if 'imagesizes' in hint:
+                params.append(f'imagesizes="{hint["imagesizes"]}"')
+        if 'fetchpriority' in hint:
+            params.append(f'fetchpriority={hint["fetchpriority"]}')
+        values.append('; '.join(params))
+    return ', '.join(values)
+
+
+def absolute_srcset(srcset):
+    candidates = []
+    for candidate in srcset.split(','):
+        url, _, descriptor = candidate.strip().partition(' ')
+        if local_path(url) is not None:
+            url = '/' + urllib.parse.quote(local_path(url))
+        candidates.append(f'{url} {descriptor.strip()}'.strip())
+    return ', '.join(candidates)
+
+
+def insert_hints(content, hints):
+    # Replaces the page's hints block. Stylesheets of <head> are left out of
+    # the tags: the parser reaches their own <link> a few lines further.
+    content = strip_hints(content)
+    tags = [hint_tag(hint) for hint in hints if hint['as'] != 'style']
+    if not tags:
+        return content
+    anchor = CHARSET_PATTERN.search(content) or HEAD_PATTERN.search(content)
+    if anchor is None:
+        return content
+    indent = '  '
+    block = ''.join(f'{indent}{line}\n' for line in [BLOCK_START, *tags, BLOCK_END])
+    return content[:anchor.end()] + block + content[anchor.end():]
+
+
+def process_page(root, page, max_fonts, dry_run=False):
+    path = os.path.join(root, page)
+    try:
+        original = read_text(path)
+        hints, styles = analyze_page(root, strip_hints(original), max_fonts)
+        content = insert_hints(original, hints)
+        changed = content != original
+        if changed and not dry_run:
+            write_text(path, content)
+    except (OSError, UnicodeDecodeError) as e:
+        return {'page': page, 'error': str(e)}
+    return {'page': page, 'hints': hints, 'styles': styles, 'changed': changed,
+            'digest': digest_text(content)}
+
+
+def _process_page_star(args):
+    return process_page(*args)
+
+
+def load_preload_map(root):
+    try:
+        with open(os.path.join(root, PRELOAD_MAP), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_preload_map(root, mapping):
+    path = os.path.join(root, PRELOAD_MAP)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(mapping, f, indent=1, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+    os.replace(tmp, path)
+
+
+class PreloadHints:
+    # Link header values of the preload map, for CustomHTTPRequestHandler.
+    # The map is reloaded when it changes, checked at most once per
+    # check_interval seconds.
+    def __init__(self, root, check_interval=1.0):
+        self.path = os.path.join(root, PRELOAD_MAP)
+        self.check_interval = check_interval
+        self._headers = {}
+        self._state = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, rel):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                self._reload()
+        return self._headers.get(rel)
+
+    def _reload(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._headers, self._state = {}, None
+            return
+        state = (st.st_mtime_ns, st.st_size)
+        if state != self._state:
+            self._state = state
+            mapping = load_preload_map(os.path.dirname(self.path))
+            self._headers = {page: link_header(hints) for page, hints in mapping.items() if hints}
+
+
+# --- CLI -------------------------------------------------------------------
+
+def page_key(root, record, max_fonts, digests):
+    # Input key of a page analysed before: the analysis version and options
+    # and the content of the stylesheets it read
+    parts = [MAP_VERSION, str(max_fonts)]
+    for rel in record.get('styles', []):
+        if rel not in digests:
+            path = os.path.join(root, rel)
+            digests[rel] = digest_file(path) if os.path.isfile(path) else 'missing'
+        parts.append(f'{rel}:{digests[rel]}')
+    return combine_keys(*parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute per-page preload hints')
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--max-fonts', type=int, default=DEFAULT_MAX_FONTS,
+                        help=f'fonts preloaded per page (default: {DEFAULT_MAX_FONTS})')
+    parser.add_argument('--force', action='store_true', help='analyse every page')
+    parser.add_argument('--dry-run', action='store_true', help='report without writing')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    manifest = BuildManifest.load(os.path.join(args.root, MANIFEST_NAME))
+    previous = load_preload_map(args.root)
+    pages = discover_pages(args.root)
+    digests = {}
+    dirty = {}
+    for page in pages:
+        record = manifest.get(SCOPE, page)
+        if args.force or record is None or page not in previous:
+            dirty[page] = 'forced' if args.force else 'new'
+            continue
+        reason = manifest.check(SCOPE, page, os.path.join(args.root, page),
+                                page_key(args.root, record, args.max_fonts, digests))
+        if reason is not None:
+            dirty[page] = reason
+
+    print(f'Preload hints: {len(dirty)} of {len(pages)} pages to analyse')
+    for page, reason in dirty.items():
+        print(f'  • {page} ({reason})')
+    print('=' * 50)
+    jobs = [(args.root, page, args.max_fonts, args.dry_run) for page in dirty]
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_process_page_star, jobs))
+    else:
+        results = [_process_page_star(job) for job in jobs]
+
+    mapping = {page: previous[page] for page in pages if page in previous and page not in dirty}
+    errors = 0
+    for result in results:
+        page = result['page']
+        if 'error' in result:
+            errors += 1
+            print(f'✗ {page}: {result["error"]}')
+            continue
+        mapping[page] = result['hints']
+        counts = {}
+        for hint in result['hints']:
+            counts[hint['as']] = counts.get(hint['as'], 0) + 1
+        summary = ', '.join(f'{count} {kind}' for kind, count in counts.items()) or 'no hints'
+        hero = next((h['href'] for h in result['hints'] if h['as'] == 'image'), None)
+        status = '✓' if result['changed'] else '·'
+        print(f'{status} {page}: {summary}' + (f' (hero: {hero})' if hero else ''))
+        if not args.dry_run:
+            record = {'styles': result['styles']}
+            manifest.record(SCOPE, page, os.path.join(args.root, page),
+                            page_key(args.root, record, args.max_fonts, digests),
+                            digest=result['digest'], styles=result['styles'])
+
+    if not args.dry_run:
+        manifest.prune(SCOPE, set(pages))
+        manifest.save()
+        if mapping != previous:
+            save_preload_map(args.root, mapping)
+    print(f'{len(results) - errors} pages analysed, {len(pages) - len(dirty)} unchanged '
+          f'in {time.perf_counter() - started:.2f}s')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# Per-route request metrics for CustomHTTPRequestHandler: request counts by
+# status code, body bytes sent and a latency histogram for every route,
+# served on /__metrics in the Prometheus text format (or as JSON with
+# ?format=json) together with the file cache hit ratio.
+#
+# Routes are the normalized clean URLs, so /spectacles and /spectacles.html
+# are one route, and fingerprinted assets are counted under their original
+# name. Requests that matched no file are counted under one route, and the
+# number of routes is capped so stray URLs cannot grow the table without
+# bound. Recording is a bisect and a few increments under one lock;
+# bench-metrics.py measures the overhead.
+import bisect
+import functools
+import json
+import threading
+import time
+
+from asset_fingerprint import original_name
+
+METRICS_PATH = '/__metrics'
+UNMATCHED_ROUTE = '(unmatched)'
+OVERFLOW_ROUTE = '(other)'
+DEFAULT_MAX_ROUTES = 2000
+
+# Upper bounds of the latency buckets in seconds; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+JSON_CONTENT_TYPE = 'application/json'
+
+
+@functools.lru_cache(maxsize=4096)
+def route_label(rel, is_dir=False):
+    # Root-relative file path -> clean URL: about.html -> /about,
+    # index.html -> /, assets/js/main.3f9a1c2b7d.js -> /assets/js/main.js
+    rel = rel.strip('/')
+    if is_dir:
+        return '/' + rel + '/' if rel else '/'
+    rel = original_name(rel)
+    if rel.endswith('.html'):
+        rel = rel[:-len('.html')]
+        if rel == 'index' or rel.endswith('/index'):
+            rel = rel[:-len('index')]
+    return '/' + rel
+
+
+class RouteStats:
+    __slots__ = ('requests', 'bytes', 'seconds', 'statuses', 'buckets')
+
+    def __init__(self, bucket_count):
+        self.requests = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        # status code -> requests
+        self.statuses = {}
+        # requests per bucket (not cumulative)
+        self.buckets = [0] * bucket_count
+
+    def copy(self):
+        stats = RouteStats(0)
+        stats.requests, stats.bytes, stats.seconds = self.requests, self.bytes, self.seconds
+        stats.statuses = dict(self.statuses)
+        stats.buckets = list(self.buckets)
+        return stats
+
+
+class RequestMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_routes=DEFAULT_MAX_ROUTES):
+        self.bounds = tuple(sorted(buckets))
+        self.max_routes = max_routes
+        self.started_at = time.time()
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, status, nbytes, seconds):
+        # route is a route_label() or None for requests that matched nothing
+        index = bisect.bisect_left(self.bounds, seconds)
+        if route is None:
+            route = UNMATCHED_ROUTE
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                if len(self._routes) >= self.max_routes:
+                    route = OVERFLOW_ROUTE
+                stats = self._routes.get(route)
+                if stats is None:
+                    stats = self._routes[route] = RouteStats(len(self.bounds) + 1)
+            stats.requests += 1
+            stats.bytes += nbytes
+            stats.seconds += seconds
+            stats.buckets[index] += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {route: stats.copy() for route, stats in self._routes.items()}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self.started_at = time.time()
+
+    def quantile(self, stats, q):
+        # Estimated from the histogram by linear interpolation inside the
+        # bucket holding the q-th request, as Prometheus' histogram_quantile
+        if not stats.requests:
+            return 0.0
+        rank = q * stats.requests
+        seen = 0
+        lower = 0.0
+        for count, upper in zip(stats.buckets, self.bounds + (None,)):
+            if count and seen + count >= rank:
+                if upper is None:
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            if upper is not None:
+                lower = upper
+        return lower
+
+    def to_json(self, cache_stats=None):
+        routes = self.snapshot()
+        out = {
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+            'requests': sum(stats.requests for stats in routes.values()),
+            'bytes': sum(stats.bytes for stats in routes.values()),
+            'routes': {},
+        }
+        if cache_stats is not None:
+            out['cache'] = dict(cache_stats, hit_ratio=cache_hit_ratio(cache_stats))
+        for route in sorted(routes):
+            stats = routes[route]
+            cumulative = 0
+            buckets = {}
+            for count, upper in zip(stats.buckets, self.bounds + (None,)):
+                cumulative += count
+                buckets['+Inf' if upper is None else format_bound(upper)] = cumulative
+            out['routes'][route] = {
+                'requests': stats.requests,
+                'bytes': stats.bytes,
+                'status': {str(code): n for code, n in sorted(stats.statuses.items())},
+                'latency': {
+                    'sum_seconds': round(stats.seconds, 6),
+                    'mean_ms': round(stats.seconds / stats.requests * 1000, 3),
+                    'p50_ms': round(self.quantile(stats, 0.5) * 1000, 3),
+                    'p90_ms': round(self.quantile(stats, 0.9) * 1000, 3),
+                    'p99_ms': round(self.quantile(stats, 0.99) * 1000, 3),
+                    'buckets': buckets,
+                },
+            }
+        return json.dumps(out, indent=1) + '\n'
+
+    def to_prometheus(self, cache_stats=None):
+        routes = self.snapshot()
+        lines = [
+            '# HELP http_requests_total Requests handled, by route and status code.',
+            '# TYPE http_requests_total counter',
+        ]
+        for route in sorted(routes):
+            label = escape_label(route)
+            for code, n in sorted(routes[route].statuses.items()):
+                lines.append(f'http_requests_total{{route="{label}",code="{code}"}} {n}')
+        lines += [
+            '# HELP http_response_bytes_total Response body bytes sent, by route.',
+            '# TYPE http_response_bytes_total counter',
+        ]
+        for route in sorted(routes):
+            lines.append(f'http_response_bytes_total{{route="{escape_label(route)}"}} '
+                         f'{routes[route].bytes}')
+        lines += [
+            '# HELP http_request_duration_seconds Time from request line to last body byte.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for route in sorted(routes):
+            stats = routes[route]
+            label = escape_label(route)
+            cumulative = 0
+            for count, upper in zip(stats.buckets, self.bounds + (None,)):
+                cumulative += count
+                le = '+Inf' if upper is None else format_bound(upper)
+                lines.append(f'http_request_duration_seconds_bucket{{route="{label}",le="{le}"}} '
+                             f'{cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{route="{label}"}} {stats.seconds!r}')
+            lines.append(f'http_request_duration_seconds_count{{route="{label}"}} '
+                         f'{stats.requests}')
+        if cache_stats is not None:
+            lines += [
+                '# HELP http_file_cache_hits_total In-memory file cache hits.',
+                '# TYPE http_file_cache_hits_total counter',
+                f'http_file_cache_hits_total {cache_stats["hits"]}',
+                '# HELP http_file_cache_misses_total In-memory file cache misses.',
+                '# TYPE http_file_cache_misses_total counter',
+                f'http_file_cache_misses_total {cache_stats["misses"]}',
+                '# HELP http_file_cache_hit_ratio Hits over lookups since start.',
+                '# TYPE http_file_cache_hit_ratio gauge',
+                f'http_file_cache_hit_ratio {cache_hit_ratio(cache_stats)!r}',
+                '# HELP http_file_cache_entries Files held in the cache.',
+                '# TYPE http_file_cache_entries gauge',
+                f'http_file_cache_entries {cache_stats["entries"]}',
+                '# HELP http_file_cache_bytes Bytes held in the cache, variants included.',
+                '# TYPE http_file_cache_bytes gauge',
+                f'http_file_cache_bytes {cache_stats["bytes"]}',
+            ]
+        lines += [
+            '# HELP http_server_start_time_seconds Unix time the metrics were started or reset.',
+            '# TYPE http_server_start_time_seconds gauge',
+            f'http_server_start_time_seconds {self.started_at!r}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def cache_hit_ratio(cache_stats):
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    return cache_stats['hits'] / lookups if lookups else 0.0
+
+
+def format_bound(value):
+    return repr(float(value))
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def wants_json(query, accept):
+    # /__metrics?format=json, or a client asking for JSON only
+    if 'format=json' in query.split('&'):
+        return True
+    return bool(accept) and 'application/json' in accept and 'text/plain' not in accept
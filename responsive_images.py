@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# Responsive image derivatives. Every JPEG/PNG under the image directories
+# is resized to several widths and saved as WebP in assets/responsive/, in
+# parallel across cores. Derivative names carry the source's content hash
+# and the WebP quality, and the build manifest skips sources that have not
+# changed. The <img> tags of the pages are then given srcset/sizes
+# attributes pointing at the derivatives (the original stays as the src
+# fallback).
+#
+# Requires Pillow (pip install Pillow). Meant to run on the deploy copy of
+# the site, e.g.:
+#
+#   python3 responsive_images.py --root dist
+#   python3 responsive_images.py --root dist --widths 400,800,1200 --sizes "(max-width: 991px) 100vw, 50vw"
+import argparse
+import hashlib
+import html
+import os
+import re
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+from build_manifest import MANIFEST_NAME, BuildManifest, combine_keys
+from page_rewrite import Transform, rewrite_pages
+from site_pages import discover_pages, local_path
+
+IMAGE_DIRS = ['assets/img', 'assets/edjs img']
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+OUTPUT_DIR = 'assets/responsive'
+DEFAULT_WIDTHS = [480, 768, 1024, 1600]
+DEFAULT_QUALITY = 80
+DEFAULT_SIZES = '100vw'
+SCOPE = 'responsive_images'
+
+IMG_TAG_PATTERN = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+SRC_ATTR_PATTERN = re.compile(r'''\ssrc\s*=\s*(["'])(.*?)\1''', re.IGNORECASE | re.DOTALL)
+SRCSET_ATTR_PATTERN = re.compile(r'\ssrcset\s*=', re.IGNORECASE)
+# The srcset/sizes pair added by an earlier run, replaced by the current one
+GENERATED_SRCSET_PATTERN = re.compile(rf' srcset="{re.escape(OUTPUT_DIR)}/[^"]*" sizes="[^"]*"')
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'image'
+
+
+def find_images(root, dirs):
+    images = []
+    for image_dir in dirs:
+        base = os.path.join(root, image_dir)
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    images.append(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/'))
+    return images
+
+
+def build_derivatives(root, rel, widths, quality):
+    # Returns a dict describing the source and its derivatives, or with an
+    # 'error' key when the image cannot be processed
+    path = os.path.join(root, rel)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        stem = f'{slugify(os.path.splitext(os.path.basename(rel))[0])}-{digest[:10]}'
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if img.mode in ('LA', 'PA') or 'transparency' in img.info else 'RGB')
+            width, height = img.size
+            derivatives = []
+            for target in sorted(set(widths)):
+                if target >= width:
+                    continue
+                # The quality is part of the name: derivatives encoded at
+                # another quality are never taken for up to date
+                out_rel = f'{OUTPUT_DIR}/{stem}-{target}w-q{quality}.webp'
+                out_path = os.path.join(root, out_rel)
+                if not os.path.exists(out_path):
+                    resized = img.resize((target, max(1, round(height * target / width))),
+                                         Image.Resampling.LANCZOS)
+                    tmp = out_path + '.tmp'
+                    resized.save(tmp, 'WEBP', quality=quality, method=6)
+                    os.replace(tmp, out_path)
+                derivatives.append([target, out_rel, os.path.getsize(out_path)])
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return {'source': rel, 'error': str(e)}
+    return {'source': rel, 'digest': digest, 'width': width, 'height': height,
+            'bytes': len(data), 'derivatives': derivatives}
+
+
+def _build_derivatives_star(args):
+    return build_derivatives(*args)
+
+
+def derivatives_missing(root, record):
+    return any(not os.path.exists(os.path.join(root, rel)) for _, rel, _ in record.get('derivatives', []))
+
+
+def prune_derivatives(root, keep):
+    # Removes the files of OUTPUT_DIR that are no derivative in keep:
+    # those of edited sources or of another quality or width
+    removed = []
+    out_dir = os.path.join(root, OUTPUT_DIR)
+    try:
+        names = os.listdir(out_dir)
+    except OSError:
+        return removed
+    for name in sorted(names):
+        rel = f'{OUTPUT_DIR}/{name}'
+        base = rel[:-3] if rel.endswith(('.gz', '.br')) else rel
+        if base not in keep and os.path.isfile(os.path.join(out_dir, name)):
+            os.remove(os.path.join(out_dir, name))
+            removed.append(rel)
+    return removed
+
+
+def build_srcset(source, record):
+    entries = [f'{urllib.parse.quote(rel)} {w}w' for w, rel, _ in record['derivatives']]
+    entries.append(f'{urllib.parse.quote(source)} {record["width"]}w')
+    return ', '.join(entries)
+
+
+class SrcsetRewrite(Transform):
+    name = 'srcset'
+    label = 'responsive images'
+
+    def __init__(self, records, sizes=DEFAULT_SIZES, exclude=None):
+        super().__init__(exclude)
+        # source path -> manifest record, for sources with derivatives
+        self.records = {src: r for src, r in records.items() if r.get('derivatives')}
+        self.sizes = sizes
+
+    def apply(self, content):
+        return IMG_TAG_PATTERN.sub(self._rewrite_tag, content), True
+
+    def _rewrite_tag(self, match):
+        original = match.group(0)
+        tag = GENERATED_SRCSET_PATTERN.sub('', original)
+        if SRCSET_ATTR_PATTERN.search(tag):
+            return original
+        src = SRC_ATTR_PATTERN.search(tag)
+        if src is None:
+            return original
+        source = local_path(src.group(2))
+        record = self.records.get(source)
+        if record is None:
+            return original
+        attrs = f' srcset="{build_srcset(source, record)}" sizes="{html.escape(self.sizes)}"'
+        return tag[:src.end()] + attrs + tag[src.end():]
+
+    def signature(self):
+        return combine_keys(super().signature(), self.sizes,
+                            *(f'{s}:{build_srcset(s, r)}' for s, r in sorted(self.records.items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate WebP derivatives and add srcset to pages')
+    parser.add_argument('--root', required=True, help='deploy copy of the site, e.g. dist')
+    parser.add_argument('--dirs', nargs='+', default=IMAGE_DIRS, help='image directories')
+    parser.add_argument('--widths', default=','.join(map(str, DEFAULT_WIDTHS)),
+                        help='derivative widths in pixels (default: %(default)s)')
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help='WebP quality')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='sizes attribute (default: 100vw)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--rewrite-only', action='store_true',
+                        help='only rewrite pages from existing derivatives')
+    parser.add_argument('--dry-run', action='store_true', help='report page changes without writing')
+    args = parser.parse_args(argv)
+
+    widths = sorted({int(w) for w in args.widths.split(',') if w.strip()})
+    manifest = BuildManifest.load(os.path.join(args.root, MANIFEST_NAME))
+    key = combine_keys('webp', *map(str, widths), str(args.quality))
+    images = find_images(args.root, args.dirs)
+    started = time.perf_counter()
+
+    print(f'Responsive images: {len(images)} sources, widths {", ".join(map(str, widths))}')
+    print('=' * 50)
+    if not args.rewrite_only:
+        if Image is None:
+            print('✗ Pillow is not installed (pip install Pillow), use --rewrite-only '
+                  'to apply existing derivatives')
+            return 2
+        os.makedirs(os.path.join(args.root, OUTPUT_DIR), exist_ok=True)
+        dirty = [rel for rel in images
+                 if manifest.check(SCOPE, rel, os.path.join(args.root, rel), key) is not None
+                 or derivatives_missing(args.root, manifest.get(SCOPE, rel))]
+        jobs = [(args.root, rel, widths, args.quality) for rel in dirty]
+        workers = args.workers or os.cpu_count() or 1
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                results = list(pool.map(_build_derivatives_star, jobs))
+        else:
+            results = [_build_derivatives_star(job) for job in jobs]
+
+        saved = 0
+        for result in results:
+            rel = result['source']
+            if 'error' in result:
+                print(f'✗ {rel}: {result["error"]}')
+                # Remembered so an unreadable source is retried only once edited
+                if os.path.exists(os.path.join(args.root, rel)):
+                    manifest.record(SCOPE, rel, os.path.join(args.root, rel), key,
+                                    error=result['error'], derivatives=[])
+                continue
+            manifest.record(SCOPE, rel, os.path.join(args.root, rel), key,
+                            digest=result['digest'], width=result['width'],
+                            height=result['height'], derivatives=result['derivatives'])
+            sizes = ', '.join(f'{w}w {size // 1024} KB' for w, _, size in result['derivatives'])
+            print(f'✓ {rel} ({result["bytes"] // 1024} KB): {sizes or "no smaller widths"}')
+            if result['derivatives']:
+                saved += result['bytes'] - result['derivatives'][0][2]
+        print(f'{len(results)} sources processed, {len(images) - len(dirty)} unchanged; '
+              f'smallest derivative saves {saved // 1024:,} KB on narrow screens')
+        manifest.prune(SCOPE, set(images))
+        keep = {rel for record in manifest.section(SCOPE).values()
+                for _, rel, _ in record.get('derivatives', [])}
+        for rel in prune_derivatives(args.root, keep):
+            print(f'  removed {rel}')
+        manifest.save()
+        print()
+
+    records = {rel: manifest.get(SCOPE, rel) for rel in images if manifest.get(SCOPE, rel)}
+    transform = SrcsetRewrite(records, sizes=args.sizes)
+    pages = discover_pages(args.root)
+    page_results = rewrite_pages(args.root, pages, [transform], workers=args.workers,
+                                 dry_run=args.dry_run)
+    changed = [r.page for r in page_results if r.changed]
+    verb = 'would be rewritten' if args.dry_run else 'rewritten'
+    for page in changed:
+        print(f'  ✓ srcset added in {page}')
+    print(f'{len(changed)} pages {verb} in {time.perf_counter() - started:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# Clean-URL route index for CustomHTTPRequestHandler.
+#
+# The document root is scanned once at startup into a dict of URL path ->
+# file, including the extension-less aliases of every .html page
+# (/spectacles -> spectacles.html). Lookups are dict hits, so unknown paths
+# are answered 404 without touching the filesystem. A watcher thread polls
+# directory mtimes and rescans only directories whose entries changed.
+import os
+import threading
+
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__'}
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+def _is_hidden(name):
+    return name.startswith('.')
+
+
+class RouteIndex:
+    def __init__(self, root, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.poll_interval = poll_interval
+        self.files = {}
+        self.dirs = set()
+        # reldir -> (mtime_ns, file names, subdirectory names)
+        self._listing = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.refresh()
+
+    def resolve(self, url_path):
+        # url_path is the unquoted request path. Returns (relpath, is_dir)
+        # or None when nothing in the document root matches.
+        if url_path in ('', '/'):
+            url_path = '/index.html'
+        rel = self.files.get(url_path)
+        if rel is not None:
+            return rel, False
+        dir_path = url_path.rstrip('/')
+        if dir_path in self.dirs:
+            return dir_path.lstrip('/') + ('/' if url_path.endswith('/') else ''), True
+        return None
+
+    def __len__(self):
+        return len(self.files)
+
+    def refresh(self):
+        # Rescans the directories whose mtime changed since the last call
+        with self._lock:
+            changed = self._check_dir('')
+        return changed
+
+    def start(self):
+        if self._watcher is None and self.poll_interval > 0:
+            self._watcher = threading.Thread(target=self._watch, name='route-index-watcher',
+                                             daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except OSError:
+                pass
+
+    def _check_dir(self, reldir):
+        path = os.path.join(self.root, reldir) if reldir else self.root
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self._drop_dir(reldir)
+            return 1
+        changed = 0
+        previous = self._listing.get(reldir)
+        if previous is None or previous[0] != mtime_ns:
+            changed += 1
+            self._scan_dir(reldir, path, mtime_ns, previous)
+        for name in self._listing[reldir][2]:
+            changed += self._check_dir(f'{reldir}/{name}' if reldir else name)
+        return changed
+
+    def _scan_dir(self, reldir, path, mtime_ns, previous):
+        files, subdirs = set(), set()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if _is_hidden(entry.name):
+                        continue
+                    if entry.is_dir(follow_symlinks=True):
+                        if entry.name not in SKIP_DIRS:
+                            subdirs.add(entry.name)
+                    elif entry.is_file(follow_symlinks=True):
+                        files.add(entry.name)
+        except OSError:
+            self._drop_dir(reldir)
+            return
+
+        old_files, old_subdirs = (previous[1], previous[2]) if previous else (set(), set())
+        for name in old_files - files:
+            self._remove_file(f'{reldir}/{name}' if reldir else name)
+        for name in files - old_files:
+            self._add_file(f'{reldir}/{name}' if reldir else name)
+        for name in old_subdirs - subdirs:
+            self._drop_dir(f'{reldir}/{name}' if reldir else name)
+        if reldir:
+            self.dirs.add('/' + reldir)
+        self._listing[reldir] = (mtime_ns, files, subdirs)
+
+    def _drop_dir(self, reldir):
+        listing = self._listing.pop(reldir, None)
+        if listing is None:
+            return
+        for name in listing[1]:
+            self._remove_file(f'{reldir}/{name}' if reldir else name)
+        for name in listing[2]:
+            self._drop_dir(f'{reldir}/{name}' if reldir else name)
+        self.dirs.discard('/' + reldir)
+
+    def _add_file(self, rel):
+        self.files['/' + rel] = rel
+        if rel.endswith('.html'):
+            # An exact file of the same name keeps priority over the alias
+            self.files.setdefault('/' + rel[:-5], rel)
+
+    def _remove_file(self, rel):
+        self.files.pop('/' + rel, None)
+        if rel.endswith('.html') and self.files.get('/' + rel[:-5]) == rel:
+            del self.files['/' + rel[:-5]]
+        # A clean alias shadowed by this (extension-less) file comes back
+        if os.path.exists(os.path.join(self.root, rel + '.html')):
+            self.files.setdefault('/' + rel, rel + '.html')
@@ -1,48 +1,43 @@
 #!/usr/bin/env python3
-import http.server
-import socketserver
+import argparse
 import os
-import urllib.parse
-from pathlib import Path
+import sys
 
-class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        # Parse the URL
-        parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
-        
-        # Remove leading slash
-        if path.startswith('/'):
-            path = path[1:]
-        
-        # If path is empty, serve index.html
-        if not path or path == '/':
-            path = 'index.html'
-        else:
-            # If path doesn't have .html extension, try adding .html
-            if not path.endswith('.html'):
-                html_path = path + '.html'
-                if os.path.exists(html_path):
-                    path = html_path
-        
-        # Update the path for the parent class
-        self.path = '/' + path
-        
-        # Call the parent class method
-        super().do_GET()
+from custom_server import add_server_arguments, server_from_args, supervisor_from_args
+from site_archive import ArchiveError, SiteArchive
 
-PORT = 8080
-Handler = CustomHTTPRequestHandler
+parser = argparse.ArgumentParser(description='Static site server with clean URLs')
+add_server_arguments(parser, default_port=8080)
+args = parser.parse_args()
+PORT = args.port
+
+if args.archive:
+    # Checked here, before any worker process tries to map it
+    try:
+        archive = SiteArchive(args.archive)
+    except ArchiveError as e:
+        print(f"✗ Cannot serve the site archive: {e}")
+        sys.exit(1)
+    print(f"Site archive: {args.archive} ({archive.files} files, packed {archive.created})")
+    del archive
+
+if args.processes != 1:
+    supervisor = supervisor_from_args(args)
+    print(f"Serving at http://localhost:{PORT}")
+    threads = 'single-threaded' if args.single_threaded else f'{args.workers} workers each'
+    print(f"Pre-fork mode: {supervisor.processes} processes, {threads} "
+          f"(kill -HUP {os.getpid()} reloads gracefully)")
+    sys.exit(supervisor.run())
 
-# Kill any existing server on port 8080
 try:
-    import subprocess
-    subprocess.run(['lsof', '-ti:8080'], capture_output=True, text=True, check=True)
-    subprocess.run(['kill', '-9'] + subprocess.run(['lsof', '-ti:8080'], capture_output=True, text=True).stdout.strip().split('\n'), check=True)
-except:
-    pass
+    httpd = server_from_args(args)
+except OSError as e:
+    print(f"✗ Cannot listen on port {PORT}: {e.strerror} (is another server running?)")
+    sys.exit(1)
 
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
+with httpd:
     print(f"Serving at http://localhost:{PORT}")
     print("Clean URLs enabled - you can access pages without .html extension")
+    if not args.single_threaded:
+        print(f"Concurrent mode: {args.workers} workers, backlog {args.backlog}")
     httpd.serve_forever()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# Packed site archive. The built site is written into one file: a fixed
+# header, the body of every file (identical files stored once) with its
+# precompressed gzip/brotli variants, and an index of URL path -> offset,
+# length, ETag, content type, Cache-Control and preload Link header.
+#
+# With --archive, CustomHTTPRequestHandler mmaps the archive and answers
+# requests from the mapped region: a route lookup in the index and a
+# write of a memoryview, without path resolution, open or stat per
+# request, and without scanning the tree at startup. A new archive is
+# deployed by replacing the file (pack writes a temporary file and renames
+# it over the old one); the server checks the file at most once per second
+# and switches to the new mapping, while requests in flight finish on the
+# old one. Every request is answered from a single consistent deploy.
+#
+# Runs on the deploy copy, last (after asset_fingerprint.py,
+# preload_hints.py and precompress.py, whose .gz/.br siblings are reused):
+#
+#   python3 site_archive.py pack --root dist --output site.pack
+#   python3 site_archive.py list site.pack
+#   python3 server.py --archive site.pack
+import argparse
+import datetime
+import email.utils
+import fnmatch
+import hashlib
+import http.server
+import json
+import mimetypes
+import mmap
+import os
+import posixpath
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import precompress
+from asset_fingerprint import ASSET_MANIFEST, CACHE_CONTROL, load_asset_manifest
+from preload_hints import PRELOAD_MAP, link_header, load_preload_map
+
+ARCHIVE_NAME = 'site.pack'
+MAGIC = b'SITEPACK'
+FORMAT_VERSION = 1
+# magic, format version, index offset, index length
+HEADER = struct.Struct('<8sIQQ')
+DEFAULT_CHECK_INTERVAL = 1.0
+
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__'}
+# Build tooling and sources that are not part of the site (PHP included:
+# the archive can only serve it as source, never run it), and the build
+# outputs that only the packer reads
+DEFAULT_EXCLUDE = ('*.py', '*.pyc', '*.sh', '*.md', '*.php', '*.jsonl', '*.tmp', '*.pack',
+                   ASSET_MANIFEST, PRELOAD_MAP)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def guess_type(rel):
+    # Same answer as SimpleHTTPRequestHandler.guess_type for the file
+    extensions_map = http.server.SimpleHTTPRequestHandler.extensions_map
+    ext = posixpath.splitext(rel)[1]
+    for key in (ext, ext.lower()):
+        if key in extensions_map:
+            return extensions_map[key]
+    return mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+
+
+def content_etag(body):
+    # Same ETag as static_cache.CacheEntry, so clients keep their cached
+    # copies when a server switches between the tree and the archive
+    return '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+# --- Packing -----------------------------------------------------------------
+
+def iter_site_files(root, exclude, output):
+    # Yields the paths, relative to root, of the files to pack
+    skip = {os.path.abspath(output), os.path.abspath(output) + '.tmp'}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, '/')
+            if name.startswith('.') or os.path.abspath(path) in skip:
+                continue
+            if any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel, pattern)
+                   for pattern in exclude):
+                continue
+            stem, suffix = os.path.splitext(path)
+            if suffix in ('.gz', '.br') and os.path.isfile(stem):
+                # Precompressed sibling: packed as a variant of its source
+                continue
+            yield rel
+
+
+def encode_variants(path):
+    # Returns {token: encoded bytes} for a compressible file: the
+    # precompressed sibling when it is up to date, otherwise compressed here
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < precompress.MIN_SIZE:
+        return {}
+    mtime_ns = os.stat(path).st_mtime_ns
+    variants = {}
+    for token, suffix, _, _, _ in precompress.ENCODINGS:
+        sibling = path + suffix
+        try:
+            if os.stat(sibling).st_mtime_ns >= mtime_ns:
+                with open(sibling, 'rb') as f:
+                    variants[token] = f.read()
+                continue
+        except OSError:
+            pass
+        encoded = precompress.compress_bytes(data, token, build=True)
+        if len(encoded) < len(data):
+            variants[token] = encoded
+    return variants
+
+
+class ArchiveWriter:
+    # Appends bodies to the archive file, storing identical bytes once
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.unique_bytes = 0
+
+    def add(self, data):
+        # Returns (offset, length) of data in the archive
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        span = self.offsets.get(digest)
+        if span is None:
+            span = (self.f.tell(), len(data))
+            self.f.write(data)
+            self.offsets[digest] = span
+            self.unique_bytes += len(data)
+        return span
+
+
+def pack(root, output, exclude=DEFAULT_EXCLUDE, variants=True, workers=None):
+    # Writes the archive of root to output atomically. Returns the index.
+    files = list(iter_site_files(root, exclude, output))
+    immutable = set(load_asset_manifest(root).values())
+    links = {page: link_header(hints) for page, hints in load_preload_map(root).items() if hints}
+
+    compressible = [rel for rel in files if variants and precompress.is_compressible(rel)]
+    workers = workers or os.cpu_count() or 1
+    encoded = {}
+    if compressible:
+        paths = [os.path.join(root, rel) for rel in compressible]
+        if workers <= 1 or len(paths) <= 1:
+            encoded = dict(zip(compressible, map(encode_variants, paths)))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+                encoded = dict(zip(compressible, pool.map(encode_variants, paths, chunksize=8)))
+
+    entries = {}
+    tmp = output + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        writer = ArchiveWriter(f)
+        for rel in files:
+            path = os.path.join(root, rel)
+            with open(path, 'rb') as src:
+                data = src.read()
+                mtime_ns = os.fstat(src.fileno()).st_mtime_ns
+            offset, length = writer.add(data)
+            entry = {
+                'offset': offset,
+                'length': length,
+                'etag': content_etag(data),
+                'type': guess_type(rel),
+                'mtime': mtime_ns // 1_000_000_000,
+            }
+            file_variants = {token: list(writer.add(body))
+                             for token, body in encoded.get(rel, {}).items()}
+            if file_variants:
+                entry['variants'] = file_variants
+            if rel in immutable:
+                entry['cache'] = CACHE_CONTROL
+            if rel in links:
+                entry['link'] = links[rel]
+            entries[rel] = entry
+
+        index = {
+            'version': FORMAT_VERSION,
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'files': entries,
+        }
+        index_bytes = json.dumps(index, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        index_offset = f.tell()
+        f.write(index_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, index_offset, len(index_bytes)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, output)
+    index['unique_bytes'] = writer.unique_bytes
+    index['index_bytes'] = len(index_bytes)
+    return index
+
+
+# --- Serving -------------------------------------------------------------------
+
+def open_archive(path):
+    # Returns (mapping, index) of an archive; raises ArchiveError
+    try:
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise ArchiveError(f'{path}: {e}') from e
+    try:
+        magic, version, index_offset, index_length = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ArchiveError(f'{path}: not a site archive (version {FORMAT_VERSION})')
+        if index_offset + index_length > len(mapping):
+            raise ArchiveError(f'{path}: truncated archive')
+        index = json.loads(mapping[index_offset:index_offset + index_length])
+    except (struct.error, ValueError) as e:
+        mapping.close()
+        raise ArchiveError(f'{path}: corrupt index: {e}') from e
+    except ArchiveError:
+        mapping.close()
+        raise
+    if hasattr(mmap, 'MADV_WILLNEED'):
+        # Start reading the archive into the page cache before the first requests
+        mapping.madvise(mmap.MADV_WILLNEED)
+    return mapping, index
+
+
+class ArchiveEntry:
+    # A file of the archive, with the attributes CustomHTTPRequestHandler's
+    # send_entry() reads from static_cache.CacheEntry. Bodies are
+    # memoryviews of the mapping; they keep it alive after a swap until the
+    # requests using them are done.
+    __slots__ = ('rel', 'body', 'etag', 'last_modified', 'mtime', 'content_type',
+                 'compressible', 'variants', 'cache_control', 'link')
+
+    def __init__(self, rel, record, view):
+        self.rel = rel
+        self.body = view[record['offset']:record['offset'] + record['length']]
+        self.etag = record['etag']
+        self.mtime = record['mtime']
+        self.last_modified = email.utils.formatdate(self.mtime, usegmt=True)
+        self.content_type = record['type']
+        self.compressible = precompress.is_compressible(rel)
+        self.variants = {token: view[offset:offset + length]
+                         for token, (offset, length) in record.get('variants', {}).items()}
+        self.cache_control = record.get('cache')
+        self.link = record.get('link')
+
+    def variant_etag(self, token):
+        return self.etag[:-1] + '-' + token + '"'
+
+
+class SiteArchive:
+    # Routes and entries of the mapped archive, for CustomHTTPRequestHandler.
+    # The archive file is checked at most once per check_interval seconds
+    # and remapped when it was replaced.
+    def __init__(self, path, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+        self.created = None
+        self.files = 0
+        self._routes = {}
+        self._state = None
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+        try:
+            st = os.stat(self.path)
+        except OSError as e:
+            raise ArchiveError(f'{path}: {e.strerror}') from e
+        self._load(st)
+
+    def resolve(self, url_path):
+        # url_path is the unquoted request path. Returns the ArchiveEntry of
+        # the file it maps to with the server's clean-URL rules, or None.
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                self._reload()
+        if url_path in ('', '/'):
+            url_path = '/index.html'
+        return self._routes.get(url_path)
+
+    def get_variant(self, entry, token):
+        return entry.variants.get(token)
+
+    def _reload(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if (st.st_ino, st.st_mtime_ns, st.st_size) != self._state:
+            try:
+                self._load(st)
+            except ArchiveError as e:
+                # Keep serving the current archive
+                self._state = (st.st_ino, st.st_mtime_ns, st.st_size)
+                print(f'✗ Site archive not reloaded: {e}', file=sys.stderr)
+
+    def _load(self, st):
+        mapping, index = open_archive(self.path)
+        view = memoryview(mapping)
+        routes = {}
+        for rel, record in index['files'].items():
+            entry = ArchiveEntry(rel, record, view)
+            routes['/' + rel] = entry
+            if rel.endswith('.html'):
+                # An exact file of the same name keeps priority over the alias
+                routes.setdefault('/' + rel[:-5], entry)
+        # Replacing the dict is atomic: a request sees the old or the new routes
+        self._routes = routes
+        self._state = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.created = index.get('created')
+        self.files = len(index['files'])
+
+
+# --- CLI -------------------------------------------------------------------------
+
+def format_size(size):
+    return f'{size / (1024 * 1024):.1f} MB' if size >= 1024 * 1024 else f'{size / 1024:.1f} KB'
+
+
+def cmd_pack(args):
+    started = time.perf_counter()
+    exclude = DEFAULT_EXCLUDE + tuple(args.exclude or ())
+    print(f'Packing {args.root} into {args.output}')
+    print('=' * 50)
+    index = pack(args.root, args.output, exclude=exclude, variants=not args.no_variants,
+                 workers=args.workers)
+    files = index['files']
+    total = sum(entry['length'] for entry in files.values())
+    variants = sum(len(entry.get('variants', {})) for entry in files.values())
+    print(f'✓ {len(files)} files, {format_size(total)}; {variants} precompressed variants; '
+          f'{format_size(index["unique_bytes"])} stored (identical bodies once)')
+    print(f'  {sum("cache" in e for e in files.values())} immutable assets, '
+          f'{sum("link" in e for e in files.values())} pages with preload hints')
+    print(f'  index {format_size(index["index_bytes"])}, archive '
+          f'{format_size(os.path.getsize(args.output))} in {time.perf_counter() - started:.2f}s')
+    return 0
+
+
+def cmd_list(args):
+    try:
+        mapping, index = open_archive(args.archive)
+    except ArchiveError as e:
+        print(f'✗ {e}')
+        return 1
+    with mapping:
+        files = index['files']
+        print(f'{args.archive}: {len(files)} files, created {index.get("created")}')
+        print('=' * 50)
+        for rel, entry in sorted(files.items()):
+            variants = ', '.join(f'{token} {length:,}'
+                                 for token, (_, length) in entry.get('variants', {}).items())
+            flags = ' immutable' if 'cache' in entry else ''
+            print(f'  {rel}: {entry["length"]:,} {entry["type"]}'
+                  + (f' ({variants})' if variants else '') + flags)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack the built site into one indexed archive '
+                                                 'served from memory-mapped storage')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack_parser = commands.add_parser('pack', help='write the archive of a site root')
+    pack_parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    pack_parser.add_argument('--output', default=ARCHIVE_NAME,
+                             help=f'archive path, replaced atomically (default: {ARCHIVE_NAME})')
+    pack_parser.add_argument('--exclude', nargs='*', metavar='PATTERN',
+                             help='more glob patterns of files to leave out, besides '
+                                  + ' '.join(DEFAULT_EXCLUDE))
+    pack_parser.add_argument('--no-variants', action='store_true',
+                             help='do not store gzip/brotli variants of text assets')
+    pack_parser.add_argument('--workers', type=int, default=None,
+                             help='worker processes compressing variants')
+    pack_parser.set_defaults(func=cmd_pack)
+    list_parser = commands.add_parser('list', help='list the files of an archive')
+    list_parser.add_argument('archive', nargs='?', default=ARCHIVE_NAME)
+    list_parser.set_defaults(func=cmd_list)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
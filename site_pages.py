@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Page discovery shared by the build and check tools. Pages are the
+# top-level .html files of the site root, minus the shared partials,
+# backups and test pages.
+import fnmatch
+import html
+import os
+import urllib.parse
+
+HEADER_PARTIAL = 'standard-header.html'
+FOOTER_PARTIAL = 'standard-footer.html'
+PARTIALS = (HEADER_PARTIAL, FOOTER_PARTIAL)
+
+EXCLUDED_PATTERNS = ('*-backup.html', 'test-*.html')
+
+
+def is_page(name):
+    return (name.endswith('.html') and name not in PARTIALS
+            and not any(fnmatch.fnmatch(name, pattern) for pattern in EXCLUDED_PATTERNS))
+
+
+def discover_pages(root='.'):
+    return sorted(entry.name for entry in os.scandir(root)
+                  if entry.is_file() and is_page(entry.name))
+
+
+def select_pages(pages, include=None, exclude=None):
+    # include/exclude are glob patterns over page names
+    if include:
+        pages = [p for p in pages if any(fnmatch.fnmatch(p, pattern) for pattern in include)]
+    if exclude:
+        pages = [p for p in pages if not any(fnmatch.fnmatch(p, pattern) for pattern in exclude)]
+    return pages
+
+
+# newline='' keeps line endings byte-for-byte, so unchanged pages hash the
+# same before and after a rewrite
+def read_text(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def write_text(path, content):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+
+
+def local_path(url):
+    # Maps a src/href value of a top-level page onto a path relative to the
+    # site root, or None for external and data URLs
+    url = html.unescape(url.strip())
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme or parsed.netloc or url.startswith(('data:', '#')):
+        return None
+    return urllib.parse.unquote(parsed.path).lstrip('/') or None
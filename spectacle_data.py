@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Spectacle data for the build steps: the local snapshot of the spectacles
+# tables (a JSON dump or a SQLite file with the same tables) read the way
+# the sync scripts query the database, and the French formatting of dates,
+# durations and age ranges shared by the prerendered pages and the search
+# index.
+import calendar
+import datetime
+import json
+import os
+import sqlite3
+
+DEFAULT_SNAPSHOT = os.path.join('data', 'spectacles.json')
+TABLES = ('spectacles', 'spectacle_sessions', 'spectacle_categories',
+          'spectacle_category_relations')
+# Columns stored as JSON text in SQLite
+JSON_COLUMNS = ('gallery_images',)
+SQLITE_HEADER = b'SQLite format 3\0'
+
+# Age filters of spectacles.html: slug, first and last age
+AGE_GROUPS = (('3-6', 3, 6), ('7-12', 7, 12), ('13-17', 13, 17))
+MONTHS = ('Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin', 'Juillet', 'Août',
+          'Septembre', 'Octobre', 'Novembre', 'Décembre')
+MONTHS_SHORT = ('Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct',
+                'Nov', 'Déc')
+
+
+def load_snapshot(path):
+    # {table: [row dict]} from a JSON dump ({"spectacles": [...], ...}) or
+    # a SQLite database with the same tables; missing tables are empty
+    with open(path, 'rb') as f:
+        is_sqlite = f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    if not is_sqlite:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {table: list(data.get(table) or []) for table in TABLES}
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        tables = {}
+        for table in TABLES:
+            rows = conn.execute(f'SELECT * FROM {table}') if table in present else ()
+            tables[table] = [decode_row(dict(row)) for row in rows]
+        return tables
+    finally:
+        conn.close()
+
+
+def decode_row(row):
+    for column in JSON_COLUMNS:
+        if isinstance(row.get(column), str):
+            try:
+                row[column] = json.loads(row[column])
+            except ValueError:
+                row[column] = [row[column]]
+    return row
+
+
+class Snapshot:
+    # The rows the public pages show, as the sync scripts query them:
+    # active spectacles, newest first, and their active sessions by date
+    def __init__(self, tables):
+        self.spectacles = sorted((row for row in tables['spectacles'] if row.get('is_active', True)),
+                                 key=lambda row: str(row.get('created_at') or ''), reverse=True)
+        self._sessions = {}
+        for session in tables['spectacle_sessions']:
+            if session.get('status', 'active') == 'active':
+                self._sessions.setdefault(session['spectacle_id'], []).append(session)
+        for sessions in self._sessions.values():
+            sessions.sort(key=lambda session: str(session.get('session_date') or ''))
+        slugs = {category['id']: category['slug'] for category in tables['spectacle_categories']}
+        self._categories = {}
+        for relation in sorted(tables['spectacle_category_relations'],
+                               key=lambda relation: relation['category_id']):
+            slug = slugs.get(relation['category_id'])
+            if slug:
+                self._categories.setdefault(relation['spectacle_id'], []).append(slug)
+
+    def sessions(self, spectacle):
+        return self._sessions.get(spectacle['id'], [])
+
+    def categories(self, spectacle):
+        return self._categories.get(spectacle['id'], [])
+
+
+def spectacle_page(slug):
+    return f'spectacle-{slug}.html'
+
+
+def parse_when(value):
+    # ISO date or datetime -> (date, 'HHhMM' or None)
+    value = str(value)
+    day = datetime.date.fromisoformat(value[:10])
+    clock = value[11:16] if len(value) >= 16 and value[10] in 'T ' else None
+    if clock == '00:00':
+        clock = None
+    return day, clock and clock.replace(':', 'h')
+
+
+def format_day(day, year=True):
+    return f'{day.day} {MONTHS[day.month - 1]}' + (f' {day.year}' if year else '')
+
+
+def format_session_dates(session):
+    # 12 Décembre 2025 à 15h00 / 12 au 16 Décembre 2025 / Décembre 2025 /
+    # 28 Novembre au 3 Décembre 2025 / 28 Décembre 2025 au 3 Janvier 2026;
+    # a session's date_label ("Décembre 2025", "Dates à venir") is shown as is
+    if session.get('date_label'):
+        return session['date_label']
+    start, clock = parse_when(session['session_date'])
+    end = parse_when(session['end_date'])[0] if session.get('end_date') else start
+    if end <= start:
+        return format_day(start) + (f' à {clock}' if clock else '')
+    if (start.day == 1 and (end.year, end.month) == (start.year, start.month)
+            and end.day == calendar.monthrange(end.year, end.month)[1]):
+        return f'{MONTHS[start.month - 1]} {start.year}'
+    if (start.year, start.month) == (end.year, end.month):
+        return f'{start.day} au {format_day(end)}'
+    if start.year == end.year:
+        return f'{format_day(start, year=False)} au {format_day(end)}'
+    return f'{format_day(start)} au {format_day(end)}'
+
+
+def format_period(spectacle, sessions):
+    # Card period: the spectacle's own text, or the months its sessions span
+    if spectacle.get('period'):
+        return spectacle['period']
+    if not sessions:
+        return None
+    first = min(parse_when(session['session_date'])[0] for session in sessions)
+    last = max(parse_when(session.get('end_date') or session['session_date'])[0]
+               for session in sessions)
+    if (first.year, first.month) == (last.year, last.month):
+        return f'{MONTHS_SHORT[first.month - 1]} {first.year}'
+    if first.year == last.year:
+        return f'{MONTHS_SHORT[first.month - 1]} - {MONTHS_SHORT[last.month - 1]} {last.year}'
+    return f'{MONTHS_SHORT[first.month - 1]} {first.year} - {MONTHS_SHORT[last.month - 1]} {last.year}'
+
+
+def format_duration(minutes):
+    minutes = int(minutes)
+    return f'{minutes} min' if minutes < 60 else f'{minutes // 60}h{minutes % 60:02d}'
+
+
+def format_ages(spectacle):
+    low, high = spectacle.get('age_range_min'), spectacle.get('age_range_max')
+    if low is not None and high is not None:
+        return f'{low}-{high} ans'
+    if low is not None:
+        return f'{low}+ ans'
+    return spectacle.get('age_range') or 'Tous âges'
+
+
+def age_groups(spectacle):
+    low = spectacle.get('age_range_min')
+    if low is None:
+        return []
+    high = spectacle.get('age_range_max')
+    high = 99 if high is None else high
+    return [slug for slug, first, last in AGE_GROUPS if low <= last and high >= first]
+
+
+def booking_url(spectacle, session=None):
+    if session is not None and session.get('booking_url'):
+        return session['booking_url']
+    return spectacle.get('booking_url') or f'contact.html?spectacle={spectacle["slug"]}'
+
+
+def card_fields(spectacle, sessions):
+    # The values shown on a spectacles.html card, formatted
+    duration = spectacle.get('duration_minutes')
+    return {
+        'slug': spectacle['slug'],
+        'title': spectacle['title'],
+        'description': spectacle.get('short_description') or '',
+        'image': spectacle.get('poster_url') or spectacle.get('main_image_url') or '',
+        'category': spectacle.get('category') or 'Spectacle',
+        'period': format_period(spectacle, sessions) or '',
+        'ages': format_ages(spectacle),
+        'duration': format_duration(duration) if duration else '',
+        'venue': spectacle.get('venue') or '',
+        'booking': booking_url(spectacle),
+    }
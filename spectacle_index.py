@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# Search and filter index of the spectacles catalogue, built from the same
+# snapshot as spectacle_prerender.py and served as one small JSON asset
+# (assets/data/spectacles-index.json) that spectacles-catalogue.js loads on
+# the list page.
+#
+#   docs     one compact array per spectacle (DOC_FIELDS), preformatted, in
+#            list order, so the client renders a card without other data
+#   terms    inverted index: the sorted normalized tokens of the titles,
+#            subtitles, descriptions, categories, themes, venues and
+#            keywords, so a prefix is a binary search away, and in
+#   postings the ordinals of the spectacles containing each term
+#   facets   group -> value -> bitmap of the matching spectacles (base64,
+#            bit i = doc i): audience, age group, category, language and
+#            the months of the sessions
+#
+# A query is an AND of bitmaps: the selected facet values and, for each
+# query word, the union of the postings of the terms it prefixes. The
+# list page only builds cards for the matches the user scrolls to.
+#
+#   python3 spectacle_index.py                         # print index statistics
+#   python3 spectacle_index.py --query "lune" --facet age=3-6
+import argparse
+import base64
+import bisect
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+
+from spectacle_data import DEFAULT_SNAPSHOT, Snapshot, age_groups, card_fields, load_snapshot, parse_when
+
+INDEX_PATH = 'assets/data/spectacles-index.json'
+INDEX_VERSION = 1
+
+# Columns whose words are searchable
+TEXT_COLUMNS = ('title', 'subtitle', 'short_description', 'category', 'theme', 'venue',
+                'language', 'meta_keywords')
+# Layout of each entry of "docs"
+DOC_FIELDS = ('slug', 'title', 'description', 'image', 'category', 'period', 'ages', 'duration',
+              'venue', 'booking')
+MIN_TOKEN_LENGTH = 2
+STOPWORDS = frozenset('''
+    au aux avec ce ces dans de des du elle en est et il ils la le les leur lui mais ne nos notre
+    ou par pas pour qu que qui sa se ses son sur ta te tes ton un une vos votre
+'''.split())
+TOKEN_SPLIT = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    # Lowercase without accents or other combining marks: "Écologique" -> "ecologique"
+    decomposed = unicodedata.normalize('NFD', text.lower())
+    return ''.join(c for c in decomposed if unicodedata.category(c) != 'Mn')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_SPLIT.split(normalize(text))
+            if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS]
+
+
+def facet_key(label):
+    # Category and language labels as facet values: "Conte Écologique" -> "conte-ecologique"
+    return '-'.join(TOKEN_SPLIT.split(normalize(label))).strip('-')
+
+
+def session_months(sessions):
+    months = set()
+    for session in sessions:
+        start = parse_when(session['session_date'])[0]
+        end = parse_when(session.get('end_date') or session['session_date'])[0]
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            months.add(f'{year:04d}-{month:02d}')
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def encode_bitmap(ordinals, count):
+    bits = bytearray((count + 7) // 8)
+    for i in ordinals:
+        bits[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+
+def decode_bitmap(value, count):
+    bits = base64.b64decode(value)
+    return {i for i in range(count) if bits[i >> 3] >> (i & 7) & 1}
+
+
+def build_index(snapshot):
+    spectacles = snapshot.spectacles
+    count = len(spectacles)
+    docs, postings = [], {}
+    facets = {'audience': {}, 'age': {}, 'category': {}, 'language': {}, 'month': {}}
+    for i, spectacle in enumerate(spectacles):
+        sessions = snapshot.sessions(spectacle)
+        fields = card_fields(spectacle, sessions)
+        docs.append([fields[field] for field in DOC_FIELDS])
+        for column in TEXT_COLUMNS:
+            for token in tokenize(str(spectacle.get(column) or '')):
+                postings.setdefault(token, set()).add(i)
+        values = {
+            'audience': snapshot.categories(spectacle),
+            'age': age_groups(spectacle),
+            'category': [facet_key(spectacle['category'])] if spectacle.get('category') else [],
+            'language': [facet_key(spectacle['language'])] if spectacle.get('language') else [],
+            'month': session_months(sessions),
+        }
+        for group, keys in values.items():
+            for key in keys:
+                facets[group].setdefault(key, set()).add(i)
+    return {
+        'version': INDEX_VERSION,
+        'count': count,
+        'fields': list(DOC_FIELDS),
+        'docs': docs,
+        'stopwords': sorted(STOPWORDS),
+        'minTokenLength': MIN_TOKEN_LENGTH,
+        'terms': sorted(postings),
+        'postings': [sorted(postings[token]) for token in sorted(postings)],
+        'facets': {group: {key: encode_bitmap(ordinals, count) for key, ordinals in sorted(keys.items())}
+                   for group, keys in facets.items()},
+    }
+
+
+def dump_index(index):
+    return json.dumps(index, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def write_index(root, index):
+    # Returns True when the file changed; an unchanged index keeps its mtime
+    # (and ETag)
+    path = os.path.join(root, INDEX_PATH)
+    data = dump_index(index).encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def search(index, query='', facets=()):
+    # Reference implementation of the client's query: ordinals of the docs
+    # matching every word of query (as a prefix) and every (group, value)
+    matches = set(range(index['count']))
+    for group, value in facets:
+        bitmap = index['facets'].get(group, {}).get(value)
+        matches &= decode_bitmap(bitmap, index['count']) if bitmap else set()
+    terms = index['terms']
+    for word in tokenize(query):
+        found = set()
+        for j in range(bisect.bisect_left(terms, word), len(terms)):
+            if not terms[j].startswith(word):
+                break
+            found.update(index['postings'][j])
+        matches &= found
+    return sorted(matches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the spectacles search and filter index')
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--snapshot',
+                        help=f'JSON or SQLite snapshot (default: <root>/{DEFAULT_SNAPSHOT})')
+    parser.add_argument('--query', default=None, help='run a search against the index')
+    parser.add_argument('--facet', action='append', default=[], metavar='GROUP=VALUE',
+                        help='facet filter for --query, e.g. age=3-6 (repeatable)')
+    parser.add_argument('--dry-run', action='store_true', help='build without writing')
+    args = parser.parse_args(argv)
+
+    snapshot_path = args.snapshot or os.path.join(args.root, DEFAULT_SNAPSHOT)
+    started = time.perf_counter()
+    try:
+        snapshot = Snapshot(load_snapshot(snapshot_path))
+        facets = [tuple(f.split('=', 1)) for f in args.facet]
+        if any(len(f) != 2 for f in facets):
+            raise ValueError('--facet expects GROUP=VALUE')
+    except (OSError, ValueError, KeyError) as e:
+        print(f'✗ {e}')
+        return 2
+    index = build_index(snapshot)
+    changed = False if args.dry_run else write_index(args.root, index)
+    elapsed = time.perf_counter() - started
+
+    data = dump_index(index).encode('utf-8')
+    print(f'Spectacles index: {INDEX_PATH}')
+    print('=' * 50)
+    rows = [('Spectacles', index['count']), ('Terms', len(index['terms']))]
+    rows += [(f'Facet {group}', f'{len(values)} values') for group, values in index['facets'].items()]
+    rows.append(('Size', f'{len(data) / 1024:.1f} KB ({len(gzip.compress(data)) / 1024:.1f} KB gzip)'))
+    for label, value in rows:
+        print(f'  {label + ":":<18}{value}')
+    status = 'dry run' if args.dry_run else ('written' if changed else 'unchanged')
+    print(f'✓ Index {status} in {elapsed * 1000:.0f} ms')
+
+    if args.query is not None or facets:
+        started = time.perf_counter()
+        matches = search(index, args.query or '', facets)
+        elapsed = time.perf_counter() - started
+        print()
+        print(f'{len(matches)} matches in {elapsed * 1e6:.0f} µs')
+        for i in matches:
+            doc = dict(zip(DOC_FIELDS, index['docs'][i]))
+            print(f'  • {doc["title"]} ({doc["ages"]}, {doc["period"]})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
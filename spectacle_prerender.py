@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# Prerenders the spectacle data into the pages at build time, from a local
+# snapshot of the spectacles tables (a JSON dump or a SQLite file):
+#
+#   spectacle-<slug>.html   title and meta tags, hero title/subtitle, info
+#                           pills, showtimes and photo gallery
+#   spectacles.html         the first --initial-cards cards of
+#                           #spectacles-container, with the audience and
+#                           age-group filter slugs
+#   assets/data/spectacles-index.json
+#                           the search and filter index (spectacle_index.py)
+#                           the list page renders the other cards from
+#
+# The snapshot and the date/duration formatting live in spectacle_data.py.
+#
+# Pages arrive complete, so spectacle-sync.js and spectacles-list-sync.js no
+# longer rebuild them on load. Each page carries the versions it was built
+# from (<meta name="spectacle-version"> = the row's updated_at,
+# "spectacle-sessions-version" = id@updated_at of its active sessions,
+# "spectacles-version" on the list); the scripts compare them with the live
+# rows and only patch the parts that changed since the build.
+#
+# Runs are incremental: the input key of every page is the hash of the rows
+# it is built from, recorded in the build manifest, so only the spectacles
+# whose rows (or sessions) changed are regenerated.
+#
+#   python3 spectacle_prerender.py                    # data/spectacles.json
+#   python3 spectacle_prerender.py --root dist --snapshot spectacles.sqlite3
+#   python3 spectacle_prerender.py --dry-run --force
+import argparse
+import functools
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from build_manifest import MANIFEST_NAME, BuildManifest, combine_keys
+from page_rewrite import Transform, find_dirty_pages, page_keys, print_results, rewrite_pages
+from site_pages import discover_pages
+from spectacle_data import (DEFAULT_SNAPSHOT, Snapshot, age_groups, booking_url, card_fields,
+                            format_session_dates, load_snapshot, spectacle_page)
+from spectacle_index import INDEX_PATH, build_index, write_index
+
+LIST_PAGE = 'spectacles.html'
+MANIFEST_SCOPE = 'spectacle_prerender'
+# Part of every page key: bump when the generated markup changes
+RENDER_VERSION = '2'
+
+SITE_NAME = 'École du Jeune Spectateur'
+NO_SESSIONS = '<p class="text-muted">Aucune séance programmée pour le moment.</p>'
+SHOWTIMES_HEADING = re.compile(r'<h3>(?:(?!</h3>).)*Séances Disponibles</h3>')
+# Card meta items: icon, card_fields() key
+CARD_META = (('fa-calendar-alt', 'period'), ('fa-users', 'ages'), ('fa-clock', 'duration'),
+             ('fa-map-marker-alt', 'venue'))
+# Cards prerendered into spectacles.html; spectacles-catalogue.js renders the
+# others from the search index as they scroll into view
+DEFAULT_INITIAL_CARDS = 6
+
+
+def row_key(*rows):
+    return combine_keys(RENDER_VERSION, *(json.dumps(row, sort_keys=True, ensure_ascii=False,
+                                                     default=str) for row in rows))
+
+
+def sessions_version(sessions):
+    # Same string as SpectacleSync.getSessionsVersion() builds from the live rows
+    return ','.join(f'{session["id"]}@{session.get("updated_at") or ""}' for session in sessions)
+
+
+def list_version(spectacles):
+    return ','.join(f'{row["id"]}@{row.get("updated_at") or ""}' for row in spectacles)
+
+
+# Markup
+
+def text(value):
+    return html.escape(str(value), quote=False)
+
+
+def attr(value):
+    # Apostrophes stay literal, as in the hand-written pages
+    return text(value).replace('"', '&quot;')
+
+
+# Locating regions
+
+@functools.lru_cache(maxsize=None)
+def opener_pattern(tag, name, value):
+    # Start tag whose attribute `name` holds `value` as one of its tokens
+    return re.compile(rf'<{tag}\b[^>]*?\s{name}="(?:[^"]*\s)?{re.escape(value)}(?:\s[^"]*)?"[^>]*>')
+
+
+@functools.lru_cache(maxsize=None)
+def tag_pattern(tag):
+    return re.compile(rf'<(/?){tag}\b[^>]*>')
+
+
+def find_element(content, tag, name, value, start=0):
+    # (start, inner start, inner end, end) of the first matching element,
+    # balancing nested elements of the same tag; None when there is none
+    match = opener_pattern(tag, name, value).search(content, start)
+    if match is None:
+        return None
+    depth = 1
+    for token in tag_pattern(tag).finditer(content, match.end()):
+        if token.group(1):
+            depth -= 1
+            if depth == 0:
+                return match.start(), match.end(), token.start(), token.end()
+        elif not token.group(0).endswith('/>'):
+            depth += 1
+    return None
+
+
+def line_indent(content, pos):
+    line_start = content.rfind('\n', 0, pos) + 1
+    prefix = content[line_start:pos]
+    return prefix if not prefix.strip() else re.match(r'[ \t]*', prefix).group(0)
+
+
+def set_text(content, tag, cls, value):
+    span = find_element(content, tag, 'class', cls)
+    if span is None:
+        return content, False
+    return content[:span[1]] + text(value) + content[span[2]:], True
+
+
+def set_children(content, tag, name, value, lines):
+    # Replaces the element's children with lines, indented one level deeper
+    span = find_element(content, tag, name, value)
+    if span is None:
+        return content, False
+    indent = line_indent(content, span[0])
+    inner = ''.join(f'\n{indent}  {line}' if line else '\n' for line in lines)
+    return content[:span[1]] + inner + f'\n{indent}' + content[span[2]:], True
+
+
+def set_meta(content, name, value, after=('keywords', 'description')):
+    # Sets <meta name=... content=...>, adding it after the first existing
+    # meta tag named in `after` (or before </head>) when it is missing
+    tag = f'<meta name="{name}" content="{attr(value)}">'
+    pattern = re.compile(rf'<meta name="{re.escape(name)}" content="[^"]*">')
+    new, count = pattern.subn(lambda m: tag, content, count=1)
+    if count:
+        return new, True
+    for anchor_name in after:
+        anchor = re.search(rf'^([ \t]*)<meta name="{anchor_name}"[^>]*>$', content, re.MULTILINE)
+        if anchor:
+            return content[:anchor.end()] + f'\n{anchor.group(1)}{tag}' + content[anchor.end():], True
+    if '</head>' not in content:
+        return content, False
+    return content.replace('</head>', f'  {tag}\n</head>', 1), True
+
+
+def wrap_showtimes(content):
+    # Older pages list the showtimes directly in the "Séances Disponibles"
+    # sidebar card; put them in a .showtimes-list container first
+    heading = SHOWTIMES_HEADING.search(content)
+    if heading is None:
+        return content, False
+    start = 0
+    while True:
+        card = find_element(content, 'div', 'class', 'sidebar-card', start)
+        if card is None:
+            return content, False
+        if card[1] <= heading.start() < card[2]:
+            break
+        start = card[1]
+    indent = line_indent(content, heading.start())
+    return (content[:heading.end()] + f'\n{indent}<div class="showtimes-list"></div>\n'
+            + line_indent(content, card[0]) + content[card[2]:]), True
+
+
+# Spectacle page regions
+
+def render_meta(content, spectacle, sessions):
+    new, found = re.subn(r'<title>[^<]*</title>',
+                         lambda m: f'<title>{text(spectacle["title"])} - {SITE_NAME}</title>',
+                         content, count=1)
+    if not found:
+        return content, False
+    description = spectacle.get('meta_description') or spectacle.get('short_description')
+    if description:
+        new, _ = set_meta(new, 'description', description, after=())
+    if spectacle.get('meta_keywords'):
+        new, _ = set_meta(new, 'keywords', spectacle['meta_keywords'], after=('description',))
+    new, _ = set_meta(new, 'spectacle-version', spectacle.get('updated_at') or '')
+    new, _ = set_meta(new, 'spectacle-sessions-version', sessions_version(sessions),
+                      after=('spectacle-version',))
+    return new, True
+
+
+def render_hero(content, spectacle, sessions):
+    content, found = set_text(content, 'h1', 'hero-title', spectacle['title'])
+    subtitle = spectacle.get('subtitle') or spectacle.get('short_description')
+    if found and subtitle:
+        content, _ = set_text(content, 'p', 'hero-subtitle', subtitle)
+    return content, found
+
+
+def render_pills(content, spectacle, sessions):
+    pills = []
+    if spectacle.get('duration_minutes'):
+        pills.append(('fa-clock', f'{spectacle["duration_minutes"]} min'))
+    if spectacle.get('age_range'):
+        pills.append(('fa-child', spectacle['age_range']))
+    if spectacle.get('language'):
+        pills.append(('fa-globe', spectacle['language']))
+    if spectacle.get('theme'):
+        pills.append((spectacle.get('theme_icon') or 'fa-star', spectacle['theme']))
+    lines = []
+    for icon, label in pills:
+        lines += ['<span class="info-pill">',
+                  f'  <i class="fas {attr(icon)}"></i>{text(label)}',
+                  '</span>']
+    return set_children(content, 'div', 'class', 'info-pills', lines)
+
+
+def render_showtimes(content, spectacle, sessions):
+    if find_element(content, 'div', 'class', 'showtimes-list') is None:
+        content, found = wrap_showtimes(content)
+        if not found:
+            return content, False
+    lines = []
+    for session in sessions:
+        where = ' - '.join(part for part in (session.get('venue'), session.get('label')) if part)
+        lines += ['<div class="showtime-item">',
+                  f'  <div class="showtime-date">{text(format_session_dates(session))}</div>',
+                  f'  <div class="showtime-time">{text(where)}</div>',
+                  f'  <a href="{attr(booking_url(spectacle, session))}" class="showtime-btn">',
+                  '    <i class="fas fa-ticket-alt"></i>',
+                  '    Réserver',
+                  '  </a>',
+                  '</div>']
+    return set_children(content, 'div', 'class', 'showtimes-list', lines or [NO_SESSIONS])
+
+
+def render_gallery(content, spectacle, sessions):
+    images = spectacle.get('gallery_images') or []
+    if not images:
+        # Keep the page's own photos rather than an empty grid
+        return content, find_element(content, 'div', 'class', 'gallery-grid') is not None
+    lines = []
+    for i, src in enumerate(images, 1):
+        lines += ['<div class="gallery-item">',
+                  f'  <img src="{attr(src)}" alt="{attr(spectacle["title"])} - Photo {i}" '
+                  f'class="gallery-img">',
+                  '  <div class="gallery-overlay">',
+                  '    <i class="fas fa-expand"></i>',
+                  '  </div>',
+                  '</div>']
+    return set_children(content, 'div', 'class', 'gallery-grid', lines)
+
+
+# name, label, render function
+PAGE_REGIONS = (
+    ('meta', 'title and meta tags', render_meta),
+    ('hero', 'hero title', render_hero),
+    ('pills', 'info pills', render_pills),
+    ('showtimes', 'showtimes', render_showtimes),
+    ('gallery', 'gallery', render_gallery),
+)
+
+
+class SpectacleRegion(Transform):
+    # One region of one spectacle page; the key covers the row and sessions
+    def __init__(self, name, label, render, spectacle, sessions):
+        super().__init__()
+        self.name = name
+        self.label = label
+        self.render = render
+        self.page = spectacle_page(spectacle['slug'])
+        self.spectacle = spectacle
+        self.sessions = sessions
+        self.key = row_key(spectacle, sessions)
+
+    def applies_to(self, page):
+        return page == self.page
+
+    def apply(self, content):
+        return self.render(content, self.spectacle, self.sessions)
+
+    def signature(self):
+        return f'{super().signature()}:{self.page}:{self.key}'
+
+
+# List page
+
+def render_card(number, fields, filters):
+    # Same markup as SpectaclesCatalogue.createCard() in spectacles-catalogue.js
+    filters = ' '.join(filters)
+    title = fields['title']
+    lines = [f'<!-- Spectacle {number}: {text(title)} -->',
+             f'<div class="col-lg-4 col-md-6 spectacle-item {attr(filters)}" '
+             f'data-category="{attr(filters)}" data-slug="{attr(fields["slug"])}">',
+             '  <div class="spectacle-card fade-in-up">',
+             '    <div class="card-image-wrapper">',
+             f'      <img src="{attr(fields["image"])}" alt="{attr(title)}" class="card-image">',
+             '',
+             '      <div class="card-status">Disponible</div>',
+             f'      <div class="card-category">{text(fields["category"])}</div>',
+             '    </div>',
+             '    <div class="card-content">',
+             f'      <h3 class="card-title">{text(title)}</h3>',
+             '      <p class="card-description">',
+             f'        {text(fields["description"])}',
+             '      </p>',
+             '      <div class="card-meta">']
+    for icon, field in CARD_META:
+        if fields[field]:
+            lines += ['        <div class="meta-item">',
+                      f'          <div class="meta-icon"><i class="fas {icon}"></i></div>',
+                      f'          <span>{text(fields[field])}</span>',
+                      '        </div>']
+    lines += ['      </div>',
+              '      <div class="card-actions">',
+              f'        <a href="{attr(fields["booking"])}" class="btn-primary-custom">',
+              '          <i class="fas fa-ticket-alt"></i> Réserver',
+              '        </a>',
+              f'        <a href="{attr(spectacle_page(fields["slug"]))}" class="btn-secondary-custom">',
+              '          <i class="fas fa-info-circle"></i> Détails',
+              '        </a>',
+              '      </div>',
+              '    </div>',
+              '  </div>',
+              '</div>']
+    return lines
+
+
+class SpectacleList(Transform):
+    name = 'list'
+    label = 'spectacle cards'
+
+    def __init__(self, cards, version, limit=DEFAULT_INITIAL_CARDS):
+        # cards: [(card_fields(), filter slugs)] in display order; only the
+        # first `limit` are rendered (0 renders all)
+        super().__init__()
+        self.cards = cards
+        self.version = version
+        self.limit = limit
+        self.key = row_key(version, limit, *cards)
+
+    def applies_to(self, page):
+        return page == LIST_PAGE
+
+    def apply(self, content):
+        shown = self.cards[:self.limit] if self.limit else self.cards
+        lines = []
+        for number, (fields, filters) in enumerate(shown, 1):
+            lines += [''] + render_card(number, fields, filters)
+        content, found = set_children(content, 'div', 'id', 'spectacles-container', lines)
+        if found:
+            content, _ = set_meta(content, 'spectacles-version', self.version)
+        return content, found
+
+    def signature(self):
+        return f'{super().signature()}:{self.key}'
+
+
+def build_transforms(snapshot, pages, initial_cards=DEFAULT_INITIAL_CARDS):
+    # Returns (transforms, spectacles without a page)
+    transforms, missing = [], []
+    available = set(pages)
+    for spectacle in snapshot.spectacles:
+        if spectacle_page(spectacle['slug']) not in available:
+            missing.append(spectacle)
+            continue
+        sessions = snapshot.sessions(spectacle)
+        transforms += [SpectacleRegion(name, label, render, spectacle, sessions)
+                       for name, label, render in PAGE_REGIONS]
+    if LIST_PAGE in available:
+        cards = [(card_fields(spectacle, snapshot.sessions(spectacle)),
+                  snapshot.categories(spectacle) + age_groups(spectacle))
+                 for spectacle in snapshot.spectacles]
+        transforms.append(SpectacleList(cards, list_version(snapshot.spectacles), initial_cards))
+    return transforms, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prerender spectacle pages from a data snapshot')
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--snapshot',
+                        help=f'JSON or SQLite snapshot of the spectacles tables '
+                             f'(default: <root>/{DEFAULT_SNAPSHOT})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: CPU count, 1 runs in-process)')
+    parser.add_argument('--initial-cards', type=int, default=DEFAULT_INITIAL_CARDS,
+                        help=f'cards prerendered into {LIST_PAGE}, the rest are rendered from '
+                             f'the search index on scroll (0: all, default: {DEFAULT_INITIAL_CARDS})')
+    parser.add_argument('--dry-run', action='store_true', help='report changes without writing')
+    parser.add_argument('--force', action='store_true',
+                        help='render every page, ignoring the manifest')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    snapshot_path = args.snapshot or os.path.join(args.root, DEFAULT_SNAPSHOT)
+    try:
+        snapshot = Snapshot(load_snapshot(snapshot_path))
+    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+        print(f'✗ Could not load {snapshot_path}: {e}')
+        return 2
+
+    all_pages = discover_pages(args.root)
+    transforms, missing = build_transforms(snapshot, all_pages, args.initial_cards)
+    pages = [page for page in all_pages if any(t.applies_to(page) for t in transforms)]
+    manifest = None if args.force else BuildManifest.load(os.path.join(args.root, MANIFEST_NAME))
+    keys = page_keys(pages, transforms)
+    dirty = find_dirty_pages(args.root, pages, keys, manifest, MANIFEST_SCOPE)
+
+    print(f'Prerendering {len(snapshot.spectacles)} spectacles from {snapshot_path}')
+    print('=' * 50)
+    for spectacle in missing:
+        print(f'⚠ No page for {spectacle["slug"]} ({spectacle_page(spectacle["slug"])}), '
+              f'listed only')
+    if dirty:
+        print(f'Dirty: {len(dirty)} of {len(pages)} pages')
+        for page, reason in dirty.items():
+            print(f'  • {page} ({reason})')
+        print()
+
+    results = rewrite_pages(args.root, list(dirty), transforms, workers=args.workers,
+                            dry_run=args.dry_run)
+    print_results(results, dry_run=args.dry_run)
+    if LIST_PAGE in all_pages and not args.dry_run:
+        if write_index(args.root, build_index(snapshot)):
+            print(f'✓ {INDEX_PATH}')
+        else:
+            print(f'· {INDEX_PATH} (unchanged)')
+
+    if manifest is not None and not args.dry_run:
+        for result in results:
+            if result.error is None:
+                manifest.record(MANIFEST_SCOPE, result.page, os.path.join(args.root, result.page),
+                                keys[result.page], digest=result.digest)
+        manifest.prune(MANIFEST_SCOPE, set(pages))
+        manifest.save()
+
+    changed = sum(1 for r in results if r.changed)
+    errors = sum(1 for r in results if r.error)
+    elapsed = time.perf_counter() - started
+    print()
+    verb = 'would change' if args.dry_run else 'rewritten'
+    print(f'{changed} pages {verb}, {len(results) - changed - errors} unchanged, '
+          f'{len(pages) - len(results)} clean in {elapsed * 1000:.0f} ms')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
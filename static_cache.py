@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# In-memory LRU cache of static file contents for CustomHTTPRequestHandler.
+#
+# Each entry holds the file bytes plus a precomputed ETag and Last-Modified
+# header, so conditional requests can be answered with 304 straight from
+# memory. Entries are revalidated against the file's mtime/size at most once
+# per check_interval seconds. Compressed variants (see precompress.py) are
+# attached to the entry they were derived from and dropped with it.
+import datetime
+import email.utils
+import hashlib
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+import precompress
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRY_BYTES = 2 * 1024 * 1024
+DEFAULT_CHECK_INTERVAL = 1.0
+
+
+class CacheEntry:
+    __slots__ = ('path', 'body', 'etag', 'last_modified', 'mtime', 'mtime_ns', 'size',
+                 'content_type', 'checked_at', 'compressible', 'variants')
+
+    def __init__(self, path, body, st, content_type, checked_at):
+        self.path = path
+        self.body = body
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.mtime = int(st.st_mtime)
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self.content_type = content_type
+        self.checked_at = checked_at
+        self.compressible = precompress.is_compressible(path)
+        # encoding token -> encoded bytes, or None when encoding does not pay off
+        self.variants = {}
+
+    def matches(self, st):
+        return st.st_mtime_ns == self.mtime_ns and st.st_size == self.size
+
+    @property
+    def weight(self):
+        return len(self.body) + sum(len(v) for v in self.variants.values() if v)
+
+    def variant_etag(self, token):
+        return self.etag[:-1] + '-' + token + '"'
+
+
+class StaticFileCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entry_bytes=DEFAULT_MAX_ENTRY_BYTES,
+                 check_interval=DEFAULT_CHECK_INTERVAL):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.check_interval = check_interval
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, content_type):
+        # Returns a CacheEntry, or None when the path is not a regular file
+        # or is too large to cache (the caller then serves it from disk).
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        if entry is not None and entry.matches(st):
+            with self._lock:
+                entry.checked_at = now
+                if path in self._entries:
+                    self._entries.move_to_end(path)
+                self.hits += 1
+            return entry
+
+        if not stat.S_ISREG(st.st_mode) or st.st_size > self.max_entry_bytes:
+            self.invalidate(path)
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                body = f.read()
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        entry = CacheEntry(path, body, st, content_type, now)
+        with self._lock:
+            self.misses += 1
+            self._store(entry)
+        return entry
+
+    def get_variant(self, entry, token):
+        # Encoded body for entry, loaded from a precompressed sibling or
+        # compressed on first use; None when the identity body should be sent.
+        if token in entry.variants:
+            return entry.variants[token]
+        body = precompress.load_variant(entry.path, entry.body, entry.mtime_ns, token)
+        with self._lock:
+            if token not in entry.variants:
+                entry.variants[token] = body
+                if body and self._entries.get(entry.path) is entry:
+                    self.current_bytes += len(body)
+                    self._evict()
+        return body
+
+    def invalidate(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self.current_bytes -= entry.weight
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _store(self, entry):
+        old = self._entries.pop(entry.path, None)
+        if old is not None:
+            self.current_bytes -= old.weight
+        self._entries[entry.path] = entry
+        self.current_bytes += entry.weight
+        self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.weight
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def is_not_modified(headers, etag, mtime):
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return any(tag.removeprefix('W/') == etag for tag in tags)
+
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        return mtime <= since.timestamp()
+    return False
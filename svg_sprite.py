@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# Shared SVG sprite. Inline <svg> icons repeated across the pages and shared
+# partials (the menu decoration behind every navigation item, the mobile
+# menu logo, close icons…) are hoisted into one external sprite,
+# assets/img/sprite.svg, as <symbol>s, and each copy is reduced to its
+# outer <svg> tag (size, class, viewBox) around a <use href> reference. The
+# sprite is downloaded once and cached; asset_fingerprint.py gives it a
+# hashed name with an immutable Cache-Control. Bytes saved are reported
+# per page.
+#
+# Copies match when their content is the same up to whitespace; the outer
+# <svg> attributes may differ. Page CSS does not reach inside a <use>, so
+# a fill or stroke shared by all shapes of an icon moves onto the <use>,
+# where rules like `svg use { fill: … }` still restyle it. Icons with ids,
+# classes or style attributes inside (targeted by CSS or scripts) stay
+# inline. Symbols already in the sprite are kept while pages use them, so
+# runs on a rewritten tree are idempotent.
+#
+# Runs on the deploy copy, before css_purge.py and asset_fingerprint.py:
+#
+#   python3 svg_sprite.py --root dist
+#   python3 svg_sprite.py --root dist --min-count 3 --dry-run
+import argparse
+import gzip
+import hashlib
+import html
+import os
+import re
+import sys
+import time
+import urllib.parse
+from collections import Counter, defaultdict
+
+from asset_fingerprint import original_name
+from page_rewrite import Transform, rewrite_pages
+from site_pages import PARTIALS, discover_pages, local_path, read_text
+
+DEFAULT_SPRITE = 'assets/img/sprite.svg'
+DEFAULT_MIN_COUNT = 2
+DEFAULT_MIN_BYTES = 200
+SYMBOL_PREFIX = 's-'
+
+SVG_PATTERN = re.compile(r'(<svg\b[^>]*>)(.*?)</svg\s*>', re.IGNORECASE | re.DOTALL)
+# Inline scripts may build SVG markup in strings; comments are left alone
+SKIP_PATTERN = re.compile(r'<script\b.*?</script\s*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r'<(/?)([\w:-]+)([^>]*?)(/?)>', re.DOTALL)
+ATTR_PATTERN = re.compile(r'''([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')''')
+USE_PATTERN = re.compile(r'''<use\b[^>]*?\shref\s*=\s*(["'])([^"'#]*)#(%s[0-9a-f]+)\1'''
+                         % SYMBOL_PREFIX, re.IGNORECASE)
+SYMBOL_PATTERN = re.compile(r'<symbol\b[^>]*\sid="(%s[0-9a-f]+)"[^>]*>.*?</symbol>'
+                            % SYMBOL_PREFIX, re.DOTALL)
+
+# Outer attributes that define the symbol's coordinate system
+VIEWPORT_ATTRS = ('viewBox', 'preserveAspectRatio')
+SHAPE_TAGS = {'path', 'circle', 'rect', 'ellipse', 'line', 'polyline', 'polygon'}
+# Paint attributes moved onto the <use> when every shape of an icon shares them
+LIFT_ATTRS = ('fill', 'stroke')
+# Content that would behave differently, or be lost to assistive technology,
+# inside a <use> shadow tree
+UNSAFE_TAGS = {'svg', 'script', 'style', 'foreignobject', 'a', 'title', 'desc', 'use'}
+UNSAFE_ATTRS = {'id', 'class', 'style'}
+
+
+def parse_attrs(tag):
+    return {m.group(1): html.unescape(m.group(2) if m.group(2) is not None else m.group(3))
+            for m in ATTR_PATTERN.finditer(tag)}
+
+
+def normalize(markup):
+    markup = re.sub(r'\s+', ' ', markup.strip())
+    return re.sub(r'>\s+<', '><', markup).replace(' />', '/>')
+
+
+class Icon:
+    # One distinct inline SVG: normalized content plus viewport attributes.
+    # lifted holds the paint attributes moved from the shapes onto <use>.
+    __slots__ = ('id', 'content', 'viewport', 'lifted')
+
+    def __init__(self, content, viewport, lifted):
+        self.content = content
+        self.viewport = viewport
+        self.lifted = lifted
+        key = '\0'.join([content] + [f'{k}={v}' for k, v in viewport])
+        self.id = SYMBOL_PREFIX + hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+
+    def symbol(self):
+        attrs = ''.join(f' {k}="{html.escape(v)}"' for k, v in self.viewport)
+        return f'<symbol id="{self.id}"{attrs}>{self.content}</symbol>'
+
+
+def make_icon(open_tag, inner):
+    # Returns the Icon of an inline SVG, or None when it must stay inline
+    tags = list(TAG_PATTERN.finditer(inner))
+    if not tags:
+        return None
+    shapes = []
+    for tag in tags:
+        name = tag.group(2).lower()
+        attrs = parse_attrs(tag.group(3))
+        if name in UNSAFE_TAGS or UNSAFE_ATTRS.intersection(attrs):
+            return None
+        if any('url(#' in value for value in attrs.values()):
+            return None
+        if name in SHAPE_TAGS and not tag.group(1):
+            shapes.append(attrs)
+    if re.search(r'&(?!(?:amp|lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+);)', inner):
+        # HTML-only entities (&nbsp;…) are not valid in a standalone SVG file
+        return None
+
+    content = normalize(inner)
+    lifted = []
+    for name in LIFT_ATTRS:
+        values = {shape.get(name) for shape in shapes}
+        if shapes and len(values) == 1 and None not in values:
+            lifted.append((name, values.pop()))
+            content = re.sub(r'\s%s\s*=\s*(["\']).*?\1' % name, '', content)
+    outer = parse_attrs(open_tag)
+    viewport = [(name, outer[name]) for name in VIEWPORT_ATTRS if name in outer]
+    return Icon(content, viewport, lifted)
+
+
+def iter_svgs(content):
+    # Yields the inline <svg> matches outside scripts and comments
+    skipped = [(m.start(), m.end()) for m in SKIP_PATTERN.finditer(content)]
+    i = 0
+    for match in SVG_PATTERN.finditer(content):
+        while i < len(skipped) and skipped[i][1] <= match.start():
+            i += 1
+        if i < len(skipped) and skipped[i][0] <= match.start():
+            continue
+        yield match
+
+
+def scan_page(content):
+    # Returns ({icon id: Icon}, Counter of inline copies per icon id,
+    # {icon id: largest copy in bytes}, set of (sprite path, symbol id)
+    # already referenced by <use>)
+    icons = {}
+    counts = Counter()
+    sizes = {}
+    for match in iter_svgs(content):
+        icon = make_icon(match.group(1), match.group(2))
+        if icon is not None:
+            icons[icon.id] = icon
+            counts[icon.id] += 1
+            sizes[icon.id] = max(sizes.get(icon.id, 0), len(match.group(0)))
+    used = {(local_path(m.group(2)), m.group(3)) for m in USE_PATTERN.finditer(content)}
+    return icons, counts, sizes, used
+
+
+def load_sprite(path):
+    # Returns {symbol id: symbol markup} of an existing sprite
+    try:
+        content = read_text(path)
+    except OSError:
+        return {}
+    return {m.group(1): m.group(0) for m in SYMBOL_PATTERN.finditer(content)}
+
+
+def render_sprite(symbols):
+    body = '\n'.join(symbols[key] for key in sorted(symbols))
+    return f'<svg xmlns="http://www.w3.org/2000/svg">\n{body}\n</svg>\n'
+
+
+def save_sprite(path, content):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+class SpriteRewrite(Transform):
+    name = 'svg-sprite'
+    label = 'inline SVGs'
+
+    def __init__(self, icons, sprite_url, exclude=None):
+        super().__init__(exclude)
+        # Icons hoisted into the sprite, by id
+        self.icons = icons
+        self.sprite_url = sprite_url
+
+    def apply(self, content):
+        out = []
+        pos = 0
+        for match in iter_svgs(content):
+            icon = make_icon(match.group(1), match.group(2))
+            if icon is None or icon.id not in self.icons:
+                continue
+            attrs = ''.join(f' {k}="{html.escape(v)}"' for k, v in icon.lifted)
+            out.append(content[pos:match.start()])
+            out.append(f'{match.group(1)}<use href="{self.sprite_url}#{icon.id}"{attrs}></use></svg>')
+            pos = match.end()
+        out.append(content[pos:])
+        return ''.join(out), True
+
+
+def gzip_size(content):
+    return len(gzip.compress(content.encode('utf-8'), 9, mtime=0))
+
+
+def format_kb(size):
+    return f'{size / 1024:.1f} KB'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Hoist inline SVGs repeated across the pages into '
+                                                 'a shared sprite referenced with <use>')
+    parser.add_argument('--root', required=True, help='deploy copy of the site, e.g. dist')
+    parser.add_argument('--sprite', default=DEFAULT_SPRITE,
+                        help=f'sprite path relative to the root (default: {DEFAULT_SPRITE})')
+    parser.add_argument('--min-count', type=int, default=DEFAULT_MIN_COUNT,
+                        help='inline copies across the site needed to hoist an icon '
+                             f'(default: {DEFAULT_MIN_COUNT})')
+    parser.add_argument('--min-bytes', type=int, default=DEFAULT_MIN_BYTES,
+                        help=f'smallest inline SVG to hoist (default: {DEFAULT_MIN_BYTES})')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--dry-run', action='store_true', help='report savings without writing')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    pages = discover_pages(args.root) + [p for p in PARTIALS
+                                         if os.path.exists(os.path.join(args.root, p))]
+    sprite_rel = args.sprite.lstrip('/')
+    sprite_path = os.path.join(args.root, sprite_rel)
+    sprite_url = urllib.parse.quote(sprite_rel)
+
+    contents = {page: read_text(os.path.join(args.root, page)) for page in pages}
+    icons = {}
+    counts = Counter()
+    sizes = defaultdict(int)
+    used = set()
+    for content in contents.values():
+        page_icons, page_counts, page_sizes, page_used = scan_page(content)
+        icons.update(page_icons)
+        counts.update(page_counts)
+        for key, size in page_sizes.items():
+            sizes[key] = max(sizes[key], size)
+        # Symbols referenced by pages rewritten in an earlier run, also
+        # after asset_fingerprint.py renamed the sprite
+        used.update(symbol for path, symbol in page_used
+                    if path and original_name(path) == sprite_rel)
+    hoisted = {key: icon for key, icon in icons.items()
+               if counts[key] >= args.min_count and sizes[key] >= args.min_bytes}
+
+    previous = load_sprite(sprite_path)
+    symbols = {key: symbol for key, symbol in previous.items() if key in used}
+    symbols.update((key, icon.symbol()) for key, icon in hoisted.items())
+
+    print(f'Scanning {len(pages)} pages: {sum(counts.values())} inline SVGs, '
+          f'{len(hoisted)} repeated icons to hoist, {len(symbols)} symbols in {sprite_rel}')
+    print('=' * 50)
+    for key, icon in sorted(hoisted.items(), key=lambda item: -counts[item[0]]):
+        viewbox = dict(icon.viewport).get('viewBox', '-')
+        print(f'· {key}: {counts[key]} copies, viewBox {viewbox}, {sizes[key]} bytes each')
+    if hoisted:
+        print()
+
+    # Savings are measured here, on the same transform the pool applies
+    transform = SpriteRewrite(hoisted, sprite_url)
+    total_before = total_after = gzip_saved = 0
+    for page in pages:
+        before = contents[page]
+        after, _ = transform.apply(before)
+        size_before, size_after = len(before.encode('utf-8')), len(after.encode('utf-8'))
+        total_before += size_before
+        total_after += size_after
+        if after == before:
+            continue
+        zipped = gzip_size(before) - gzip_size(after)
+        gzip_saved += zipped
+        replaced = len(USE_PATTERN.findall(after)) - len(USE_PATTERN.findall(before))
+        print(f'✓ {page}: {replaced} SVGs -> <use>, -{format_kb(size_before - size_after)} '
+              f'({format_kb(size_before)} -> {format_kb(size_after)}; '
+              f'-{format_kb(zipped)} gzipped)')
+
+    errors = []
+    sprite = render_sprite(symbols) if symbols else None
+    if not args.dry_run:
+        # The sprite is written first: a rewritten page never references a
+        # missing symbol
+        if sprite is not None and symbols != previous:
+            save_sprite(sprite_path, sprite)
+        results = rewrite_pages(args.root, pages, [transform], workers=args.workers)
+        errors = [r for r in results if r.error]
+        for result in errors:
+            print(f'✗ {result.page}: {result.error}')
+
+    print()
+    print(f'Pages: {format_kb(total_before)} -> {format_kb(total_after)} '
+          f'(-{format_kb(total_before - total_after)}, -{format_kb(gzip_saved)} gzipped)')
+    if sprite is not None:
+        print(f'Sprite: {sprite_rel}, {len(symbols)} symbols, '
+              f'{format_kb(len(sprite.encode("utf-8")))} ({format_kb(gzip_size(sprite))} gzipped)')
+    verb = 'would be written' if args.dry_run else 'written'
+    print(f'Sprite and pages {verb} in {time.perf_counter() - started:.2f}s')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import os
+
+import asset_bundle
+from site_pages import read_text, write_text
+
+
+def test_rerun_after_edit_keeps_bundles_the_page_still_links(tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, 'assets/js'))
+    for name in ('a.js', 'b.js', 'c.js'):
+        write_text(os.path.join(root, 'assets/js', name), f'var {name[0]} = 1;\n')
+    page = os.path.join(root, 'page.html')
+    write_text(page, '<html><head></head><body>\n'
+                     '<script src="assets/js/a.js"></script>\n'
+                     '<script src="assets/js/b.js"></script>\n'
+                     '<script>var inline = 1;</script>\n'
+                     '</body></html>\n')
+    assert asset_bundle.main(['--root', root, '--workers', '1']) == 0
+    first = asset_bundle.page_bundles(read_text(page))
+    assert len(first) == 1
+
+    # A script added after the inline one makes a second run; the first
+    # bundle is left in place by the rerun
+    write_text(page, read_text(page).replace(
+        '</body>', '<script src="assets/js/c.js"></script>\n</body>'))
+    assert asset_bundle.main(['--root', root, '--workers', '1']) == 0
+    linked = asset_bundle.page_bundles(read_text(page))
+    assert set(first) < set(linked)
+    for rel in linked:
+        assert os.path.isfile(os.path.join(root, rel))
+
+
+def test_minify_css_keeps_descendant_pseudo_classes_and_strings():
+    css = '.nav :hover { color: red; }\n.card :is(h2, h3) { margin: 0; }\na { content: ";}"; }'
+    assert asset_bundle.minify_css(css) == (
+        '.nav :hover{color:red}.card :is(h2,h3){margin:0}a{content:";}"}')